@@ -0,0 +1,24 @@
+/**
+ * @file columns.js
+ * @copyright (c) 2020 Marc Stoerzel
+ *
+ * Functions shared by the scripts reading the columns of the data files, which are written as
+ * base64 encoded typed arrays by canalyse.py (cf. encodeColumn() of script/canalyse.py).
+ */
+
+/**
+ * Decode a column of a data file, i. e. a base64 encoded typed array.
+ * @param {in} column object with members 'type' (name of the typed array) and 'data'
+ */
+function decodeColumn(column)
+{
+    var binary = atob(column.data);
+    var bytes = new Uint8Array(binary.length);
+    for (var i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    if (column.type == "Float64Array") {
+        return new Float64Array(bytes.buffer);
+    }
+    return new Int32Array(bytes.buffer);
+}
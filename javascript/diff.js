@@ -0,0 +1,144 @@
+/**
+ * @file diff.js
+ * @copyright (c) 2020 Marc Stoerzel
+ *
+ * Functions to show the comparison of the metrics of a module to a baseline, region by region.
+ * The data need to be defined as global value 'metricDiff', which is auto generated by
+ * sourcemetrix.py diff (cf. file MODULE.diff.js in the data directory). Regressions and
+ * improvements are highlighted by the classes 'diff_regression' and 'diff_improvement'.
+ */
+
+/** maximum number of regions listed at once */
+var DIFF_MAX_ROWS = 1000;
+
+function diffLabel(criteria)
+{
+    if (typeof DiagramStyles !== 'undefined' && DiagramStyles.has(criteria)) return DiagramStyles.get(criteria).criteriaLabel;
+    return criteria;
+}
+
+function diffCell(tr, tag, content)
+{
+    var cell = document.createElement(tag);
+    if (typeof content === 'object') {
+        cell.appendChild(content);
+    } else {
+        cell.textContent = content;
+    }
+    tr.appendChild(cell);
+}
+
+function formatDelta(delta)
+{
+    return (delta > 0) ? '+' + delta : '' + delta;
+}
+
+/**
+ * Return 1 if delta of criteria index c is a regression, -1 if it is an improvement, 0 otherwise.
+ */
+function diffDirection(c, delta)
+{
+    if (delta == 0) return 0;
+    return ((delta > 0) != metricDiff.higherIsBetter[c]) ? 1 : -1;
+}
+
+function diffLines(start, end)
+{
+    return (start === null) ? '' : start + ' - ' + end;
+}
+
+function showDiffSummary()
+{
+    var table = document.getElementById('diff_summary');
+    var header = document.createElement('tr');
+    var titles = ['criteria', 'delta', 'regressions', 'improvements'];
+    for (var i = 0; i < titles.length; i++) diffCell(header, 'th', titles[i]);
+    table.appendChild(header);
+    for (var c = 0; c < metricDiff.criterias.length; c++) {
+        var tr = document.createElement('tr');
+        diffCell(tr, 'td', diffLabel(metricDiff.criterias[c]));
+        diffCell(tr, 'td', formatDelta(metricDiff.totals[c]));
+        diffCell(tr, 'td', metricDiff.regressions[c]);
+        diffCell(tr, 'td', metricDiff.improvements[c]);
+        var direction = diffDirection(c, metricDiff.totals[c]);
+        if (direction != 0) tr.className = (direction > 0) ? 'diff_regression' : 'diff_improvement';
+        table.appendChild(tr);
+    }
+}
+
+/**
+ * Render the regions of criteria index c selected by filter, the largest changes first.
+ */
+function showDiff(c, filter)
+{
+    var table = document.getElementById('diff_table');
+    table.textContent = '';
+    var entries = metricDiff.regions.filter(function (entry) {
+        var direction = diffDirection(c, entry[9][c]);
+        if (filter == 'regressions') return direction > 0;
+        if (filter == 'improvements') return direction < 0;
+        if (filter == 'all') return true;
+        return entry[0] == filter;
+    });
+    entries.sort(function (a, b) {
+        return diffDirection(c, b[9][c]) * Math.abs(b[9][c]) - diffDirection(c, a[9][c]) * Math.abs(a[9][c]);
+    });
+    var header = document.createElement('tr');
+    var titles = ['#', 'delta', diffLabel(metricDiff.criterias[c]), 'status', 'region', 'type', 'lines before',
+        'lines', 'file'];
+    for (var i = 0; i < titles.length; i++) diffCell(header, 'th', titles[i]);
+    table.appendChild(header);
+    for (var i = 0; i < entries.length && i < DIFF_MAX_ROWS; i++) {
+        var entry = entries[i];
+        var tr = document.createElement('tr');
+        var region = entry[2] || entry[1];
+        diffCell(tr, 'td', i + 1);
+        diffCell(tr, 'td', formatDelta(entry[9][c]));
+        diffCell(tr, 'td', entry[8][c]);
+        diffCell(tr, 'td', entry[0]);
+        if (entry[10]) {
+            var link = document.createElement('a');
+            link.textContent = region;
+            link.setAttribute('href', entry[10]);
+            link.setAttribute('target', 'details_frame');
+            diffCell(tr, 'td', link);
+        } else {
+            diffCell(tr, 'td', region);
+        }
+        diffCell(tr, 'td', entry[3]);
+        diffCell(tr, 'td', diffLines(entry[4], entry[5]));
+        diffCell(tr, 'td', diffLines(entry[6], entry[7]));
+        diffCell(tr, 'td', entry[1]);
+        var direction = diffDirection(c, entry[9][c]);
+        if (direction != 0) tr.className = (direction > 0) ? 'diff_regression' : 'diff_improvement';
+        table.appendChild(tr);
+    }
+    if (entries.length > DIFF_MAX_ROWS) {
+        var more = document.createElement('tr');
+        diffCell(more, 'td', '... ' + (entries.length - DIFF_MAX_ROWS) + ' more');
+        table.appendChild(more);
+    }
+}
+
+function initDiff()
+{
+    var counts = metricDiff.counts;
+    document.getElementById('diff_title').textContent = metricDiff.current + ' compared to ' + metricDiff.baseline
+        + ': ' + counts['changed'] + ' regions changed, ' + counts['added'] + ' added, ' + counts['removed']
+        + ' removed (' + counts['files added'] + ' files added, ' + counts['files removed'] + ' files removed)';
+    showDiffSummary();
+    var select = document.getElementById('diff_criteria');
+    var filter = document.getElementById('diff_filter');
+    for (var c = 0; c < metricDiff.criterias.length; c++) {
+        var option = document.createElement('option');
+        option.value = c;
+        option.textContent = diffLabel(metricDiff.criterias[c]);
+        select.appendChild(option);
+    }
+    select.value = 0;
+    filter.value = 'regressions';
+    var update = function () { showDiff(parseInt(select.value), filter.value); };
+    select.addEventListener('change', update);
+    filter.addEventListener('change', update);
+    update();
+}
@@ -1,131 +1,363 @@
 /**
  * @file filelist.js
  * @copyright (c) 2020 Marc Stoerzel
- * 
- * Functions to create DOM elements to represent a filelist based on data, which need to be 
- * defined as global value 'combined' in some other script.
- * Idea is to have 'combined' created as auto generated code by running metrix++.py --export
- * and some code generation script.
+ *
+ * Functions to create DOM elements to represent a filelist based on data, which need to be
+ * defined as global value 'combinedShards' in some other script.
+ * Idea is to have 'combinedShards' created as auto generated code by running metrix++.py --export
+ * and canalyse.py. It lists the shards (one per top-level directory) the detailed data is split
+ * into. Shards are loaded on demand, each shard's data file calls loadCombinedShard(). Requires
+ * columns.js.
  */
 
 /**
  * Entries of a filelist are considered tuples of {text, value}.
  * @tparam string text text associated with this entry
  * @param value value associated with this entry
+ * @param shard name of the shard, if the entry stands for a shard which is not loaded yet
  */
-function FilelistEntry(text, value)
+function FilelistEntry(text, value, shard)
 {
     this.text = text;
     this.value = value;
+    this.shard = shard;
+}
+
+// shards loaded so far: name -> {parts: number of parts loaded, files: array of {text, values, max, regions}, index: text -> file}
+var combinedData = {};
+// functions to call as soon as a shard is loaded: name -> array of callbacks
+var shardCallbacks = {};
+// shards of modules with no more files than this are loaded without user interaction
+var autoloadFiles = 20000;
+// criteria currently shown in the filelist
+var filelist_criteria;
+
+function findShard(name)
+{
+    for (var i = 0; i < combinedShards.shards.length; i++) {
+        if (combinedShards.shards[i].name == name) return combinedShards.shards[i];
+    }
+    return null;
+}
+
+function isShardLoaded(name)
+{
+    return (name in combinedData) && combinedData[name].parts == findShard(name).src.length;
+}
+
+/**
+ * Called by the data file of a shard when loaded. Takes the precomputed per file totals, the
+ * values of the single regions are not decoded.
+ * @param {in} name name of the shard
+ * @param {in} data columns of the shard as written by canalyse.py
+ */
+function loadCombinedShard(name, data)
+{
+    if (!(name in combinedData)) {
+        combinedData[name] = {parts: 0, files: [], index: {}};
+    }
+    var shard = combinedData[name];
+    var files = decodeColumn(data.files);
+    var regions = decodeColumn(data.totals.regions);
+    var sums = {};
+    var maxima = {};
+    for (var criteria in data.totals.sum) {
+        sums[criteria] = decodeColumn(data.totals.sum[criteria]);
+        maxima[criteria] = decodeColumn(data.totals.max[criteria]);
+    }
+    for (var i = 0; i < files.length; i++) {
+        var text = data.strings[files[i]];
+        // a file split across several parts of the shard is listed once
+        if (!(text in shard.index)) {
+            shard.index[text] = {text: text, values: {}, max: {}, regions: 0};
+            shard.files.push(shard.index[text]);
+        }
+        var file = shard.index[text];
+        file.regions += regions[i];
+        for (var criteria in sums) {
+            file.values[criteria] = (file.values[criteria] || 0) + sums[criteria][i];
+            if (!(criteria in file.max) || maxima[criteria][i] > file.max[criteria]) {
+                file.max[criteria] = maxima[criteria][i];
+            }
+        }
+    }
+    shard.parts++;
+    if (isShardLoaded(name)) {
+        var callbacks = shardCallbacks[name] || [];
+        delete shardCallbacks[name];
+        for (var i = 0; i < callbacks.length; i++) callbacks[i]();
+    }
+}
+
+/**
+ * Load a shard (unless already loaded) by adding script elements for its data files.
+ * @param {in} name name of the shard
+ * @param {in} callback function to call as soon as the shard is loaded
+ */
+function requireShard(name, callback)
+{
+    if (isShardLoaded(name)) {
+        callback();
+        return;
+    }
+    if (!(name in shardCallbacks)) {
+        shardCallbacks[name] = [];
+        var src = findShard(name).src;
+        for (var i = 0; i < src.length; i++) {
+            var script = document.createElement('script');
+            script.src = combinedShards.path + "/" + src[i];
+            document.head.appendChild(script);
+        }
+    }
+    shardCallbacks[name].push(callback);
 }
 
 /**
- * Create a filelist by filtering 'combined' based on criteria in combined's column col.
- * @param {in} col Column within combined which holds the values the fillist will contain as criteria
+ * Create the filelist for the files of all shards loaded so far. A shard not loaded yet is
+ * represented by a single entry showing the shard's total.
+ * @param {in} criteria Mnemonic of the criteria the filelist will contain as values (for compatibility
+ *             a column index of the former 'combined' array is accepted as well)
  */
-function createFilelist(col)
+function createFilelist(criteria)
 {
+    if (typeof criteria == "number") {
+        criteria = combinedShards.criterias[criteria - 6];
+    }
+    filelist_criteria = criteria;
     filelist = new Array;
 
-    for (var i = 0; i < combined.length; i++)
+    var fileCount = 0;
+    for (var i = 0; i < combinedShards.shards.length; i++) {
+        fileCount += combinedShards.shards[i].files;
+    }
+    for (var i = 0; i < combinedShards.shards.length; i++)
     {
-        if (filelist.length == 0) {
-            filelist.push(new FilelistEntry(combined[i][0],  combined[i][col]));
+        var shard = combinedShards.shards[i];
+        if (isShardLoaded(shard.name)) {
+            var files = combinedData[shard.name].files;
+            for (var f = 0; f < files.length; f++) {
+                filelist.push(new FilelistEntry(files[f].text, files[f].values[criteria] || 0));
+            }
         } else {
-            if (filelist[filelist.length-1].text == combined[i][0]) {
-                // we already know this file and add col
-                if (!isNaN(combined[i][col])) {
-                    filelist[filelist.length-1].value += combined[i][col];
-                }
-            } else {
-                filelist.push(new FilelistEntry(combined[i][0],  combined[i][col]));
+            filelist.push(new FilelistEntry("/" + shard.name + "/ [" + shard.files + " files]", shard.totals[criteria] || 0, shard.name));
+            if (fileCount <= autoloadFiles) {
+                requireShard(shard.name, refreshFilelist);
             }
         }
-        // autogenerated combined array may contain empty entries; count those as 0
-        if (isNaN(filelist[filelist.length-1].value)) {
-            filelist[filelist.length-1].value = 0;
-        }
     }
+    // re-apply the sort applied last
+    filelist_permutations = {};
+    filelist_permutation = filelist_sortFunc ? getPermutation(filelist_sortFunc) : null;
 }
 
 /**
- * Create the filelist entries by creating a div with classname "tooltip" shwowing "text" 
- * and having a partial filled background
- * @param {in} text Text to show up
- * @param {in} fillPercent Position (from left to right) up to fill background
- * @param {in} value Tooltip text to show
+ * Re-create and re-populate the filelist, e. g. after a shard got loaded.
  */
-function createElement(text, fillPercent, value, color, tooltipLabel){
-    var container = document.getElementById('filelist_body');
+function refreshFilelist()
+{
+    clearFilelist_body();
+    createFilelist(filelist_criteria);
+    populateFilelist_body(filelist_body_color, filelist_body_tooltip);
+}
+
+// height of a row of the filelist in pixels, measured when the first row is shown
+var filelist_rowHeight = 0;
+// rows rendered above and below the visible part of the filelist
+var filelist_overscan = 10;
+// indices into 'filelist' in the order shown, null as long as the filelist is not sorted
+var filelist_permutation = null;
+// permutations computed for the current filelist: name of sort function -> ascending permutation
+var filelist_permutations = {};
+// maximum value of the files in the filelist, 100% of the background bar
+var filelist_max = 0;
+// DOM elements of the rows currently shown, re-used while scrolling
+var filelist_rows = [];
+
+/**
+ * Return the ascending permutation of 'filelist' according to sortFunc. Every permutation is
+ * computed once per filelist, descending order reads it backwards.
+ */
+function getPermutation(sortFunc)
+{
+    if (!(sortFunc.name in filelist_permutations)) {
+        var permutation = new Array(filelist.length);
+        for (var i = 0; i < filelist.length; i++) permutation[i] = i;
+        permutation.sort(function (a, b) {return sortFunc(filelist[a], filelist[b]);});
+        filelist_permutations[sortFunc.name] = Int32Array.from(permutation);
+    }
+    return filelist_permutations[sortFunc.name];
+}
+
+/**
+ * Return the entry shown at position 'position' of the filelist.
+ */
+function filelistEntryAt(position)
+{
+    if (filelist_permutation === null) return filelist[position];
+    if (filelist_order < 0) position = filelist.length - 1 - position;
+    return filelist[filelist_permutation[position]];
+}
+
+/**
+ * Create a DOM element for a row of the filelist: a div with classname "tooltip" showing
+ * the text and having a partial filled background, which contains the tooltip as span.
+ */
+function createElement(){
     var newElm = document.createElement('div');
-    newElm.innerText = text;
     newElm.className = "tooltip";
-    newElm.style = "background-image: linear-gradient(90deg, " + color + " 0%," + color + " " + fillPercent + "%,rgba(0,0,0,0) " + fillPercent + "%)";
-    newElm.addEventListener('click', function () {document.getElementById('details_wrapper').setAttribute('src', "." + text + ".html")});
+    newElm.appendChild(document.createTextNode(""));
     var elmTooltip = document.createElement('span');
-    elmTooltip.innerHTML = tooltipLabel + " <b>" + value + "</b>";
     elmTooltip.setAttribute('role', 'tooltip');
     newElm.appendChild(elmTooltip);
-    container.appendChild(newElm);
+    return newElm;
+}
+
+/**
+ * Show a filelist entry in a row created by createElement().
+ * @param {in} position Position of the entry in the filelist
+ * @param {in} fillPercent Position (from left to right) up to fill background
+ */
+function updateElement(elm, position, fillPercent, color, tooltipLabel)
+{
+    var entry = filelistEntryAt(position);
+    elm.firstChild.nodeValue = entry.text;
+    elm.className = (entry.shard === undefined) ? "tooltip" : "tooltip shard";
+    elm.style.backgroundImage = "linear-gradient(90deg, " + color + " 0%," + color + " " + fillPercent + "%,rgba(0,0,0,0) " + fillPercent + "%)";
+    elm.setAttribute('data-position', position);
+    elm.lastChild.innerHTML = tooltipLabel + " <b>" + entry.value + "</b>";
+}
 
+/**
+ * Single click handler of the filelist: shows the details of a file resp. loads a shard.
+ */
+function onFilelistClick(event)
+{
+    var elm = event.target;
+    while (elm && !(elm.getAttribute && elm.getAttribute('data-position') !== null)) elm = elm.parentNode;
+    if (!elm) return;
+    var entry = filelistEntryAt(parseInt(elm.getAttribute('data-position')));
+    if (entry.shard === undefined) {
+        document.getElementById('details_wrapper').setAttribute('src', "." + entry.text + ".html");
+    } else {
+        requireShard(entry.shard, refreshFilelist);
+    }
+}
+
+/**
+ * Create the rows of the filelist which are visible in the filelist body (plus some overscan).
+ * Only these rows exist in the DOM, a spacer element keeps the height of the complete list.
+ */
+function renderFilelistWindow()
+{
+    var container = document.getElementById('filelist_body');
+    var spacer = document.getElementById('filelist_spacer');
+    var view = document.getElementById('filelist_window');
+    if (!spacer || !view) return;
+    if (filelist_rowHeight == 0 && filelist.length > 0) {
+        var probe = createElement();
+        updateElement(probe, 0, 0, filelist_body_color, filelist_body_tooltip);
+        view.appendChild(probe);
+        filelist_rowHeight = probe.offsetHeight || 16;
+        view.removeChild(probe);
+    }
+    var rowHeight = filelist_rowHeight || 16;
+    spacer.style.height = (filelist.length * rowHeight) + "px";
+    var first = Math.max(0, Math.floor(container.scrollTop / rowHeight) - filelist_overscan);
+    var count = Math.min(filelist.length - first, Math.ceil((container.clientHeight || window.innerHeight) / rowHeight) + 2 * filelist_overscan);
+    view.style.top = (first * rowHeight) + "px";
+    while (filelist_rows.length < count) {
+        filelist_rows.push(view.appendChild(createElement()));
+    }
+    while (filelist_rows.length > count) {
+        view.removeChild(filelist_rows.pop());
+    }
+    for (var i = 0; i < count; i++) {
+        var value = filelistEntryAt(first + i).value;
+        var fillPercent = (filelist_max > 0) ? Math.min(100, Math.round(value / filelist_max * 100)) : 0;
+        updateElement(filelist_rows[i], first + i, fillPercent, filelist_body_color, filelist_body_tooltip);
+    }
 }
 // use of global variables as I don't know how to pass additional paramters to sort function
 var order = 1;
+// sort function applied last, re-applied when the filelist gets re-created
+var filelist_sortFunc;
+// order of the sort applied last: 1 ascending, -1 descending
+var filelist_order = 1;
 
 function sortFuncAlphabetic(a, b)
 {
-    var relation;
-
-    if (a.text < b.text) relation = -1 
-    else if (b.text < a.text) relation = 1
-    else relation = 0;
-
-    return (order * relation);
+    if (a.text < b.text) return -1;
+    if (b.text < a.text) return 1;
+    return 0;
 }
 
 function sortFuncNumeric(a, b)
 {
-    var relation;
-
-    if (a.value < b.value) relation = -1 
-    else if (b.value < a.value) relation = 1
-    else relation = 0;
-
-    return (order * relation);
+    if (a.value < b.value) return -1;
+    if (b.value < a.value) return 1;
+    return 0;
 }
 
 function clearFilelist_body()
 {
     var container = document.getElementById('filelist_body');
     container.textContent = '';
+    filelist_rows = [];
 }
 
 var filelist_body_color;
 var filelist_body_tooltip;
 /**
- * For each entry in the array filelist dynamically create a DOM element.
+ * Show the array filelist in the filelist body. Only the visible rows are created as DOM
+ * elements, further rows are created while scrolling.
  */
 function populateFilelist_body(color, tooltipLabel)
 {
-    var max = 0
-    for (var i = 0; i < filelist.length; i++) 
+    filelist_body_color = color;
+    filelist_body_tooltip = tooltipLabel;
+    // scale by files only, entries of shards not loaded yet are capped at 100%
+    filelist_max = 0;
+    for (var i = 0; i < filelist.length; i++)
     {
-        if (filelist[i].value > max) max = filelist[i].value 
+        if (filelist[i].shard === undefined && filelist[i].value > filelist_max) filelist_max = filelist[i].value;
     }
-    for (var i = 0; i < filelist.length; i++) 
-    {
-        createElement(filelist[i].text, Math.round(filelist[i].value / max * 100), filelist[i].value, color, tooltipLabel);
+    var container = document.getElementById('filelist_body');
+    if (!document.getElementById('filelist_spacer')) {
+        container.textContent = '';
+        filelist_rows = [];
+        var spacer = document.createElement('div');
+        spacer.id = 'filelist_spacer';
+        var view = document.createElement('div');
+        view.id = 'filelist_window';
+        spacer.appendChild(view);
+        container.appendChild(spacer);
     }
-    filelist_body_color = color;
-    filelist_body_tooltip = tooltipLabel; 
+    if (!container.getAttribute('data-listening')) {
+        container.setAttribute('data-listening', 'true');
+        container.addEventListener('click', onFilelistClick);
+        container.addEventListener('scroll', renderFilelistWindow);
+        window.addEventListener('resize', renderFilelistWindow);
+    }
+    renderFilelistWindow();
 }
 
-function showAlphabetic()
+/**
+ * Sort the filelist by applying the (precomputed) permutation of sortFunc in the order given
+ * by 'order', which is toggled afterwards.
+ */
+function showSorted(sortFunc)
 {
-    clearFilelist_body();
-    filelist.sort(sortFuncAlphabetic);
+    filelist_sortFunc = sortFunc;
+    filelist_order = order;
+    filelist_permutation = getPermutation(sortFunc);
+    document.getElementById('filelist_body').scrollTop = 0;
     populateFilelist_body(filelist_body_color, filelist_body_tooltip);
     order = order * -1;
+}
+
+function showAlphabetic()
+{
+    showSorted(sortFuncAlphabetic);
     elem = document.getElementById("sortAlphabetic");
     if (order > 0)
     {
@@ -136,10 +368,7 @@ function showAlphabetic()
 }
 function showNumeric()
 {
-    clearFilelist_body();
-    filelist.sort(sortFuncNumeric);
-    populateFilelist_body(filelist_body_color, filelist_body_tooltip);
-    order = order * -1;
+    showSorted(sortFuncNumeric);
     elem = document.getElementById("sortAlphabetic");
     if (order > 0)
     {
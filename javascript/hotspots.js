@@ -0,0 +1,86 @@
+/**
+ * @file hotspots.js
+ * @copyright (c) 2020 Marc Stoerzel
+ *
+ * Functions to list the regions and files with the highest values per criteria. The data need
+ * to be defined as global value 'hotspots', which is auto generated by canalyse.py (cf. file
+ * MODULE.hotspots.js in the data directory). Only this small index is loaded, not the detailed
+ * data of the module.
+ */
+
+function hotspotsLabel(criteria)
+{
+    if (typeof DiagramStyles !== 'undefined' && DiagramStyles.has(criteria)) return DiagramStyles.get(criteria).criteriaLabel;
+    return criteria;
+}
+
+function appendCell(tr, tag, content)
+{
+    var cell = document.createElement(tag);
+    if (typeof content === 'object') {
+        cell.appendChild(content);
+    } else {
+        cell.textContent = content;
+    }
+    tr.appendChild(cell);
+}
+
+/**
+ * Create a link to a region or file, shown in the details area of index.html.
+ */
+function hotspotLink(text, href)
+{
+    var link = document.createElement('a');
+    link.textContent = text;
+    link.setAttribute('href', href);
+    link.setAttribute('target', 'details_frame');
+    return link;
+}
+
+/**
+ * Render the hotspots of criteria, either the regions or the files ('kind').
+ */
+function showHotspots(criteria, kind)
+{
+    var table = document.getElementById('hotspots_table');
+    table.textContent = '';
+    var entries = hotspots.hotspots[criteria][kind];
+    var header = document.createElement('tr');
+    var titles = (kind == 'regions') ? ['#', hotspotsLabel(criteria), 'region', 'type', 'lines', 'file']
+        : ['#', hotspotsLabel(criteria), 'file'];
+    for (var i = 0; i < titles.length; i++) appendCell(header, 'th', titles[i]);
+    table.appendChild(header);
+    for (var i = 0; i < entries.length; i++) {
+        var entry = entries[i];
+        var tr = document.createElement('tr');
+        appendCell(tr, 'td', i + 1);
+        appendCell(tr, 'td', entry[0]);
+        if (kind == 'regions') {
+            appendCell(tr, 'td', hotspotLink(entry[2] || entry[1], entry[6]));
+            appendCell(tr, 'td', entry[3]);
+            appendCell(tr, 'td', entry[4] + ' - ' + entry[5]);
+            appendCell(tr, 'td', entry[1]);
+        } else {
+            appendCell(tr, 'td', hotspotLink(entry[1], entry[2]));
+        }
+        table.appendChild(tr);
+    }
+}
+
+function initHotspots()
+{
+    var select = document.getElementById('hotspots_criteria');
+    var kind = document.getElementById('hotspots_kind');
+    for (var i = 0; i < hotspots.criterias.length; i++) {
+        var option = document.createElement('option');
+        option.value = hotspots.criterias[i];
+        option.textContent = hotspotsLabel(hotspots.criterias[i]);
+        select.appendChild(option);
+    }
+    select.value = hotspots.criterias[0];
+    kind.value = 'regions';
+    var update = function () { showHotspots(select.value, kind.value); };
+    select.addEventListener('change', update);
+    kind.addEventListener('change', update);
+    update();
+}
@@ -0,0 +1,263 @@
+/**
+ * @file rollup.js
+ * @copyright (c) 2020 Marc Stoerzel
+ *
+ * Functions to show the criteria rolled up along the directory tree of a module, as drill-down
+ * table and treemap of the subdirectories of the current directory. The data need to be defined
+ * as global value 'directoryRollup', which is auto generated by canalyse.py (cf. file
+ * MODULE.rollup.js in the data directory). Requires columns.js.
+ */
+
+// decoded columns of 'directoryRollup' and per directory the array of its subdirectories
+var rollup_data = null;
+// directory and criteria currently shown
+var rollup_directory = 0;
+var rollup_criteria;
+
+function decodeRollup()
+{
+    var data = {names: directoryRollup.names, children: [], sum: {}, max: {}, mean: {}};
+    var columns = ['parent', 'files', 'totalFiles', 'regions'];
+    for (var i = 0; i < columns.length; i++) {
+        data[columns[i]] = decodeColumn(directoryRollup[columns[i]]);
+    }
+    for (var criteria in directoryRollup.sum) {
+        data.sum[criteria] = decodeColumn(directoryRollup.sum[criteria]);
+        data.max[criteria] = decodeColumn(directoryRollup.max[criteria]);
+        data.mean[criteria] = decodeColumn(directoryRollup.mean[criteria]);
+    }
+    for (var d = 0; d < data.names.length; d++) {
+        data.children.push([]);
+        if (data.parent[d] >= 0) data.children[data.parent[d]].push(d);
+    }
+    return data;
+}
+
+/**
+ * Return the path of directory d, e. g. 'module/dir/subdir'.
+ */
+function directoryPath(d)
+{
+    var names = [];
+    for (; d >= 0; d = rollup_data.parent[d]) names.unshift(rollup_data.names[d]);
+    return names.join('/');
+}
+
+/**
+ * Return the index of the directory with the path given, or 0 if there is no such directory.
+ */
+function findDirectory(path)
+{
+    var names = path.split('/');
+    var d = 0;
+    for (var i = 1; i < names.length; i++) {
+        var children = rollup_data.children[d];
+        var next = -1;
+        for (var k = 0; k < children.length; k++) {
+            if (rollup_data.names[children[k]] == names[i]) next = children[k];
+        }
+        if (next < 0) return 0;
+        d = next;
+    }
+    return d;
+}
+
+function criteriaLabel(criteria)
+{
+    if (typeof DiagramStyles !== 'undefined' && DiagramStyles.has(criteria)) return DiagramStyles.get(criteria).criteriaLabel;
+    return criteria;
+}
+
+function criteriaColor(criteria)
+{
+    if (typeof DiagramStyles !== 'undefined' && DiagramStyles.has(criteria)) return DiagramStyles.get(criteria).backgroundColor;
+    return 'lightgrey';
+}
+
+function formatNumber(value)
+{
+    return Number.isInteger(value) ? String(value) : value.toFixed(2);
+}
+
+/**
+ * Render the path of the current directory, each parent directory links to its level.
+ */
+function renderBreadcrumb()
+{
+    var elem = document.getElementById('rollup_path');
+    elem.textContent = '';
+    var path = [];
+    for (var d = rollup_directory; d >= 0; d = rollup_data.parent[d]) path.unshift(d);
+    for (var i = 0; i < path.length; i++) {
+        if (i > 0) elem.appendChild(document.createTextNode(' / '));
+        var link = document.createElement('a');
+        link.textContent = rollup_data.names[path[i]];
+        link.setAttribute('href', '#' + encodeURI(directoryPath(path[i])));
+        elem.appendChild(link);
+    }
+}
+
+/**
+ * Render the table of the subdirectories of the current directory, largest sum first. The first
+ * row holds the totals of the current directory itself.
+ */
+function renderTable(children)
+{
+    var table = document.getElementById('rollup_table');
+    table.textContent = '';
+    var header = document.createElement('tr');
+    var titles = ['directory', 'files', 'regions', 'sum', 'max', 'mean per file'];
+    for (var i = 0; i < titles.length; i++) {
+        var th = document.createElement('th');
+        th.textContent = titles[i];
+        header.appendChild(th);
+    }
+    table.appendChild(header);
+    var rows = [rollup_directory].concat(children);
+    for (var i = 0; i < rows.length; i++) {
+        var d = rows[i];
+        var tr = document.createElement('tr');
+        var name = (i == 0) ? '(total)' : rollup_data.names[d];
+        var cells = [name, rollup_data.totalFiles[d], rollup_data.regions[d], rollup_data.sum[rollup_criteria][d],
+            rollup_data.max[rollup_criteria][d], rollup_data.mean[rollup_criteria][d]];
+        for (var k = 0; k < cells.length; k++) {
+            var td = document.createElement('td');
+            if (k == 0 && i > 0) {
+                var link = document.createElement('a');
+                link.textContent = name;
+                link.setAttribute('href', '#' + encodeURI(directoryPath(d)));
+                td.appendChild(link);
+            } else {
+                td.textContent = (k == 0) ? name : formatNumber(cells[k]);
+            }
+            tr.appendChild(td);
+        }
+        table.appendChild(tr);
+    }
+}
+
+/**
+ * Lay out the values (sorted descending, all > 0) within the rectangle {x, y, w, h} as squarified
+ * treemap: rows of values are laid out along the shorter side as long as the worst aspect ratio of
+ * the row improves.
+ * @return array of rectangles {x, y, w, h}, one per value
+ */
+function squarify(values, rect)
+{
+    var total = 0;
+    for (var i = 0; i < values.length; i++) total += values[i];
+    var scale = (rect.w * rect.h) / total;
+    var rects = [];
+    var x = rect.x, y = rect.y, w = rect.w, h = rect.h;
+    var i = 0;
+    while (i < values.length) {
+        var side = Math.min(w, h);
+        var rowSum = 0, rowMin = Infinity, rowMax = 0, worst = Infinity;
+        var end = i;
+        while (end < values.length) {
+            var area = values[end] * scale;
+            var sum = rowSum + area;
+            var min = Math.min(rowMin, area), max = Math.max(rowMax, area);
+            var ratio = Math.max(side * side * max / (sum * sum), (sum * sum) / (side * side * min));
+            if (ratio > worst) break;
+            rowSum = sum; rowMin = min; rowMax = max; worst = ratio;
+            end++;
+        }
+        var thickness = rowSum / side;
+        var offset = 0;
+        for (var k = i; k < end; k++) {
+            var length = values[k] * scale / thickness;
+            if (w >= h) {
+                rects.push({x: x, y: y + offset, w: thickness, h: length});
+            } else {
+                rects.push({x: x + offset, y: y, w: length, h: thickness});
+            }
+            offset += length;
+        }
+        if (w >= h) {
+            x += thickness; w -= thickness;
+        } else {
+            y += thickness; h -= thickness;
+        }
+        i = end;
+    }
+    return rects;
+}
+
+/**
+ * Render the treemap of the subdirectories of the current directory: the area of a tile is
+ * proportional to the sum of the criteria, its opacity to the mean per file.
+ */
+function renderTreemap(children)
+{
+    var container = document.getElementById('rollup_treemap');
+    container.textContent = '';
+    var sums = rollup_data.sum[rollup_criteria];
+    var means = rollup_data.mean[rollup_criteria];
+    var tiles = children.filter(function (d) { return sums[d] > 0; });
+    if (tiles.length == 0) return;
+    var maxMean = 0;
+    for (var i = 0; i < tiles.length; i++) maxMean = Math.max(maxMean, means[tiles[i]]);
+    var rects = squarify(tiles.map(function (d) { return sums[d]; }),
+        {x: 0, y: 0, w: container.clientWidth || 600, h: container.clientHeight || 300});
+    for (var i = 0; i < tiles.length; i++) {
+        var d = tiles[i];
+        var tile = document.createElement('a');
+        tile.className = 'rollup_tile';
+        tile.setAttribute('href', '#' + encodeURI(directoryPath(d)));
+        tile.setAttribute('title', rollup_data.names[d] + ': sum ' + formatNumber(sums[d]) + ', max ' +
+            formatNumber(rollup_data.max[rollup_criteria][d]) + ', mean ' + formatNumber(means[d]) + ', ' +
+            rollup_data.totalFiles[d] + ' files');
+        tile.textContent = rollup_data.names[d];
+        tile.style.left = rects[i].x + 'px';
+        tile.style.top = rects[i].y + 'px';
+        tile.style.width = Math.max(rects[i].w - 1, 0) + 'px';
+        tile.style.height = Math.max(rects[i].h - 1, 0) + 'px';
+        tile.style.backgroundColor = criteriaColor(rollup_criteria);
+        tile.style.opacity = maxMean > 0 ? 0.3 + 0.7 * means[d] / maxMean : 1;
+        container.appendChild(tile);
+    }
+}
+
+/**
+ * Show directory d with the criteria currently selected.
+ */
+function showDirectory(d)
+{
+    rollup_directory = d;
+    var sums = rollup_data.sum[rollup_criteria];
+    var children = rollup_data.children[d].slice();
+    children.sort(function (a, b) { return sums[b] - sums[a]; });
+    renderBreadcrumb();
+    renderTreemap(children);
+    renderTable(children);
+    document.getElementById('rollup_up').disabled = (d == 0);
+}
+
+function onRollupHashChange()
+{
+    showDirectory(findDirectory(decodeURI(location.hash.substring(1))));
+}
+
+function initRollup()
+{
+    rollup_data = decodeRollup();
+    var select = document.getElementById('rollup_criteria');
+    for (var i = 0; i < directoryRollup.criterias.length; i++) {
+        var option = document.createElement('option');
+        option.value = directoryRollup.criterias[i];
+        option.textContent = criteriaLabel(directoryRollup.criterias[i]);
+        select.appendChild(option);
+    }
+    rollup_criteria = directoryRollup.criterias[0];
+    select.addEventListener('change', function () {
+        rollup_criteria = select.value;
+        showDirectory(rollup_directory);
+    });
+    document.getElementById('rollup_up').addEventListener('click', function () {
+        if (rollup_directory > 0) location.hash = '#' + encodeURI(directoryPath(rollup_data.parent[rollup_directory]));
+    });
+    window.addEventListener('hashchange', onRollupHashChange);
+    window.addEventListener('resize', function () { showDirectory(rollup_directory); });
+    onRollupHashChange();
+}
@@ -0,0 +1,322 @@
+/**
+ * @file search.js
+ * @copyright (c) 2020 Marc Stoerzel
+ *
+ * Functions to search the files and regions of a module by parts of their names. The index is
+ * prebuilt by canalyse.py (cf. script/searchindex.py): the global value 'searchIndex' (file
+ * MODULE.search.js in the data directory) lists the number of buckets of trigrams and the first
+ * name of each chunk of documents, which are loaded on demand. A query loads the buckets of its
+ * trigrams, intersects their posting lists and loads the chunks of the candidates only, to check
+ * their names. Documents are ordered by name, so candidates are checked from the chunk the query
+ * sorts into on: names equal to or starting with the query are found within a few chunks.
+ * Requires columns.js.
+ */
+
+// buckets loaded so far: bucket -> {grams: trigram -> index, offsets, docs}
+var searchBuckets = {};
+// chunks loaded so far: chunk -> {strings, lower (strings in lower case), paths, pages, name, type, file, lineStart, lineEnd}
+var searchChunks = {};
+// data files loaded so far: filename -> true
+var searchFiles = {};
+// functions to call as soon as a data file is loaded: filename -> array of callbacks
+var searchCallbacks = {};
+// maximum number of results listed
+var searchLimit = 100;
+// query currently shown; callbacks of former queries are dropped
+var searchQuery = '';
+
+/**
+ * Return the bucket of a trigram, hashed as by searchindex.bucketOf().
+ */
+function searchBucketOf(gram)
+{
+    var value = 0;
+    for (var i = 0; i < gram.length; i++) {
+        value = value * 31 + gram.charCodeAt(i);
+    }
+    return value % searchIndex.buckets;
+}
+
+function searchBucketFile(b)
+{
+    return searchIndex.basename + '.search.' + b + '.js';
+}
+
+function searchChunkFile(k)
+{
+    return searchIndex.basename + '.search.docs.' + k + '.js';
+}
+
+function searchLoaded(filename)
+{
+    searchFiles[filename] = true;
+    var callbacks = searchCallbacks[filename] || [];
+    delete searchCallbacks[filename];
+    for (var i = 0; i < callbacks.length; i++) callbacks[i]();
+}
+
+/**
+ * Called by the data file of a bucket when loaded.
+ */
+function loadSearchBucket(b, data)
+{
+    var grams = {};
+    for (var i = 0; i < data.grams.length; i++) grams[data.grams[i]] = i;
+    searchBuckets[b] = {grams: grams, offsets: decodeColumn(data.offsets), docs: decodeColumn(data.docs)};
+    searchLoaded(searchBucketFile(b));
+}
+
+/**
+ * Called by the data file of a chunk of documents when loaded.
+ */
+function loadSearchChunk(k, data)
+{
+    var chunk = {strings: data.strings, lower: data.strings.map(function (text) { return text.toLowerCase(); }),
+        paths: data.paths, pages: data.pages};
+    var columns = ['name', 'type', 'file', 'lineStart', 'lineEnd'];
+    for (var i = 0; i < columns.length; i++) {
+        chunk[columns[i]] = decodeColumn(data[columns[i]]);
+    }
+    searchChunks[k] = chunk;
+    searchLoaded(searchChunkFile(k));
+}
+
+/**
+ * Load the data files not loaded yet by adding script elements for them.
+ * @param {in} filenames names of the data files
+ * @param {in} callback function to call as soon as all of them are loaded
+ */
+function requireSearchFiles(filenames, callback)
+{
+    var missing = filenames.filter(function (filename) { return !(filename in searchFiles); });
+    var pending = missing.length;
+    if (pending == 0) {
+        callback();
+        return;
+    }
+    var done = function () { if (--pending == 0) callback(); };
+    for (var i = 0; i < missing.length; i++) {
+        if (!(missing[i] in searchCallbacks)) {
+            searchCallbacks[missing[i]] = [];
+            var script = document.createElement('script');
+            script.src = searchIndex.path + '/' + missing[i];
+            document.head.appendChild(script);
+        }
+        searchCallbacks[missing[i]].push(done);
+    }
+}
+
+/**
+ * Return the distinct trigrams of a text.
+ */
+function searchTrigrams(text)
+{
+    var grams = {};
+    for (var i = 0; i + 3 <= text.length; i++) grams[text.substring(i, i + 3)] = true;
+    return Object.keys(grams);
+}
+
+/**
+ * Return the posting list of a trigram (its bucket is loaded), null if no document contains it.
+ */
+function searchPostings(gram)
+{
+    var bucket = searchBuckets[searchBucketOf(gram)];
+    var i = bucket.grams[gram];
+    if (i === undefined) return null;
+    return bucket.docs.subarray(bucket.offsets[i], bucket.offsets[i + 1]);
+}
+
+/**
+ * Intersect two ascending lists of document ids.
+ */
+function searchIntersect(a, b)
+{
+    var result = new Int32Array(Math.min(a.length, b.length));
+    var n = 0;
+    for (var i = 0, j = 0; i < a.length && j < b.length; ) {
+        if (a[i] < b[j]) {
+            i++;
+        } else if (a[i] > b[j]) {
+            j++;
+        } else {
+            result[n++] = a[i];
+            i++;
+            j++;
+        }
+    }
+    return result.subarray(0, n);
+}
+
+/**
+ * Return the documents containing all trigrams of the query, ascending. As the trigrams may occur
+ * anywhere within a name, the candidates still need to be checked.
+ */
+function searchCandidates(grams)
+{
+    var lists = [];
+    for (var i = 0; i < grams.length; i++) {
+        var postings = searchPostings(grams[i]);
+        if (postings === null) return new Int32Array(0);
+        lists.push(postings);
+    }
+    // starting with the shortest list keeps the intermediate results small
+    lists.sort(function (a, b) { return a.length - b.length; });
+    var candidates = lists[0];
+    for (var i = 1; i < lists.length && candidates.length > 0; i++) {
+        candidates = searchIntersect(candidates, lists[i]);
+    }
+    return candidates;
+}
+
+/**
+ * Return the position of the first candidate within the chunk the query sorts into, i. e. the
+ * last chunk whose first name is not behind the query.
+ */
+function searchStart(query, candidates)
+{
+    var names = searchIndex.chunks;
+    var low = 0, high = names.length;
+    while (high - low > 1) {
+        var middle = (low + high) >> 1;
+        if (names[middle] <= query) low = middle; else high = middle;
+    }
+    var first = low * searchIndex.chunk;
+    low = 0;
+    high = candidates.length;
+    while (low < high) {
+        var middle = (low + high) >> 1;
+        if (candidates[middle] < first) low = middle + 1; else high = middle;
+    }
+    return low;
+}
+
+/**
+ * Check the candidates against the query, until searchLimit results are found. Checking starts
+ * at position 'offset' (cf. searchStart()) and wraps around; 'n' candidates are checked already.
+ * Chunks not loaded yet are loaded for the next candidates at once, then checking goes on; the
+ * results found so far are listed meanwhile.
+ */
+function checkSearchCandidates(query, candidates, offset, n, results)
+{
+    var chunkSize = searchIndex.chunk;
+    for (; n < candidates.length && results.length < searchLimit; n++) {
+        var candidate = candidates[(offset + n) % candidates.length];
+        var k = Math.floor(candidate / chunkSize);
+        var chunk = searchChunks[k];
+        if (chunk === undefined) break;
+        var doc = candidate - k * chunkSize;
+        if (chunk.lower[chunk.name[doc]].indexOf(query) >= 0) {
+            results.push({chunk: chunk, doc: doc});
+        }
+    }
+    if (n < candidates.length && results.length < searchLimit) {
+        var chunks = [];
+        for (var j = n; j < candidates.length && chunks.length < 8; j++) {
+            var filename = searchChunkFile(Math.floor(candidates[(offset + j) % candidates.length] / chunkSize));
+            if (chunks.indexOf(filename) < 0) chunks.push(filename);
+        }
+        if (results.length > 0) showSearchResults(query, results, true, true);
+        requireSearchFiles(chunks, function () {
+            if (query == searchQuery) checkSearchCandidates(query, candidates, offset, n, results);
+        });
+        return;
+    }
+    showSearchResults(query, results, n < candidates.length, false);
+}
+
+/**
+ * Return the link to a result, the region (or the top of the file) within its sourcecode HTML file.
+ */
+function searchLink(chunk, doc)
+{
+    var file = chunk.file[doc];
+    var page = chunk.pages[file] || chunk.paths[file] + '.html';
+    var anchor = (chunk.lineEnd[doc] > 0) ? chunk.lineStart[doc] + '-' + chunk.lineEnd[doc] : 'top';
+    return page + '#' + page.substring(page.lastIndexOf('/') + 1) + '@' + anchor;
+}
+
+function searchCell(tr, tag, content)
+{
+    var cell = document.createElement(tag);
+    if (typeof content === 'object') {
+        cell.appendChild(content);
+    } else {
+        cell.textContent = content;
+    }
+    tr.appendChild(cell);
+}
+
+/**
+ * List the results, names equal to the query first, then names starting with it.
+ * @param {in} more true if there are candidates not checked
+ * @param {in} searching true if checking goes on, false if the limit was reached or all are checked
+ */
+function showSearchResults(query, results, more, searching)
+{
+    var rank = function (result) {
+        var name = result.chunk.lower[result.chunk.name[result.doc]];
+        return (name == query) ? 0 : (name.lastIndexOf(query, 0) == 0) ? 1 : 2;
+    };
+    var ranked = results.map(function (result, i) { return {result: result, rank: rank(result), i: i}; });
+    ranked.sort(function (a, b) { return (a.rank - b.rank) || (a.i - b.i); });
+    var table = document.getElementById('search_table');
+    table.textContent = '';
+    var header = document.createElement('tr');
+    var titles = ['name', 'type', 'lines', 'file'];
+    for (var i = 0; i < titles.length; i++) searchCell(header, 'th', titles[i]);
+    table.appendChild(header);
+    for (var i = 0; i < ranked.length; i++) {
+        var chunk = ranked[i].result.chunk;
+        var doc = ranked[i].result.doc;
+        var link = document.createElement('a');
+        link.textContent = chunk.strings[chunk.name[doc]];
+        link.setAttribute('href', searchLink(chunk, doc));
+        link.setAttribute('target', 'details_frame');
+        var tr = document.createElement('tr');
+        searchCell(tr, 'td', link);
+        searchCell(tr, 'td', chunk.strings[chunk.type[doc]]);
+        searchCell(tr, 'td', (chunk.lineEnd[doc] > 0) ? chunk.lineStart[doc] + ' - ' + chunk.lineEnd[doc] : '');
+        searchCell(tr, 'td', chunk.paths[chunk.file[doc]]);
+        table.appendChild(tr);
+    }
+    document.getElementById('search_status').textContent = results.length
+        + (searching ? ' matches so far, searching ...' : more ? '+ matches, the first ' + searchLimit + ' are listed'
+        : ' matches');
+}
+
+/**
+ * Search the files and regions whose names contain the query (case-insensitive, at least three
+ * characters).
+ */
+function search(text)
+{
+    var query = text.toLowerCase();
+    searchQuery = query;
+    if (query.length < 3) {
+        document.getElementById('search_table').textContent = '';
+        document.getElementById('search_status').textContent = query ? 'type at least 3 characters' : '';
+        return;
+    }
+    var grams = searchTrigrams(query);
+    var buckets = [];
+    for (var i = 0; i < grams.length; i++) {
+        var filename = searchBucketFile(searchBucketOf(grams[i]));
+        if (buckets.indexOf(filename) < 0) buckets.push(filename);
+    }
+    requireSearchFiles(buckets, function () {
+        if (query != searchQuery) return;
+        var candidates = searchCandidates(grams);
+        checkSearchCandidates(query, candidates, searchStart(query, candidates), 0, []);
+    });
+}
+
+function initSearch()
+{
+    var input = document.getElementById('search_query');
+    input.addEventListener('input', function () { search(input.value.trim()); });
+    if (location.hash) {
+        input.value = decodeURIComponent(location.hash.substring(1));
+    }
+    search(input.value.trim());
+}
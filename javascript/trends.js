@@ -0,0 +1,261 @@
+/**
+ * @file trends.js
+ * @copyright (c) 2020 Marc Stoerzel
+ *
+ * Functions to show the trend of a criteria over the most recent runs recorded in the history
+ * (cf. script/history.py), for the module, a directory or a file, and the change of its
+ * subdirectories and files. The data need to be defined as global value 'metricTrends', which is
+ * auto generated by canalyse.py (cf. file MODULE.trends.js in the data directory). The trends of
+ * the files are split by top-level directory into data files calling loadTrendShard(), which are
+ * loaded when a directory below is shown.
+ */
+
+// path currently shown ('' for the module) and criteria selected
+var trends_path = '';
+var trends_criteria;
+// per directory the arrays of its subdirectories and of its files loaded so far
+var trends_children = {};
+// trends of the files loaded so far: path -> criteria -> array of values per run
+var trends_files = {};
+// shards loaded (true) or being loaded (false): name -> boolean
+var trends_shards = {};
+
+function trendsLabel(criteria)
+{
+    if (typeof DiagramStyles !== 'undefined' && DiagramStyles.has(criteria)) return DiagramStyles.get(criteria).criteriaLabel;
+    return criteria;
+}
+
+function trendsColor(criteria)
+{
+    if (typeof DiagramStyles !== 'undefined' && DiagramStyles.has(criteria)) return DiagramStyles.get(criteria).backgroundColor;
+    return 'lightgrey';
+}
+
+function formatTrendValue(value)
+{
+    if (value === null || value === undefined) return '';
+    return Number.isInteger(value) ? String(value) : value.toFixed(2);
+}
+
+/**
+ * Return the parent directory of a path, '' for the entries of the module itself.
+ */
+function trendParent(path)
+{
+    var i = path.lastIndexOf('/');
+    return (i < 0) ? '' : path.substring(0, i);
+}
+
+/**
+ * Return the name of the shard holding the trends of the files of directory path, as split by
+ * canalyse.writeTrendDatafiles().
+ */
+function trendShardOf(path)
+{
+    return (path == '') ? '.' : path.split('/')[0];
+}
+
+function trendChildren(path)
+{
+    if (!(path in trends_children)) trends_children[path] = {directories: [], files: []};
+    return trends_children[path];
+}
+
+/**
+ * Called by the data file of a shard when loaded.
+ */
+function loadTrendShard(name, trends)
+{
+    for (var path in trends) {
+        trends_files[path] = trends[path];
+        trendChildren(trendParent(path)).files.push(path);
+    }
+    trends_shards[name] = true;
+    showTrends(trends_path);
+}
+
+/**
+ * Return the trends of path (a directory or a file loaded), null if they are not known (yet).
+ */
+function trendsOf(path)
+{
+    return metricTrends.paths[path] || trends_files[path] || null;
+}
+
+/**
+ * Start to load the shard of the files of directory path, unless it is loaded or there is none.
+ * @return true if the shard is loaded
+ */
+function requireTrendShard(path)
+{
+    var name = trendShardOf(path);
+    if (!(name in metricTrends.shards) || trends_shards[name]) return true;
+    if (!(name in trends_shards)) {
+        trends_shards[name] = false;
+        var script = document.createElement('script');
+        script.src = metricTrends.path + '/' + metricTrends.shards[name];
+        document.head.appendChild(script);
+    }
+    return false;
+}
+
+/**
+ * Return the first and the last value of values recorded, undefined if there is none.
+ */
+function trendRange(values)
+{
+    var recorded = values.filter(function (value) { return value !== null; });
+    if (recorded.length == 0) return undefined;
+    return {first: recorded[0], last: recorded[recorded.length - 1]};
+}
+
+/**
+ * Render the path shown, each parent directory links to its level.
+ */
+function renderTrendPath()
+{
+    var elem = document.getElementById('trends_path');
+    elem.textContent = '';
+    var names = (trends_path == '') ? [] : trends_path.split('/');
+    for (var i = 0; i <= names.length; i++) {
+        if (i > 0) elem.appendChild(document.createTextNode(' / '));
+        var link = document.createElement('a');
+        link.textContent = (i == 0) ? metricTrends.module : names[i - 1];
+        link.setAttribute('href', '#' + encodeURI(names.slice(0, i).join('/')));
+        elem.appendChild(link);
+    }
+}
+
+/**
+ * Render the values of the runs as bars, the height of a bar is proportional to its value.
+ */
+function renderTrendChart(values)
+{
+    var chart = document.getElementById('trends_chart');
+    chart.textContent = '';
+    var max = 0;
+    for (var i = 0; i < values.length; i++) max = Math.max(max, values[i] || 0);
+    for (var i = 0; i < values.length; i++) {
+        var bar = document.createElement('div');
+        bar.className = 'trends_bar';
+        bar.style.backgroundColor = trendsColor(trends_criteria);
+        bar.style.height = (max > 0 ? 100 * Math.max(values[i] || 0, 0) / max : 0) + '%';
+        bar.setAttribute('title', metricTrends.runs[i] + ': ' +
+            (values[i] === null ? 'not part of the run' : formatTrendValue(values[i])));
+        chart.appendChild(bar);
+    }
+}
+
+function appendTrendRow(table, cells, tag)
+{
+    var tr = document.createElement('tr');
+    for (var i = 0; i < cells.length; i++) {
+        var cell = document.createElement(tag || 'td');
+        if (typeof cells[i] === 'object') {
+            cell.appendChild(cells[i]);
+        } else {
+            cell.textContent = cells[i];
+        }
+        tr.appendChild(cell);
+    }
+    table.appendChild(tr);
+}
+
+/**
+ * Render the value of each run and its change to the previous run, most recent run first.
+ */
+function renderTrendRuns(values)
+{
+    var table = document.getElementById('trends_runs');
+    table.textContent = '';
+    appendTrendRow(table, ['run', 'time', trendsLabel(trends_criteria), 'change'], 'th');
+    for (var i = values.length - 1; i >= 0; i--) {
+        var change = (i > 0 && values[i] !== null && values[i - 1] !== null) ? values[i] - values[i - 1] : null;
+        appendTrendRow(table, [metricTrends.runs[i], new Date(metricTrends.times[i] * 1000).toLocaleString(),
+            formatTrendValue(values[i]), change ? (change > 0 ? '+' : '') + formatTrendValue(change) : '']);
+    }
+}
+
+/**
+ * Render the subdirectories and files of directory path with their first and last value recorded
+ * and the change in between, largest increase first.
+ */
+function renderTrendChildren(path)
+{
+    var table = document.getElementById('trends_table');
+    table.textContent = '';
+    var children = trendChildren(path);
+    var rows = [];
+    var entries = children.directories.concat(children.files);
+    for (var i = 0; i < entries.length; i++) {
+        var range = trendRange(trendsOf(entries[i])[trends_criteria]);
+        if (range) rows.push({path: entries[i], first: range.first, last: range.last, change: range.last - range.first});
+    }
+    if (rows.length == 0) return;
+    rows.sort(function (a, b) { return b.change - a.change || b.last - a.last; });
+    appendTrendRow(table, ['directory or file', 'first', 'last', 'change'], 'th');
+    for (var i = 0; i < rows.length; i++) {
+        var link = document.createElement('a');
+        link.textContent = rows[i].path.substring(path == '' ? 0 : path.length + 1);
+        link.setAttribute('href', '#' + encodeURI(rows[i].path));
+        appendTrendRow(table, [link, formatTrendValue(rows[i].first), formatTrendValue(rows[i].last),
+            (rows[i].change > 0 ? '+' : '') + formatTrendValue(rows[i].change)]);
+    }
+}
+
+/**
+ * Show the trends of path, a directory or a file; the shard of its files is loaded first if needed.
+ */
+function showTrends(path)
+{
+    trends_path = path;
+    var directory = (path in metricTrends.paths);
+    // a file is found in the shard of its directory
+    if (!requireTrendShard(directory ? path : trendParent(path))) return;
+    var trends = trendsOf(path);
+    if (trends === null) {
+        trends_path = '';
+        trends = trendsOf('');
+        directory = true;
+        if (trends === null) return;
+    }
+    renderTrendPath();
+    renderTrendChart(trends[trends_criteria]);
+    renderTrendRuns(trends[trends_criteria]);
+    if (directory) {
+        renderTrendChildren(trends_path);
+    } else {
+        document.getElementById('trends_table').textContent = '';
+    }
+    document.getElementById('trends_up').disabled = (trends_path == '');
+}
+
+function onTrendsHashChange()
+{
+    showTrends(decodeURI(location.hash.substring(1)));
+}
+
+function initTrends()
+{
+    for (var path in metricTrends.paths) {
+        if (path != '') trendChildren(trendParent(path)).directories.push(path);
+    }
+    var select = document.getElementById('trends_criteria');
+    for (var i = 0; i < metricTrends.criterias.length; i++) {
+        var option = document.createElement('option');
+        option.value = metricTrends.criterias[i];
+        option.textContent = trendsLabel(metricTrends.criterias[i]);
+        select.appendChild(option);
+    }
+    trends_criteria = metricTrends.criterias[0];
+    select.addEventListener('change', function () {
+        trends_criteria = select.value;
+        showTrends(trends_path);
+    });
+    document.getElementById('trends_up').addEventListener('click', function () {
+        if (trends_path != '') location.hash = '#' + encodeURI(trendParent(trends_path));
+    });
+    window.addEventListener('hashchange', onTrendsHashChange);
+    onTrendsHashChange();
+}
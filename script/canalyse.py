@@ -3,7 +3,8 @@
 ##
 # @file canalyse.py
 # @copyright (c) 2020 Marc Stoerzel
-# @brief Parses the csv output of 'metrix++ export' to generate sourcecode HTML-files and optionally a Javascript datafile.
+# @brief Parses the csv output of 'metrix++ export' (or reads the metrix++ database) to generate sourcecode HTML-files
+# and optionally a Javascript datafile.
 #
 #  include{doc} ../README.md
 ##
@@ -16,6 +17,25 @@ import io
 import getopt
 import sys
 import ast
+import mmap
+import errno
+import locale
+import multiprocessing
+import hashlib
+import json
+import collections
+import array
+import base64
+import re
+import time
+import metricstore
+import mppdb
+import rollup
+import hotspots
+import searchindex
+import metricstats
+import highlighter
+import history
 
 ## path from where to start analysis of sourceceode
 SRCPATH = "./../../../SW/Public"
@@ -29,206 +49,772 @@ REPORTDIR_REL = "./html"
 HIGHLIGHT_REL = "./highlight"
 ## stylesheet to use by highlight.js for sourcecode highlighting
 HIGHLIGHT_CSS = "styles/vs.css"
+## highlight C/C++ sourcefiles while generating their HTML files instead of by highlight.js in the browser
+PREHIGHLIGHT = False
 ## html styling and diagram styling settings get here
 STYLE_REL = "./style"
+## path to non-generated javascript files
+JSCRIPT_REL = "./javascript"
 ## dictionary assigning criteria mnenonics to more human readable format 
 CRITERIA_LABELS = {"std.code.complexity.cyclomatic" : "cyclomatic complexity", \
 "std.code.filelines.comments" : "lines of comment", \
 "std.code.lines.code" : "lines of code"}
 GEN_DATAFILE_ONLY = False
+## sourcefiles of at least this size (in bytes) are memory-mapped instead of being read into memory
+MMAP_THRESHOLD = 16 * 1024 * 1024
+## encoding used to decode memory-mapped sourcefiles
+SOURCE_ENCODING = locale.getpreferredencoding(False)
+## number of worker processes generating the HTML files
+JOBS = multiprocessing.cpu_count()
+## pool of worker processes shared by the reports of several modules (cf. 'sourcemetrix.py batch'); if None, each
+#  report starts and stops a pool of its own
+POOL = None
+## pages pending in POOL as tuples (HTMLfileGenerator, result), oldest first; shared by the reports using POOL, such
+#  that the pages of a report can be queued before those of the previous report are done
+POOL_PENDING = collections.deque()
+## regenerate all files regardless of the manifest of the previous run
+FORCE = False
+## metrix++ database to read the metrics from; if None, the csv file DATADIR/MODULE_BASE.csv is read instead
+METRIXDB = None
+## number of regions and files listed per criteria in the index of hotspots
+HOTSPOTS = 500
+## name of the column holding the tags of the files (cf. tag-files.py); a sub-report is generated per tag
+TAG_NAME = "tag"
+## SQLite database to append the metrics of each run to (cf. history.py); no history is kept if None
+HISTORY = None
+## name of the run within HISTORY, e.g. the commit analysed; defaults to the time of the run (cf. defaultRunName())
+RUN_NAME = None
+## number of most recent runs of HISTORY within the trend data files
+TREND_RUNS = 20
+## version of the manifest format; a manifest of a different version is ignored
+MANIFEST_VERSION = 2
 
 loglevels = {"silent" : 0, "standard" : 1, "verbose" : 2}
 LOGLEVEL = 1
+## stream log messages are printed to, e.g. stderr while stdout is taken by the output of 'sourcemetrix.py check'
+LOGSTREAM = sys.stdout
 
 ##
-# Create the opening section of an HTML file.
+# Provide line based access to a memory-mapped sourcefile.
 #
-# A file of name \c path + os.sep + \c filename will be created (existing file will be overwritten) with reference to the
-# generic stylesheet \c style.css and the stylesheet of the Highlight.js package referenced by \c HIGHLIGHT_CSS
+# Very large (e. g. generated) sourcefiles are not read into memory as a whole. Instead the file is mapped and only
+# the offsets of the line starts are kept; lines are decoded on access.
+##
+class MappedSourceLines(object):
+    def __init__(self, srcfile):
+        self.buffer = mmap.mmap(srcfile.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offsets = [0]
+        pos = self.buffer.find(b"\n")
+        while pos >= 0:
+            self.offsets.append(pos + 1)
+            pos = self.buffer.find(b"\n", pos + 1)
+        if self.offsets[-1] == len(self.buffer):
+            # file ends with a newline, there is no partial last line
+            self.offsets.pop()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, linenum):
+        if linenum + 1 < len(self.offsets):
+            line = self.buffer[self.offsets[linenum]:self.offsets[linenum + 1]]
+        else:
+            line = self.buffer[self.offsets[linenum]:]
+        return line.decode(SOURCE_ENCODING, "replace")
+
+    def close(self):
+        self.buffer.close()
+
+##
+# Read a sourcefile once and return its lines.
+#
+# Sourcefiles of at least \c MMAP_THRESHOLD bytes are memory-mapped (cf. MappedSourceLines), smaller ones are read
+# into a list of lines. The returned buffer is meant to be shared by all regions of the file.
+#
+# @param srcfilename    absolute or relative path to the sourcefile
+# @return indexable sequence of lines (each one including its line break)
+##
+def readSourceLines(srcfilename):
+    if os.path.getsize(srcfilename) >= MMAP_THRESHOLD:
+        log(2, "Mapping large sourcefile " + srcfilename)
+        with io.open(srcfilename, "rb") as srcfile:
+            return MappedSourceLines(srcfile)
+    with io.open(srcfilename, "r", errors='replace') as srcfile:
+        return srcfile.readlines()
+
+##
+# Render the opening section of an HTML file.
+#
+# The HTML file of name \c path + os.sep + \c filename will reference the generic stylesheet \c style.css and the
+# stylesheet of the Highlight.js package referenced by \c HIGHLIGHT_CSS
 #
 # @param path       absolute or relative path to the HTML file to be generated. (An OS specific path separator, i. e.
 #                   '/' under Linux, '\' under Windows, etc. will be appended)
 # @param filename   filename of the HTML file to be generated, it shall end by '.html' or alike
+# @param highlighted    True if the sourcecode is highlighted already; highlight.js is not loaded then
+# @return the opening section as unicode string
 ##
-def createHTMLfile(path, filename):
-    if not os.path.exists(path):
-        os.makedirs(path)
+def renderHTMLhead(path, filename, highlighted=False):
     path_rel = os.path.relpath(os.curdir, path)
-    log(2, "Creating HTML file " + path +  os.sep + filename)
-    with io.open(path +  os.sep + filename, "w") as ofile:
-        ofile.write(u"<!DOCTYPE html> \
+    if highlighted:
+        scripts = u""
+    else:
+        scripts = u"    <script src='" + path_rel + os.sep + HIGHLIGHT_REL + os.sep + u"highlight.pack.js'></script>     \n \
+    <script>hljs.initHighlightingOnLoad();</script>  \n "
+    return u"<!DOCTYPE html> \
   <html>      \n \
 	<head>  \n \
-	  <title>")
-        ofile.write(os.path.splitext(filename)[0] + u"</title>")
-        ofile.write(u"	      <link rel='stylesheet' type='text/css' href='" + path_rel + os.sep + STYLE_REL + os.sep + u"/style.css'>\n")
-        ofile.write(u"	      <link rel='stylesheet' type='text/css' href='" + path_rel + os.sep + HIGHLIGHT_REL + os.sep + HIGHLIGHT_CSS + u"'> \n \
-    <script src='" + path_rel + os.sep + HIGHLIGHT_REL + os.sep + u"highlight.pack.js'></script>     \n \
-    <script>hljs.initHighlightingOnLoad();</script>  \n \
+	  <title>" + os.path.splitext(filename)[0] + u"</title>" \
+        + u"	      <link rel='stylesheet' type='text/css' href='" + path_rel + os.sep + STYLE_REL + os.sep + u"/style.css'>\n" \
+        + u"	      <link rel='stylesheet' type='text/css' href='" + path_rel + os.sep + HIGHLIGHT_REL + os.sep + HIGHLIGHT_CSS + u"'> \n " \
+        + scripts + u"\
 	</head>     \n \
-  <body><span id='" + filename + u"@top'></span>")
-    ofile.close()
+  <body><span id='" + filename + u"@top'></span>"
 
 ##
-# Append the closing section to an HTML file.
-#
-# It is assumed that the file \c path + os.sep + \c filename exists. To the existing file the closing HTML-tags are appended.
+# Render the closing section of an HTML file.
 #
-# @param path       absolute or relative path to the HTML file 
-# @param filename   filename of the HTML file 
+# @return the closing HTML-tags incl. the script to jump to the section selected in 'NavSection'
 ##
-def finalizeHTMLfile(path, filename):
-    with io.open(path + os.sep + filename, "a") as ofile:
-        ofile.write(u"<script>var elem = document.getElementById('NavSection'); \n \
+def renderHTMLtail():
+    return u"<script>var elem = document.getElementById('NavSection'); \n \
 	elem.addEventListener('change', JumpToSection); \n \
 	function JumpToSection() { \n \
 		window.location.href = '#' + document.getElementById('NavSection').value; \n \
-    }</script>")
-        ofile.write(u"  </body>\n  </html>")
-    ofile.close()
+    }</script>" + u"  </body>\n  </html>"
 
 ##
-# Append portions of sourcecode to an existing HTML file.
-# 
-# It is assumed that the file \c path + os.sep + \c destfilename exists. To this file a portion of the sourcecode from file srcfilename
-# is copied. The portion is defined by line_start and line_end (both incl.). Each line is prepended by HTML tags to show linenumbers. The 
-# complete portion is prepended by a header, which defines an anchor point and shows criterias and respective labels.
+# Render the navigation section listing all regions of a file.
+#
+# @param html_filename  filename of the HTML file, used to name the anchor points
+# @param regions        list of regions of a single file (cf. MetricStore.regions())
+# @return the navigation section as unicode string
 ##
-def copyCode2HTML(path, destfilename, srcfilename, region, type, line_start, line_end, criterias, labels):
-    with io.open(srcfilename, "r", errors='replace') as srcfile:
-        src_txt = srcfile.readlines()
-        with io.open(path + os.sep + destfilename, "a") as destfile:
-            destfile.write(u"<span class='detail_wrapper' id='" + destfilename + u"@" + str(line_start) + u"-" + str(line_end) + u"'>\n")
-            log(2, type + ": " + region + u" (" + str(line_start) + u" - " + str(line_end) + ")")
-            destfile.write(u"<span class='detail_type_region'>" + type + u": " + region + u" (" + str(line_start) + u" - " + str(line_end) + ")</span>\n")
-            i = 0
-            for criteriaValue in criterias:
-                if not criteriaValue == "":
-                    if i < len(labels):
-                        if CRITERIA_LABELS.has_key(labels[i]):
-                            destfile.write(u"<span class='detail_" + labels[i].replace(".", "_") + u"'>")
-                            destfile.write(CRITERIA_LABELS[labels[i]] + u": " + str(criteriaValue) + u"</span>\n")
-                i += 1
-            if region == "" or region == "__global__":
-                # __global__ line count bug
-                lastline = line_end -1
-            else:
-                lastline = line_end
-            destfile.write(u"<button onClick=\"window.location.href='#" + destfilename + u"@top'\">top &#x25B4;</button></span>\n")
-            destfile.write(u"    <pre class='sourcecode'><code class='#language-c'>\n")
-            for linenum in range(line_start -1, lastline):
-                destfile.write(u"<span title='" + str(linenum +1) + u"'>")
-                destfile.write(cgi.escape(src_txt[linenum]))
-                destfile.write(u"</span>")
-            destfile.write(u"    </code></pre>")
-        destfile.close()
-    srcfile.close()
-
-##
-# Generates a javascript file consisting of the detailed data definitions as collected in \c filelist.
-#
-# Creates the file \c datadir + os.sep + \modulebase + '.js' (existing file will be overwritten). Content of the file 
-# is definition of a single array \c combined. Each entry is an array of the following structure:
-# 
-# [html_path, html_filename, filename, region, type, line_start, line_end, rest of the row (i. e. all criteria values)]
+def renderNavSection(html_filename, regions):
+    parts = [u"<span id='details_head'>Browse details of file " + html_filename.replace(".html", "") + u" <select id='NavSection' onChange='JumpToSection'>"]
+    for region in regions:
+        # iterate over each region of the file
+        parts.append(u"<option value='" + html_filename + u"@" + str(region.line_start) + u"-" + str(region.line_end) + u"'s>")
+        parts.append(region.type + u": " + region.region + u"(" + str(region.line_start) + u" - " + str(region.line_end) + u")</option>\n")
+    parts.append(u"</select></span>")
+    return u"".join(parts)
+
+##
+# Append the metric header of a region to a page under construction.
+#
+# The header opens a collapsible overlay (\c details element) which defines the anchor point
+# \c destfilename + '@' + line_start + '-' + line_end and shows type, name, criterias and respective labels.
+# The overlay has to be closed by appending '</details>' after the region's sourcecode.
+#
+# @param parts          list of unicode strings the page is assembled from
+# @param destfilename   filename of the HTML file, used to name the anchor points
+##
+def renderRegionHeader(parts, destfilename, region, type, line_start, line_end, criterias, labels):
+    log(2, type + ": " + region + u" (" + str(line_start) + u" - " + str(line_end) + ")")
+    parts.append(u"<details open class='region' id='" + destfilename + u"@" + str(line_start) + u"-" + str(line_end) + u"'>")
+    parts.append(u"<summary class='detail_wrapper'>\n")
+    parts.append(u"<span class='detail_type_region'>" + type + u": " + region + u" (" + str(line_start) + u" - " + str(line_end) + ")</span>\n")
+    i = 0
+    for criteriaValue in criterias:
+        if not criteriaValue == "":
+            if i < len(labels):
+                if CRITERIA_LABELS.has_key(labels[i]):
+                    parts.append(u"<span class='detail_" + labels[i].replace(".", "_") + u"'>")
+                    parts.append(CRITERIA_LABELS[labels[i]] + u": " + metricstore.formatValue(criteriaValue) + u"</span>\n")
+        i += 1
+    parts.append(u"<button onClick=\"window.location.href='#" + destfilename + u"@top'\">top &#x25B4;</button></summary>\n")
+
+##
+# Append portions of sourcecode to a page under construction.
 # 
-# Where (srcpath + os.sep + modulebase) is stripped from filename.
-#
-# @param datadir        absolute or relative path to the javascript file
-# @param modulebasse    basename of the jjavascript file, will be prepended by '.js'
-# @param srcpath        absolute or relative path to the sourcefiles; stored filname will be stripped from (srcpath + os.sep + modulebase)
-##
-def generateDetailedDatafile(datadir, modulebase, srcpath):
-    log(2, "Generating detailed data file " + datadir + os.sep + modulebase + ".js")
-    with io.open(datadir + os.sep + modulebase + ".js", "w") as moduleJSfile:
-        moduleJSfile.write(u"var combined = [")
-        # filelist is a dictionary with key=filename and value is a list of entries
-        # each entry itself is a list [html_path, html_filename, filename, region, type, line_start, line_end, rest of the row (i. e. all criteria values)
-        for fileData in FILELIST.values():
-            # iterate over all files in the filelist
-            count = 0
-            for fileEntry in fileData:
-                # each file (key) might point to a list of fileData
-                count += 1
-                # iterate over each entry for every file
-                dataPerFile = ""
-                filename = fileEntry[2].replace(srcpath + os.sep + modulebase, "")
-                criteriaValues = ""
-                for val in fileEntry[8]:
-                    criteriaValues += str(val) + u", "
-                criteriaValues = criteriaValues[:-2]    # remove trailig ", "
-                dataPerFile += (u"['" + filename + u"', '" + fileEntry[3] + u"', '" + fileEntry[4] + u"', '" + str(fileEntry[5]) + u"', " \
-                    + u", " + str(fileEntry[6]) + u", " + criteriaValues + u"],\n")
-                if count == len(FILELIST.values()):
-                    dataPerFile = dataPerFile[:-1]      # remove trialing ","
-                moduleJSfile.write(dataPerFile)
-        moduleJSfile.write(u"];\n")
-    moduleJSfile.close()
-
-##
-# Read and parse a csv file.
-#
-##
-def readCSVfile(datapath, module_base):
-    log(1, "Opening database file " + datapath + os.sep + module_base + '.csv')
-    with open(datapath + os.sep + module_base + '.csv') as csv_file:
-        # read in cvs output of the 'export' command of metrix++
-        csv_reader = csv.reader(csv_file, delimiter=',')
-        line_count = 0
-        for row in csv_reader:
-            # first row contains header defintion
-            if line_count == 0:
-                criterias = row[6:]
-                for i in range(0, len(criterias)):      # 'for criteria in criterias': not possible to modify criteria
-                    criterias[i] = criterias[i].replace(':', '.')
-                log(2, "Processing following criterias: ")
-                log(2, criterias)
-            else:
-                filename = row[0]
-                codefilename = filename.replace(SRCPATH, "")
-                html_path = REPORTDIR_REL + (os.path.split(codefilename)[0]).replace(module_base, "")
-                html_filename = os.path.split(filename)[1] + ".html"
-                region = row[1]
-                metrix_type = row[2]
-                modified = row[3]
-                criteria_values = row[6:]
-                for c in range(0, len(criteria_values)):
-                    if criteria_values[c] == "":
-                        criteria_values[c] = 0
-                
-                try:
-                    line_start = int(row[4])
-                    line_end = int(row[5])
-                except:
-                    line_start = -1
-                # only parse entries with a valid line_start
-                if (line_start > -1):
-                    # Add an entry to filelist with key=filename and value=an empty list
-                    if not filename in FILELIST:
-                        FILELIST[filename] = []
-
-                    if metrix_type == "global":
-                        for each in FILELIST[filename]:
-                            # iterate over all entries of current filename
-                            if each[4] == "file":
-                                for c in range(0, len(criteria_values)):
-                                    old_values = each[8]
-                                    old_values[c] = int(criteria_values[c]) + int(old_values[c])
-                    
-                    if metrix_type == "file":
-                        for each in FILELIST[filename]:
-                            # iterate over all entries of current filename
-                            if each[4] == "global":
-                                for c in range(0, len(criteria_values)):
-                                    old_values = each[8]
-                                    old_values[c] = int(criteria_values[c]) + int(old_values[c])
-                                each[4] = "file"
-                    
-                    FILELIST[filename].append([html_path, html_filename, filename, region, metrix_type, modified, line_start, line_end, criteria_values])
-            line_count += 1
-        log(2, "Read " + str(line_count) + " entries.")
-    csv_file.close()
-    return criterias
+# The lines line_start to line_end (both incl.) of \c src_lines are appended to the list \c parts as one block of
+# sourcecode. Each line is prepended by HTML tags to show linenumbers.
+#
+# @param parts          list of unicode strings the page is assembled from
+# @param src_lines      lines of the sourcefile as returned by readSourceLines()
+# @param tokens         tokens per line to highlight the lines by (cf. highlighter.tokenizeLines()); if None, the
+#                       lines are left to be highlighted by highlight.js
+##
+def copyCode2HTML(parts, src_lines, line_start, line_end, tokens=None):
+    if tokens is None:
+        parts.append(u"<pre class='sourcecode'><code class='#language-c'>")
+        for linenum in range(line_start -1, line_end):
+            parts.append(u"<span title='" + str(linenum +1) + u"'>" + cgi.escape(src_lines[linenum]) + u"</span>")
+    else:
+        parts.append(u"<pre class='sourcecode'><code class='hljs cpp'>")
+        for linenum in range(line_start -1, line_end):
+            parts.append(u"<span title='" + str(linenum +1) + u"'>" + highlighter.renderLine(src_lines[linenum], \
+                tokens[linenum]) + u"</span>")
+    parts.append(u"</code></pre>\n")
+
+##
+# Append the sourcecode of a file with all its regions to a page under construction.
+#
+# Every line of the sourcefile is emitted exactly once. Regions are rendered as nested overlays around the lines they
+# span, so the size of the page is linear in the size of the sourcefile regardless of the nesting depth of regions.
+# A region exceeding its enclosing region is cut at the end of the enclosing one (its header still shows the
+# original line range).
+#
+# @param parts          list of unicode strings the page is assembled from
+# @param src_lines      lines of the sourcefile as returned by readSourceLines()
+# @param destfilename   filename of the HTML file, used to name the anchor points
+# @param regions        list of regions of a single file (cf. MetricStore.regions())
+# @param labels         list of criteria mnemonics as read from the csv header
+# @param tokens         optional tokens per line to highlight the lines by (cf. copyCode2HTML())
+##
+def renderSourcecode(parts, src_lines, destfilename, regions, labels, tokens=None):
+    line_count = len(src_lines)
+    # regions enclosing others come first; stack holds the last line of every open overlay
+    regions = sorted(regions, key=lambda region: (region.line_start, -region.line_end))
+    open_ends = []
+    next_line = 1
+
+    def emitUpTo(next_line, last_line):
+        # emit lines from next_line up to last_line (incl.), closing overlays at their last line
+        while True:
+            while open_ends and open_ends[-1] < next_line:
+                open_ends.pop()
+                parts.append(u"</details>\n")
+            stop = last_line
+            if open_ends and open_ends[-1] < stop:
+                stop = open_ends[-1]
+            if stop < next_line:
+                return next_line
+            copyCode2HTML(parts, src_lines, next_line, stop, tokens)
+            next_line = stop + 1
+
+    for region in regions:
+        line_start = max(region.line_start, 1)
+        if region.region == "" or region.region == "__global__":
+            # __global__ line count bug
+            line_end = region.line_end - 1
+        else:
+            line_end = region.line_end
+        next_line = emitUpTo(next_line, min(line_start, line_count + 1) - 1)
+        if open_ends:
+            line_end = min(line_end, open_ends[-1])
+        renderRegionHeader(parts, destfilename, region.region, region.type, region.line_start, region.line_end, region.values, labels)
+        open_ends.append(max(min(line_end, line_count), next_line - 1))
+    emitUpTo(next_line, line_count)
+    parts.append(u"</details>\n" * len(open_ends))
+
+##
+# Render the HTML file for a single sourcefile.
+#
+# The sourcefile is read only once and the page is assembled in memory. With \c PREHIGHLIGHT set, C/C++ sourcefiles
+# are highlighted by the tokens cached for their content (cf. tokenCache()), so they are tokenized only if their
+# content changed.
+#
+# @param store      MetricStore holding the file
+# @param f          index of the file within \c store
+# @param digest     hash of the content of the sourcefile (cf. hashFile()); if None, tokens are not cached
+# @return content of the page as unicode string
+##
+def renderHTMLfile(store, f, digest=None):
+    html_filename = store.htmlFilename(f)
+    regions = store.regions(f)
+    src_lines = readSourceLines(store.fileName(f))
+    tokens = None
+    if PREHIGHLIGHT and highlighter.isCpp(store.fileName(f)):
+        tokens = tokenCache().tokens(digest, src_lines)
+    parts = [renderHTMLhead(store.htmlPath(f), html_filename, tokens is not None), renderNavSection(html_filename, regions)]
+    renderSourcecode(parts, src_lines, html_filename, regions, store.criterias, tokens)
+    parts.append(renderHTMLtail())
+    if isinstance(src_lines, MappedSourceLines):
+        src_lines.close()
+    return u"".join(parts)
+
+##
+# Generate the HTML file for a single sourcefile.
+#
+# The page (cf. renderHTMLfile()) is written to html_path + os.sep + html_filename (existing file will be
+# overwritten) by a single buffered write.
+##
+def generateHTMLfile(store, f, digest=None):
+    html_path = store.htmlPath(f)
+    html_filename = store.htmlFilename(f)
+    content = renderHTMLfile(store, f, digest)
+    try:
+        os.makedirs(html_path)
+    except OSError as err:
+        # directory may exist already or has just been created by another worker
+        if err.errno != errno.EEXIST:
+            raise
+    log(2, "Creating HTML file " + html_path +  os.sep + html_filename)
+    with io.open(html_path + os.sep + html_filename, "w") as ofile:
+        ofile.write(content)
+
+##
+# Writes the detailed data of all regions as a set of javascript files, one file after the other.
+#
+# The regions are split into shards, one per top-level directory of the module. Each shard is written to the file
+# \c datadir + os.sep + \c modulebase + '.shard.' + name + '.js', which calls 'loadCombinedShard(name, data)' when
+# loaded. \c data holds a table of all strings (relative filenames, region names, types) and the columns of the
+# regions as base64 encoded typed arrays (cf. encodeColumn()):
+#
+#   files       per file: index of its relative filename in strings
+#   fileOffset  per file: index of its first region; the regions of file i end before fileOffset[i + 1]
+#   region, type, modified      per region: index of the respective string in strings
+#   lineStart, lineEnd          per region: first and last line
+#   values      per criteria: its value for every region
+#   totals      per file: number of regions ('regions') and per criteria the sum ('sum') and maximum ('max') of
+#               the values of its regions
+#
+# The small file \c datadir + os.sep + \c modulebase + '.js' defines 'combinedShards' listing all shards with their
+# number of files and regions and the total of each criteria, such that the browser may load shards on demand. Files are only (re-)written if their content changed since the
+# previous run (as recorded in the manifest); data files which are no longer needed are removed.
+#
+# The per file totals are also rolled up along the directory tree (cf. rollup.DirectoryRollup) and written to
+# \c datadir + os.sep + \c modulebase + '.rollup.js', which defines 'directoryRollup' holding the name and parent of
+# every directory (the root directory 0 is named after the module) and per directory the columns
+#
+#   files       number of files directly within the directory
+#   totalFiles  number of files of the directory and all its subdirectories
+#   regions     number of regions of these files
+#   sum, max, mean      per criteria: sum, maximum and mean per file of the values of these files
+#
+# Finally the regions and files with the highest values per criteria (cf. hotspots.HotspotIndex) are written to
+# \c datadir + os.sep + \c modulebase + '.hotspots.js', which defines 'hotspots' holding the list of criterias and per
+# criteria the lists 'regions' and 'files' with links to the regions within the sourcecode HTML files.
+#
+# The names of all files and regions are indexed for the search page (cf. searchindex.SearchIndex). The buckets of
+# the index are written to \c datadir + os.sep + \c modulebase + '.search.' + bucket + '.js', each calling
+# 'loadSearchBucket(bucket, data)', the chunks of the documents to \c modulebase + '.search.docs.' + chunk + '.js',
+# each calling 'loadSearchChunk(chunk, data)'. The small file \c modulebase + '.search.js' defines 'searchIndex'
+# holding the number of buckets and the first name of each chunk, such that the browser loads only the files a query
+# needs.
+##
+class DetailedDatafileWriter(object):
+    ##
+    # @param datadir        absolute or relative path to the javascript files
+    # @param modulebase     basename of the javascript files
+    # @param srcpath        absolute or relative path to the sourcefiles; stored filname will be stripped from (srcpath + os.sep + modulebase)
+    # @param manifest       manifest of the previous run (cf. readManifest())
+    # @param criterias      list of criteria mnemonics as read from the csv header
+    # @param top            number of regions and files to list per criteria in the index of hotspots
+    # @param basename       basename of the data files, defaults to \c modulebase
+    ##
+    def __init__(self, datadir, modulebase, srcpath, manifest, criterias, top=500, basename=None):
+        self.datadir = datadir
+        self.modulebase = modulebase
+        self.basename = basename or modulebase
+        self.prefix = srcpath + os.sep + modulebase
+        self.manifest = manifest
+        self.criterias = criterias
+        self.datafiles = {}
+        self.shards = []
+        self.shard = None
+        self.directories = rollup.DirectoryRollup(criterias)
+        self.hotspots = hotspots.HotspotIndex(criterias, top)
+        self.search = searchindex.SearchIndex()
+        log(2, "Generating detailed data files " + datadir + os.sep + self.basename + ".*")
+
+    ##
+    # Append the regions of a single file to the data files.
+    #
+    # @param store      MetricStore holding the file
+    # @param f          index of the file within \c store
+    ##
+    def append(self, store, f):
+        filename = store.fileName(f).replace(self.prefix, "")
+        # files directly within the module's root folder make up the shard '.'
+        path = re.split(r"[\\/]", filename.lstrip("/\\"), 1)
+        name = path[0] if len(path) > 1 else "."
+        if self.shard is None or self.shard_name != name:
+            # files of a top-level directory are expected to be consecutive, otherwise the shard gets split into parts
+            self.flush()
+            self.shard = metricstore.MetricStore(self.criterias)
+            self.shard_name = name
+        self.shard.appendFile(store, f, filename)
+
+    ##
+    # Write the current shard to its data file.
+    ##
+    def flush(self):
+        if self.shard is None or self.shard.fileCount() == 0:
+            return
+        entry = None
+        for shard in self.shards:
+            if shard["name"] == self.shard_name:
+                entry = shard
+        if entry is None:
+            entry = {"name": self.shard_name, "src": [], "files": 0, "regions": 0, "totals": dict((criteria, 0) for criteria in self.criterias)}
+            self.shards.append(entry)
+        basename = self.basename + ".shard." + re.sub(r"[^A-Za-z0-9_-]", "_", self.shard_name)
+        if entry["src"]:
+            basename += "." + str(len(entry["src"]))
+        while basename + ".js" in self.datafiles:
+            basename += "_"
+        store = self.shard
+        # per file aggregates, such that the browser does not need to add up the regions of each file
+        sums = [array.array(column.typecode) for column in store.values]
+        maxima = [array.array(column.typecode) for column in store.values]
+        counts = array.array('l')
+        for f in xrange(store.fileCount()):
+            file_sums, file_maxima, count = store.fileTotals(f)
+            for c in range(len(self.criterias)):
+                sums[c].append(file_sums[c])
+                maxima[c].append(file_maxima[c])
+            counts.append(count)
+            self.directories.addFile(store.fileName(f), file_sums, file_maxima, count)
+            self.hotspots.addFile(store, f, file_sums)
+            self.search.addFile(store, f)
+        data = {"strings": store.strings, \
+            "files": encodeColumn(store.file_name), \
+            "fileOffset": encodeColumn(store.file_offset), \
+            "region": encodeColumn(store.region), \
+            "type": encodeColumn(store.type), \
+            "modified": encodeColumn(store.modified), \
+            "lineStart": encodeColumn(store.line_start), \
+            "lineEnd": encodeColumn(store.line_end), \
+            "values": dict((criteria, encodeColumn(store.values[c])) for c, criteria in enumerate(self.criterias)), \
+            "totals": {"regions": encodeColumn(counts), \
+                "sum": dict((criteria, encodeColumn(sums[c])) for c, criteria in enumerate(self.criterias)), \
+                "max": dict((criteria, encodeColumn(maxima[c])) for c, criteria in enumerate(self.criterias))}}
+        self.writeDatafile(basename + ".js", u"loadCombinedShard(" + json.dumps(self.shard_name) + u", " + json.dumps(data, sort_keys=True) + u");\n")
+        entry["src"].append(basename + ".js")
+        entry["files"] += store.fileCount()
+        entry["regions"] += store.rowCount()
+        for c, criteria in enumerate(self.criterias):
+            entry["totals"][criteria] += sum(sums[c])
+        self.shard = None
+
+    ##
+    # Write \c content to the data file \c filename, unless the file is up to date.
+    ##
+    def writeDatafile(self, filename, content):
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        self.datafiles[filename] = digest
+        path = self.datadir + os.sep + filename
+        if self.manifest["datafiles"].get(filename) == digest and os.path.isfile(path):
+            log(2, "Data file " + path + " is up to date")
+            return
+        log(2, "Writing data file " + path)
+        with io.open(path + ".tmp", "w") as ofile:
+            ofile.write(content)
+        os.rename(path + ".tmp", path)
+
+    ##
+    # Nothing is written in case of an error, data files written so far are complete.
+    ##
+    def abort(self):
+        self.shard = None
+
+    ##
+    # Write the last shard and the list of all shards. Data files no longer needed are removed by
+    # removeStaleDatafiles(), as several writers may share a data directory.
+    #
+    # @param reportdir  absolute or relative path to the directory of index.html, which loads the data files
+    ##
+    def close(self, reportdir):
+        self.flush()
+        shards = {"path": os.path.relpath(self.datadir, reportdir).replace(os.sep, "/"), "criterias": self.criterias, "shards": self.shards}
+        self.writeDatafile(self.basename + ".js", u"var combinedShards = " + json.dumps(shards, sort_keys=True) + u";\n")
+        self.writeDatafile(self.basename + ".rollup.js", u"var directoryRollup = " + json.dumps(self.renderRollup(), sort_keys=True) + u";\n")
+        index = {"criterias": self.criterias, "top": self.hotspots.k, "hotspots": self.hotspots.render(reportdir)}
+        self.writeDatafile(self.basename + ".hotspots.js", u"var hotspots = " + json.dumps(index, sort_keys=True) + u";\n")
+        self.writeSearchDatafiles(reportdir)
+
+    ##
+    # Write the buckets and chunks of the search index and their list 'searchIndex'.
+    #
+    # @param reportdir  path the links to the sourcecode HTML files are relative to, i. e. the directory of index.html
+    ##
+    def writeSearchDatafiles(self, reportdir):
+        self.search.finish()
+        buckets = self.search.bucketCount()
+        for b, grams, offsets, docs in self.search.buckets(buckets):
+            data = {"grams": grams, "offsets": encodeColumn(offsets), "docs": encodeColumn(docs)}
+            self.writeDatafile(self.basename + ".search." + str(b) + ".js", u"loadSearchBucket(" + str(b) + u", " \
+                + json.dumps(data, sort_keys=True) + u");\n")
+
+        def link(html_path, html_filename):
+            return os.path.relpath(os.path.join(html_path, html_filename), reportdir).replace(os.sep, "/")
+
+        for k, data in self.search.chunks(link):
+            for column in ("name", "type", "file", "lineStart", "lineEnd"):
+                data[column] = encodeColumn(data[column])
+            self.writeDatafile(self.basename + ".search.docs." + str(k) + ".js", u"loadSearchChunk(" + str(k) + u", " \
+                + json.dumps(data, sort_keys=True) + u");\n")
+        index = {"path": os.path.relpath(self.datadir, reportdir).replace(os.sep, "/"), "basename": self.basename, \
+            "buckets": buckets, "chunk": searchindex.CHUNK, "chunks": self.search.chunkNames(), \
+            "documents": self.search.documentCount()}
+        self.writeDatafile(self.basename + ".search.js", u"var searchIndex = " + json.dumps(index, sort_keys=True) + u";\n")
+
+    ##
+    # Roll up the totals of all files written so far along the directory tree.
+    #
+    # @return content of 'directoryRollup' as dictionary (cf. DetailedDatafileWriter)
+    ##
+    def renderRollup(self):
+        totals = self.directories.rollup()
+        names = list(self.directories.names)
+        names[0] = self.modulebase
+        return {"criterias": self.criterias, \
+            "names": names, \
+            "parent": encodeColumn(self.directories.parent), \
+            "files": encodeColumn(totals["files"]), \
+            "totalFiles": encodeColumn(totals["totalFiles"]), \
+            "regions": encodeColumn(totals["regions"]), \
+            "sum": dict((criteria, encodeColumn(column)) for criteria, column in totals["sum"].items()), \
+            "max": dict((criteria, encodeColumn(column)) for criteria, column in totals["max"].items()), \
+            "mean": dict((criteria, encodeColumn(column)) for criteria, column in totals["mean"].items())}
+
+##
+# Renders the data files of DetailedDatafileWriter into memory instead of writing them, e.g. to be served by
+# 'sourcemetrix.py serve'.
+##
+class DatafileRenderer(DetailedDatafileWriter):
+    def __init__(self, datadir, modulebase, srcpath, criterias, top=500):
+        DetailedDatafileWriter.__init__(self, datadir, modulebase, srcpath, {"datafiles": {}}, criterias, top)
+        ## filename -> content of every data file rendered
+        self.contents = {}
+
+    def writeDatafile(self, filename, content):
+        self.datafiles[filename] = None
+        self.contents[filename] = content
+
+##
+# Remove the data files of the previous run which were not written by any of the \c writers (cf.
+# DetailedDatafileWriter) of this run and record the data files of this run in the manifest.
+##
+def removeStaleDatafiles(manifest, writers):
+    datafiles = {}
+    for writer in writers:
+        datafiles.update(writer.datafiles)
+    for filename in manifest["datafiles"]:
+        if not filename in datafiles and os.path.isfile(DATADIR_REL + os.sep + filename):
+            log(2, "Removing data file " + DATADIR_REL + os.sep + filename)
+            os.remove(DATADIR_REL + os.sep + filename)
+    manifest["datafiles"] = datafiles
+
+##
+# Sub-reports of the files carrying a tag (cf. tag-files.py), generated along with the full report.
+#
+# The sub-report of a tag covers the files having a row with this tag. It is named MODULE_BASE + '.tag.' + tag (cf.
+# basename()) and has its own detailed data files, directory rollup, hotspots and statistics of the criteria; the
+# sourcecode HTML files are shared with the full report.
+##
+class TaggedReports(object):
+    ##
+    # @param manifest       manifest of the previous run (cf. readManifest())
+    # @param criterias      list of criteria mnemonics in order of their columns
+    ##
+    def __init__(self, manifest, criterias):
+        self.manifest = manifest
+        self.criterias = criterias
+        # tag -> tuple (DetailedDatafileWriter, metricstats.MetricStatistics)
+        self.reports = {}
+
+    ##
+    # Return the basename of the files of the sub-report of \c tag.
+    ##
+    @staticmethod
+    def basename(tag):
+        return MODULE_BASE + ".tag." + re.sub(r"[^A-Za-z0-9_-]", "_", tag)
+
+    def report(self, tag):
+        if not tag in self.reports:
+            log(2, "Generating sub-report for tag '" + tag + "'")
+            self.reports[tag] = (DetailedDatafileWriter(DATADIR_REL, MODULE_BASE, SRCPATH, self.manifest, \
+                self.criterias, HOTSPOTS, TaggedReports.basename(tag)), metricstats.MetricStatistics(self.criterias))
+        return self.reports[tag]
+
+    ## sorted list of all tags seen
+    def tags(self):
+        return sorted(self.reports.keys())
+
+    ##
+    # Add file \c f of \c store to the data files and the statistics of each of its tags.
+    ##
+    def append(self, store, f):
+        for tag in store.fileTags(f):
+            writer, stats = self.report(tag)
+            writer.append(store, f)
+            stats.addFile(store, f)
+
+    def statistics(self, tag):
+        return self.reports[tag][1]
+
+    def writers(self):
+        return [writer for writer, stats in self.reports.values()]
+
+##
+# Render a page of the overview area, REPORTDIR_REL/MODULE_BASE.<name>.html.
+#
+# The page is static: it loads the data file DATADIR_REL/MODULE_BASE.<datafile>.js as written by
+# DetailedDatafileWriter and the scripts JSCRIPT_REL/<script>.js, the last of which renders the page by calling
+# \c init.
+#
+# @param scripts    list of the names of the scripts, the ones it requires (e.g. 'columns') first
+# @param body       HTML elements the script renders into
+# @param basename   basename of the page and the data file, defaults to MODULE_BASE
+# @return tuple (filename of the page, content as unicode string)
+##
+def renderOverviewHTMLfile(name, title, datafile, scripts, body, init, basename=None):
+    basename = basename or MODULE_BASE
+    style_rel = os.path.relpath(STYLE_REL, REPORTDIR_REL).replace(os.sep, "/")
+    datadir_rel = os.path.relpath(DATADIR_REL, REPORTDIR_REL).replace(os.sep, "/")
+    jscript_rel = os.path.relpath(JSCRIPT_REL, REPORTDIR_REL).replace(os.sep, "/")
+    content = u"<!DOCTYPE html>\n  <html>\n\t<head>\n\t  <title>" + cgi.escape(basename) + u" " + title + u"</title>\n" \
+        + u"\t  <link rel='stylesheet' type='text/css' href='" + style_rel + u"/style.css'>\n" \
+        + u"\t</head>\n  <body class='" + name + u"'>\n" \
+        + body \
+        + u"\t<script src='" + style_rel + u"/diagram_style.js'></script>\n" \
+        + u"\t<script src='" + datadir_rel + u"/" + basename + u"." + datafile + u".js'></script>\n" \
+        + u"".join(u"\t<script src='" + jscript_rel + u"/" + script + u".js'></script>\n" for script in scripts) \
+        + u"\t<script>document.addEventListener('DOMContentLoaded', " + init + u");</script>\n" \
+        + u"  </body>\n</html>\n"
+    return (REPORTDIR_REL + os.sep + basename + "." + name + ".html", content)
+
+## pages of the overview area: arguments name, title, datafile, scripts, body and init of renderOverviewHTMLfile()
+OVERVIEW_PAGES = [("directories", u"directories", "rollup", ["columns", "rollup"], \
+        u"\t<h2 id='rollup_path'></h2>\n" \
+        + u"\t<div id='rollup_controls'><select id='rollup_criteria'></select>\n" \
+        + u"\t  <button type='button' id='rollup_up'>&#x25B4; up</button></div>\n" \
+        + u"\t<div id='rollup_treemap'></div>\n" \
+        + u"\t<table id='rollup_table'></table>\n", "initRollup"), \
+    ("hotspots", u"hotspots", "hotspots", ["hotspots"], \
+        u"\t<h2>Hotspots</h2>\n" \
+        + u"\t<div id='hotspots_controls'><select id='hotspots_criteria'></select>\n" \
+        + u"\t  <select id='hotspots_kind'><option value='regions'>regions</option>" \
+        + u"<option value='files'>files</option></select></div>\n" \
+        + u"\t<table id='hotspots_table'></table>\n", "initHotspots"), \
+    ("search", u"search", "search", ["columns", "search"], \
+        u"\t<h2>Search</h2>\n" \
+        + u"\t<div id='search_controls'><input type='search' id='search_query' placeholder='file or region name' " \
+        + u"autofocus> <span id='search_status'></span></div>\n" \
+        + u"\t<table id='search_table'></table>\n", "initSearch")]
+
+## page of the trends of the history (cf. HISTORY, writeTrendDatafiles()), arguments as of OVERVIEW_PAGES
+TRENDS_PAGE = ("trends", u"trends", "trends", ["trends"], \
+    u"\t<h2 id='trends_path'></h2>\n" \
+    + u"\t<div id='trends_controls'><select id='trends_criteria'></select>\n" \
+    + u"\t  <button type='button' id='trends_up'>&#x25B4; up</button></div>\n" \
+    + u"\t<div id='trends_chart'></div>\n" \
+    + u"\t<table id='trends_runs'></table>\n" \
+    + u"\t<table id='trends_table'></table>\n", "initTrends")
+
+##
+# Write the pages of the overview area (cf. OVERVIEW_PAGES), i. e. the directory rollup (drill-down table and
+# treemap, cf. rollup.js), the hotspots (cf. hotspots.js) and the search (cf. search.js) of the report \c basename
+# (defaults to MODULE_BASE), and the trends (cf. trends.js) of the report if HISTORY is kept. Pages which are up to
+# date are not written again.
+##
+def writeOverviewHTMLfiles(basename=None):
+    pages = OVERVIEW_PAGES + ([TRENDS_PAGE] if HISTORY is not None and basename is None else [])
+    for page in pages:
+        filename, content = renderOverviewHTMLfile(*page, basename=basename)
+        try:
+            with io.open(filename, "r", encoding="utf-8") as ifile:
+                if ifile.read() == content:
+                    continue
+        except IOError:
+            pass
+        log(2, "Writing " + filename)
+        with io.open(filename, "w", encoding="utf-8") as ofile:
+            ofile.write(content)
+
+##
+# Encode a column of a MetricStore as base64 string of a little endian typed array.
+#
+# Columns of integers are encoded as Int32Array, columns of floats as Float64Array.
+#
+# @return dictionary with members "type" (name of the typed array) and "data" (base64 encoded content)
+##
+def encodeColumn(column):
+    if column.typecode == 'd':
+        typed = array.array('d', column)
+        name = "Float64Array"
+    else:
+        typed = array.array('i', column)
+        name = "Int32Array"
+    if sys.byteorder != "little":
+        typed.byteswap()
+    return {"type": name, "data": base64.b64encode(typed.tostring())}
+
+##
+# Read the header of a csv file as exported by metrix++.
+#
+# The column TAG_NAME as appended by tag-files.py is no criteria.
+#
+# @param csv_reader     csv.reader positioned at the start of the export
+# @return tuple (list of criteria mnemonics in order of their columns, index of the column TAG_NAME or None)
+##
+def readCSVheader(csv_reader):
+    header = next(csv_reader)
+    tag_index = header.index(TAG_NAME) if TAG_NAME in header[6:] else None
+    criterias = [criteria.replace(':', '.') for n, criteria in enumerate(header) if n >= 6 and n != tag_index]
+    log(2, "Processing following criterias: ")
+    log(2, criterias)
+    if tag_index is not None:
+        log(2, "Reading tags from column " + TAG_NAME)
+    return (criterias, tag_index)
+
+##
+# Return the location of the sourcecode HTML file of sourcefile \c filename.
+#
+# @param module_base    basename of the module; stripped from the path of the HTML file
+# @return tuple (directory, filename) of the HTML file
+##
+def htmlLocation(filename, module_base):
+    codefilename = filename.replace(SRCPATH, "")
+    html_path = REPORTDIR_REL + (os.path.split(codefilename)[0]).replace(module_base, "")
+    html_filename = os.path.split(filename)[1] + ".html"
+    return (html_path, html_filename)
+
+##
+# Read and parse the rows of a csv file into a MetricStore, one sourcefile after the other.
+#
+# Rows may as well be read from the metrix++ database (cf. mppdb.MetrixDB.iterateRows()). The export of metrix++ lists all regions of a sourcefile in consecutive rows. Rows are read one by one and the index
+# of a sourcefile within \c store is yielded as soon as all of its rows were read. Unless the store retains all files,
+# only a single file is held in memory. Criteria values of regions of type 'global' and 'file' are merged by the
+# store (cf. MetricStore.appendRow()).
+#
+# @param csv_reader     csv.reader positioned behind the header (cf. readCSVheader()) or other iterable of rows
+# @param module_base    basename of the module; stripped from the path of generated HTML files
+# @param store          MetricStore to add the regions to
+# @param stats          optional metricstats.MetricStatistics to add the criteria values of each file to, once its
+#                       rows are merged
+# @param tag_index      index of the column holding the tags of a row (cf. readCSVheader()), None if there is none
+##
+def readCSVfile(csv_reader, module_base, store, stats=None, tag_index=None):
+    line_count = 0
+    seen = set()
+    filename = None
+    f = None
+    for row in csv_reader:
+        line_count += 1
+        try:
+            line_start = int(row[4])
+            line_end = int(row[5])
+        except:
+            line_start = -1
+        # only parse entries with a valid line_start
+        if line_start < 0:
+            continue
+        if row[0] != filename:
+            if f is not None:
+                if stats is not None:
+                    stats.addFile(store, f)
+                yield f
+            filename = row[0]
+            if filename in seen:
+                log(1, "Warning: rows of " + filename + " are not consecutive, its regions will be split.")
+            seen.add(filename)
+            html_path, html_filename = htmlLocation(filename, module_base)
+            f = store.beginFile(filename, html_path, html_filename)
+        values = row[6:]
+        if tag_index is not None:
+            tags = row[tag_index].split() if len(row) > tag_index else []
+            values = row[6:tag_index] + row[tag_index + 1:]
+            store.addTags(f, tags)
+        store.appendRow(row[1], row[2], row[3], line_start, line_end, values)
+    if f is not None:
+        if stats is not None:
+            stats.addFile(store, f)
+        yield f
+    log(2, "Read " + str(line_count) + " entries.")
 
 ##
 # Print version information and exit
@@ -249,20 +835,38 @@ def printUsage():
     print "  --verbose                  enable more elaborative output"
     print "  -v, --version              print version information and exit"
     print "  --gen-datafile-only        generate only javascript data file (no HTML is generated)"
+    print "  -j, --jobs=N               number of processes generating HTML files in parallel"
+    print "                                 defaults to the number of cores:", JOBS
+    print "  -f, --force                regenerate all files, even if sourcefile and metrics are unchanged"
     print "  -s, --srcpath=DIR          directory containing the sourcecode root folder"
     print "                                 defaults to:", SRCPATH
     print "  -m, --modulebase=DIR       shall be name of the sourcecode's root folder"
     print "                                 defaults to:", MODULE_BASE
     print "  -d, --datadir=DIR          directory containing the raw data of the metrix++ export"
     print "                                 defaults to:", DATADIR_REL
+    print "  -b, --metrixdb=FILE        read the metrics from the database of metrix++ instead of the export in DATADIR"
     print "  -r, --reportdir=DIR        the output directory of the generated html files"
     print "                                 defaults to:", REPORTDIR_REL
     print "  -i, --installdir=DIR       location where 'highlight' package is installed"
     print "                                 defaults to:", HIGHLIGHT_REL
     print "  -c, --highlight-css=FILE   filename of CSS file to be used for syntax highlighting"
     print "                                  defaults to:", HIGHLIGHT_CSS
+    print "  --prehighlight             highlight C/C++ sourcecode while generating the HTML files instead of in the browser;"
+    print "                             the tokens are cached in DATADIR/MODULE_BASE.tokens"
     print "  -y, --styledir=DIR         directory containing the generic style.css file"
     print "                                  defaults to:", STYLE_REL
+    print "  -x, --jscriptdir=DIR       directory containing rollup.js and other non-generated javascript files"
+    print "                                  defaults to:", JSCRIPT_REL
+    print "  --hotspots=N               number of regions and files listed per criteria in the index of hotspots"
+    print "                                  defaults to:", HOTSPOTS
+    print "  -t, --tagname=TAGNAME      name of the column holding the tags of the files (cf. tag-files.py);"
+    print "                             a sub-report is generated per tag"
+    print "                                  defaults to:", TAG_NAME
+    print "  --history=FILE             append the metrics of this run to the SQLite database FILE and write trend data files"
+    print "  --run=NAME                 name of this run within the history, e.g. the commit analysed"
+    print "                                  defaults to the time of the run"
+    print "  --trend-runs=N             number of most recent runs within the trend data files"
+    print "                                  defaults to:", TREND_RUNS
     print "  -l, --criteria-labels=DICT dictionary, where "
     print "                                 key = mnemnonic of the criteria and "
     print "                                 value = human readable label"
@@ -276,21 +880,31 @@ def dumpParameters():
     print "  --srcpath         =", SRCPATH
     print "  --modulebase      =", MODULE_BASE
     print "  --datadir         =", DATADIR_REL
+    print "  --metrixdb        =", METRIXDB
     print "  --reportdir       =", REPORTDIR_REL
     print "  --installdir      =", HIGHLIGHT_REL
     print "  --highlight-css   =", HIGHLIGHT_CSS
+    print "  --prehighlight    =", PREHIGHLIGHT
     print "  --styledir        =", STYLE_REL
+    print "  --jscriptdir      =", JSCRIPT_REL
     print "  --criteria-labels =", CRITERIA_LABELS
+    print "  --hotspots        =", HOTSPOTS
+    print "  --tagname         =", TAG_NAME
+    print "  --history         =", HISTORY
+    print "  --run             =", RUN_NAME
+    print "  --trend-runs      =", TREND_RUNS
+    print "  --jobs            =", JOBS
+    print "  --force           =", FORCE
 
 ##
-# Print a log message to stdout if loglevel is set appropriate.
+# Print a log message to LOGSTREAM if loglevel is set appropriate.
 #
-# @param level      verbosity level of this message. If level < LOG_LEVEL the message will be printed to stdout.
+# @param level      verbosity level of this message. If level < LOG_LEVEL the message will be printed to LOGSTREAM.
 # @param message    string to be printed
 ##
 def log(level, message):
     if LOGLEVEL >= level:
-        print(message)
+        print >> LOGSTREAM, message
     if (level) < 0:
         sys.exit(-level)
 
@@ -301,10 +915,12 @@ def log(level, message):
 # supported command line arguments).
 ##
 def scanArguments():
-    global LOGLEVEL, SRCPATH, MODULE_BASE, DATADIR_REL, REPORTDIR_REL, HIGHLIGHT_REL, HIGHLIGHT_CSS, STYLE_REL, CRITERIA_LABELS, GEN_DATAFILE_ONLY
-    shortOptions = "hvs:m:d:r:i:c:y:l:"
+    global LOGLEVEL, SRCPATH, MODULE_BASE, DATADIR_REL, REPORTDIR_REL, HIGHLIGHT_REL, HIGHLIGHT_CSS, STYLE_REL, JSCRIPT_REL, CRITERIA_LABELS, GEN_DATAFILE_ONLY, JOBS, FORCE, METRIXDB, HOTSPOTS, TAG_NAME, PREHIGHLIGHT, \
+        HISTORY, RUN_NAME, TREND_RUNS
+    shortOptions = "hvfs:m:d:b:r:i:c:y:x:t:l:j:"
     longOptions = ["help", "version", "verbose", "silent", "srcpath=", "modulebase=", "datadir=", \
-        "reportdir=", "installdir=", "highlight-css=", "styledir=", "criteria-labels=", "gen-datafile-only"]
+        "reportdir=", "installdir=", "highlight-css=", "styledir=", "criteria-labels=", "gen-datafile-only", "jobs=", "force", "metrixdb=", "jscriptdir=", "hotspots=", "tagname=", "prehighlight", \
+        "history=", "run=", "trend-runs="]
     opts = []
     remainder = []
 
@@ -333,14 +949,20 @@ def scanArguments():
             MODULE_BASE = a
         elif o == "-d" or o == "--datadir":
             DATADIR_REL = a
+        elif o == "-b" or o == "--metrixdb":
+            METRIXDB = a
         elif o == "-r" or o == "--reportdir":
             REPORTDIR_REL = a
         elif o == "-i" or o == "--installdir":
             HIGHLIGHT_REL = a
         elif o == "-c" or o == "--highligh-css":
             HIGHLIGHT_CSS = a
+        elif o == "--prehighlight":
+            PREHIGHLIGHT = True
         elif o == "-y" or o == "--styledir":
             STYLE_REL = a
+        elif o == "-x" or o == "--jscriptdir":
+            JSCRIPT_REL = a
         elif o == "-l" or o == "--criteria-labels":
             try:
                 CRITERIA_LABELS = ast.literal_eval(a)
@@ -348,44 +970,466 @@ def scanArguments():
                 log(-1, "Error while trying to parse following argument for 'criteria-labels':" + str(a))
         elif o == "--gen-datafile-only":
             GEN_DATAFILE_ONLY = True
+        elif o == "-j" or o == "--jobs":
+            try:
+                JOBS = int(a)
+            except:
+                log(-1, "Error parsing argument for --jobs=" + str(a))
+            if JOBS < 1:
+                log(-1, "Number of jobs must be at least 1: " + str(a))
+        elif o == "-f" or o == "--force":
+            FORCE = True
+        elif o == "-t" or o == "--tagname":
+            TAG_NAME = a
+        elif o == "--hotspots":
+            try:
+                HOTSPOTS = int(a)
+            except:
+                log(-1, "Error parsing argument for --hotspots=" + str(a))
+        elif o == "--history":
+            HISTORY = a
+        elif o == "--run":
+            RUN_NAME = a
+        elif o == "--trend-runs":
+            try:
+                TREND_RUNS = int(a)
+            except:
+                log(-1, "Error parsing argument for --trend-runs=" + str(a))
 
         if len(remainder) > 0:
             log(-1, "Unrecogniozed argument: " + str(remainder))
 
 ##
-# Iterate over the global filelist and generate an HTML-file for each entry.
+# Compute the SHA-1 hash of a file's content.
 #
+# @param filename   absolute or relative path to the file
+# @return hash as hex string
 ##
-def generateHTMLfiles(criterias):
-    # filelist is a dictionary with key=filename and value is a list of entries
-    #                                  0            1           2         3        4           5           6          7       8...
-    # each entry itself is a list [html_path, html_filename, filename, region, metrix_type, modified, line_start, line_end, rest of the row (i. e. all criteria values)
-    line_count = 0
-    for entries in FILELIST.values():
-        # iterate over all files in the filelist
-        line_count += 1
-        fileData = entries[0]
-        # create a HTML file only once per file
-        createHTMLfile(fileData[0], fileData[1])
-        with io.open(fileData[0] + os.sep + fileData[1], "a") as ofile:
-            ofile.write(u"<span id='details_head'>Browse details of file " + fileData[1].replace(".html", "") + u" <select id='NavSection' onChange='JumpToSection'>")
-            for fileData in entries:
-                # iterate over each entry for every file
-                ofile.write(u"<option value='" + fileData[1] + u"@" + str(fileData[6]) + u"-" + str(fileData[7]) + u"'s>")
-                ofile.write(fileData[4] + u": " + fileData[3] + u"(" + str(fileData[6]) + u" - " + str(fileData[7]) + u")</option>\n")
-            ofile.write(u"</select></span>")
-        ofile.close()
-        for fileData in entries:
-            # iterate over each entry for every file
-            copyCode2HTML(fileData[0], fileData[1], fileData[2], fileData[3], fileData[4], fileData[6], fileData[7], fileData[8], criterias)
-        finalizeHTMLfile(fileData[0], fileData[1])
-    log(1, str(line_count) + " files processed.\n")
-
-FILELIST = dict()
-scanArguments()
-if LOGLEVEL >= 2:
-    dumpParameters()
-criterias = readCSVfile(DATADIR_REL, MODULE_BASE)
-if not GEN_DATAFILE_ONLY:
-    generateHTMLfiles(criterias)
-generateDetailedDatafile(DATADIR_REL, MODULE_BASE, SRCPATH)
\ No newline at end of file
+def hashFile(filename):
+    digest = hashlib.sha1()
+    with io.open(filename, "rb") as ifile:
+        chunk = ifile.read(1024 * 1024)
+        while chunk:
+            digest.update(chunk)
+            chunk = ifile.read(1024 * 1024)
+    return digest.hexdigest()
+
+##
+# Read the manifest of the previous run.
+#
+# The manifest \c datadir + os.sep + \c modulebase + '.manifest' records for each sourcefile the hash of its content,
+# the hash of its metrics and the path of the generated HTML file as well as the hash of every data file. It is discarded if it was written by a different
+# version, with different settings (cf. \c settings) or if \c FORCE is set, such that all files get regenerated.
+#
+# @param settings   hash of all settings the generated files depend on
+# @return the manifest as dictionary
+##
+def readManifest(datadir, modulebase, settings):
+    manifest = {"version": MANIFEST_VERSION, "settings": settings, "datafiles": {}, "files": {}}
+    if FORCE:
+        return manifest
+    try:
+        with io.open(datadir + os.sep + modulebase + ".manifest", "r") as ifile:
+            previous = json.load(ifile)
+    except (IOError, ValueError):
+        log(2, "No valid manifest found, generating all files")
+        return manifest
+    if previous.get("version") != MANIFEST_VERSION or previous.get("settings") != settings:
+        log(2, "Settings changed since previous run, generating all files")
+        # keep the output paths to be able to delete pages of removed sourcefiles and data files no longer needed
+        manifest["files"] = dict((filename, {"output": record["output"]}) for filename, record in previous.get("files", {}).items())
+        manifest["datafiles"] = dict((filename, "") for filename in previous.get("datafiles", {}))
+        return manifest
+    manifest["datafiles"] = previous.get("datafiles", {})
+    manifest["files"] = previous.get("files", {})
+    return manifest
+
+##
+# Write the manifest of the current run.
+#
+# The manifest is written to a temporary file first and renamed, such that an interrupted run leaves the manifest
+# of the previous run intact.
+##
+def writeManifest(datadir, modulebase, manifest):
+    filename = datadir + os.sep + modulebase + ".manifest"
+    with io.open(filename + ".tmp", "wb") as ofile:
+        json.dump(manifest, ofile, sort_keys=True)
+    os.rename(filename + ".tmp", filename)
+
+##
+# Compute a hash of all settings and of the script itself, i. e. of everything the generated files depend on besides
+# the sourcefiles and their metrics.
+##
+def settingsHash(criterias):
+    digest = hashlib.sha1(repr((REPORTDIR_REL, HIGHLIGHT_REL, HIGHLIGHT_CSS, PREHIGHLIGHT, STYLE_REL, sorted(CRITERIA_LABELS.items()), criterias)))
+    digest.update(hashFile(os.path.splitext(__file__)[0] + ".py"))
+    digest.update(hashFile(os.path.splitext(metricstore.__file__)[0] + ".py"))
+    digest.update(hashFile(os.path.splitext(highlighter.__file__)[0] + ".py"))
+    return digest.hexdigest()
+
+##
+# Return the cache of the tokens of the sourcefiles of the module, DATADIR_REL/MODULE_BASE.tokens.
+##
+def tokenCache():
+    return highlighter.TokenCache(DATADIR_REL + os.sep + MODULE_BASE + ".tokens")
+
+##
+# Generate the HTML file for a single file, unless it is up to date.
+#
+# Runs in the worker processes if HTML files are generated in parallel. The page is up to date if the content of the
+# sourcefile, its metrics and the path of the HTML file match the record of the previous run and the HTML file still
+# exists. The content hash of the sourcefile is only recomputed if its modification time or size changed. Any error
+# is turned into a RuntimeError naming the sourcefile, such that it can be reported by the parent process.
+#
+# @param task       tuple (MetricStore holding a single file, record of the previous run or None, MODULE_BASE of the
+#                   report); a shared pool of workers (cf. POOL) renders the pages of several modules
+# @return tuple (name of the sourcefile, record for the manifest, True if the HTML file was (re-)generated)
+##
+def generateHTMLfileTask(task):
+    global MODULE_BASE
+    store, previous, MODULE_BASE = task
+    filename = store.fileName(0)
+    try:
+        stat = os.stat(filename)
+        record = {"output": store.htmlPath(0) + os.sep + store.htmlFilename(0), "rows": store.fileDigest(0), \
+            "mtime": stat.st_mtime, "size": stat.st_size}
+        if previous and previous.get("mtime") == record["mtime"] and previous.get("size") == record["size"]:
+            record["source"] = previous["source"]
+        else:
+            record["source"] = hashFile(filename)
+        if previous and all(previous.get(key) == record[key] for key in ("source", "rows", "output")) \
+                and os.path.isfile(record["output"]):
+            return (filename, record, False)
+        generateHTMLfile(store, 0, record["source"])
+    except Exception as err:
+        raise RuntimeError("Error while generating HTML file for " + filename + ": " + repr(err))
+    return (filename, record, True)
+
+##
+# Delete the HTML files of sourcefiles, which were recorded in the manifest but are no longer part of the export.
+#
+# @param filenames  set of names of all sourcefiles of the export
+##
+def removeStaleHTMLfiles(manifest, filenames):
+    for filename in manifest["files"].keys():
+        if not filename in filenames:
+            record = manifest["files"].pop(filename)
+            if os.path.isfile(record["output"]):
+                log(2, "Removing HTML file of removed sourcefile " + filename)
+                os.remove(record["output"])
+
+##
+# Generates HTML files for sourcefiles as they are submitted.
+#
+# Only files whose sourcefile or metrics changed since the previous run (as recorded in the manifest) are
+# regenerated; the records of the manifest are updated accordingly. With \c JOBS > 1 the files are spread across a
+# pool of worker processes. At most a few files per worker are pending at any time, so memory does not depend on
+# the number of files. Every file is rendered to its own page, so the output does not depend on the number of jobs.
+# The first error raised while generating a page is raised as RuntimeError by submit() or close(). If POOL is set,
+# its workers are used and it is left running for the next report; the pages pending in it (cf. POOL_PENDING) are
+# collected in the order they were submitted, whichever report they belong to.
+##
+class HTMLfileGenerator(object):
+    ##
+    # @param manifest   manifest of the previous run (cf. readManifest())
+    ##
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.pending = POOL_PENDING if POOL is not None else collections.deque()
+        # number of files submitted, but not collected yet
+        self.outstanding = 0
+        self.line_count = 0
+        self.generated_count = 0
+        self.pool = POOL
+        if self.pool is None and JOBS > 1:
+            log(2, "Generating HTML files using " + str(JOBS) + " processes")
+            self.pool = multiprocessing.Pool(JOBS)
+
+    ##
+    # Generate the HTML file for a single file (unless it is up to date).
+    #
+    # @param store      MetricStore holding the file
+    # @param f          index of the file within \c store
+    ##
+    def submit(self, store, f):
+        task = (store.extractFile(f), self.manifest["files"].get(store.fileName(f)), MODULE_BASE)
+        if self.pool:
+            self.pending.append((self, self.pool.apply_async(generateHTMLfileTask, (task,))))
+            self.outstanding += 1
+            while len(self.pending) > JOBS * 4:
+                self.collectOldest()
+        else:
+            self.collect(task)
+
+    ##
+    # Wait for the oldest file pending in the pool and record the result in the manifest of the generator it was
+    # submitted to.
+    ##
+    def collectOldest(self):
+        generator, pending = self.pending.popleft()
+        generator.collect(pending)
+
+    ##
+    # Wait for a pending file (or generate it in-process) and record the result in the manifest.
+    ##
+    def collect(self, pending):
+        if self.pool:
+            self.outstanding -= 1
+            # a timeout keeps the wait interruptible by Ctrl-C
+            filename, record, generated = pending.get(0xFFFF)
+        else:
+            filename, record, generated = generateHTMLfileTask(pending)
+        self.manifest["files"][filename] = record
+        self.line_count += 1
+        if generated:
+            self.generated_count += 1
+            log(2, "[" + str(self.line_count) + "] " + filename)
+
+    ##
+    # Wait for all pending files; files of other reports queued before them are collected on the way.
+    ##
+    def close(self):
+        while self.outstanding:
+            self.collectOldest()
+        if self.pool and self.pool is not POOL:
+            self.pool.close()
+            self.pool.join()
+        log(1, str(self.line_count) + " files processed, " + str(self.generated_count) + " HTML files generated.\n")
+
+    ##
+    # Stop all workers without waiting for pending files; a shared pool (cf. POOL) is left to its owner.
+    ##
+    def terminate(self):
+        if self.pool and self.pool is not POOL:
+            self.pool.terminate()
+
+##
+# Return the name of a run without RUN_NAME: the time of the run down to the microsecond, such that runs started
+# within the same second are recorded each, rather than being taken as recorded before.
+##
+def defaultRunName():
+    now = time.time()
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)) + ".%06d" % int((now % 1) * 1000000)
+
+##
+# Open HISTORY and begin to record run RUN_NAME, unless it was recorded before.
+#
+# @return history.MetricHistory
+##
+def openHistory(criterias):
+    name = RUN_NAME or defaultRunName()
+    try:
+        metrics_history = history.MetricHistory(HISTORY, criterias)
+        if metrics_history.beginRun(name, time.time()):
+            log(1, "Recording run '" + name + "' in " + HISTORY)
+        else:
+            log(1, "Run '" + name + "' is already recorded in " + HISTORY + ", it is not recorded again")
+    except history.sqlite3.Error as err:
+        log(-1, "Can't open history " + HISTORY + ": " + str(err))
+    return metrics_history
+
+##
+# Write the trend data files of the most recent TREND_RUNS runs of \c metrics_history by \c writer.
+#
+# The trends of the module and its directories are written to MODULE_BASE.trends.js, which defines 'metricTrends'
+# holding the lists of criterias, run names and run times, per path the values per criteria and run (null for runs
+# without the path) and the data files of the files' trends. The trends of the files are split by top-level directory
+# ('.' for the files of the module itself) like the detailed data files, each file calls loadTrendShard(name, trends);
+# the files are numbered, as distinct directory names must not map to the same filename. They are shown by the page
+# MODULE_BASE.trends.html (cf. TRENDS_PAGE and trends.js), which loads the data files of the files on demand.
+##
+def writeTrendDatafiles(metrics_history, writer):
+    names, times, directories, files = metrics_history.trendData(TREND_RUNS)
+    shards = collections.OrderedDict()
+    for path, trends in files.items():
+        parts = path.split("/", 1)
+        shards.setdefault(parts[0] if len(parts) > 1 else ".", collections.OrderedDict())[path] = trends
+    shard_files = {}
+    for n, (name, trends) in enumerate(shards.items()):
+        shard_files[name] = MODULE_BASE + ".trends.shard." + str(n) + ".js"
+        writer.writeDatafile(shard_files[name], u"loadTrendShard(" + json.dumps(name) + u", " \
+            + json.dumps(trends, sort_keys=True) + u");\n")
+    data = {"criterias": metrics_history.criterias, "runs": names, "times": times, "paths": directories, \
+        "shards": shard_files, "module": MODULE_BASE, \
+        "path": os.path.relpath(DATADIR_REL, REPORTDIR_REL).replace(os.sep, "/")}
+    writer.writeDatafile(MODULE_BASE + ".trends.js", u"var metricTrends = " + json.dumps(data, sort_keys=True) + u";\n")
+
+##
+# Completes a report once the HTML files submitted for it are generated (cf. generateReport()): deletes the HTML files
+# of removed sourcefiles, prunes the token cache and writes the overview pages and the manifest.
+#
+# finish() refers to the settings (MODULE_BASE, DATADIR_REL, ...) of the report; if further reports are generated
+# before, e.g. to queue their pages in the shared POOL as well (cf. 'sourcemetrix.py batch'), these have to be set
+# to the ones of the report again.
+##
+class PendingPages(object):
+    ##
+    # @param htmlfiles  HTMLfileGenerator the sourcefiles were submitted to, None if no HTML files are generated
+    # @param manifest   manifest of the report (cf. generateReport())
+    # @param filenames  set of names of all sourcefiles of the report
+    # @param tagged     optional TaggedReports, whose overview pages are written as well
+    # @param timings    dictionary to add the seconds spent to ("source pages")
+    ##
+    def __init__(self, htmlfiles, manifest, filenames, tagged, timings):
+        self.htmlfiles = htmlfiles
+        self.manifest = manifest
+        self.filenames = filenames
+        self.tagged = tagged
+        self.timings = timings
+
+    ##
+    # Wait for the HTML files of the report and complete it; exits by log(-1) on errors while generating them.
+    ##
+    def finish(self):
+        start = time.time()
+        if self.htmlfiles:
+            try:
+                self.htmlfiles.close()
+            except (RuntimeError, KeyboardInterrupt) as err:
+                self.htmlfiles.terminate()
+                if isinstance(err, KeyboardInterrupt):
+                    raise
+                log(-1, str(err))
+            removeStaleHTMLfiles(self.manifest, self.filenames)
+            # keep the tokens of the current sourcefiles only
+            tokenCache().prune(set(record.get("source") for filename, record in self.manifest["files"].items() \
+                if PREHIGHLIGHT and highlighter.isCpp(filename)))
+            writeOverviewHTMLfiles()
+            if self.tagged is not None:
+                for tag in self.tagged.tags():
+                    writeOverviewHTMLfiles(TaggedReports.basename(tag))
+        writeManifest(DATADIR_REL, MODULE_BASE, self.manifest)
+        self.timings["source pages"] = self.timings.get("source pages", 0.0) + time.time() - start
+
+##
+# Read the sourcefiles, submit their HTML files and write the detailed data file, one sourcefile after the other.
+#
+# Each sourcefile is handed over to the HTML file generator and the data file writer as soon as it is read, so only
+# the files currently being processed are held in memory. The data files are written once all sourcefiles are read,
+# without waiting for the HTML files still pending; the report is completed by the PendingPages returned.
+#
+# @param store      MetricStore the files are read into
+# @param files      iterable of the indices of the files within \c store as they are read (cf. readCSVfile())
+# @param manifest   manifest of the previous run (cf. readManifest()); updated to reflect the current run
+# @param timings    optional dictionary to add the seconds spent per stage to ("read metrics", "source pages",
+#                   "detailed datafile", "history")
+# @param tagged     optional TaggedReports; each sourcefile is added to the sub-reports of its tags as well
+# @return PendingPages to complete the report by
+##
+def generateReport(store, files, manifest, timings=None, tagged=None):
+    if timings is None:
+        timings = {}
+    def elapsed(stage, start):
+        now = time.time()
+        timings[stage] = timings.get(stage, 0.0) + now - start
+        return now
+    start = time.time()
+    datafile = DetailedDatafileWriter(DATADIR_REL, MODULE_BASE, SRCPATH, manifest, store.criterias, HOTSPOTS)
+    htmlfiles = None
+    filenames = set()
+    metrics_history = openHistory(store.criterias) if HISTORY is not None else None
+    try:
+        if not GEN_DATAFILE_ONLY:
+            htmlfiles = HTMLfileGenerator(manifest)
+        for f in files:
+            start = elapsed("read metrics", start)
+            filenames.add(store.fileName(f))
+            datafile.append(store, f)
+            if tagged is not None:
+                tagged.append(store, f)
+            start = elapsed("detailed datafile", start)
+            if metrics_history is not None:
+                metrics_history.append(store, f, store.fileName(f).replace(SRCPATH + os.sep + MODULE_BASE, ""))
+                start = elapsed("history", start)
+            if htmlfiles:
+                htmlfiles.submit(store, f)
+                start = elapsed("source pages", start)
+        start = elapsed("read metrics", start)
+        if metrics_history is not None:
+            metrics_history.endRun()
+            writeTrendDatafiles(metrics_history, datafile)
+            start = elapsed("history", start)
+    except (RuntimeError, KeyboardInterrupt) as err:
+        if htmlfiles:
+            htmlfiles.terminate()
+        datafile.abort()
+        for writer in (tagged.writers() if tagged is not None else []):
+            writer.abort()
+        if metrics_history is not None:
+            # the run is not recorded, as it is incomplete
+            metrics_history.close()
+            metrics_history = None
+        if isinstance(err, KeyboardInterrupt):
+            raise
+        log(-1, str(err))
+    if metrics_history is not None:
+        metrics_history.close()
+    writers = [datafile] + (tagged.writers() if tagged is not None else [])
+    for writer in writers:
+        writer.close(REPORTDIR_REL)
+    removeStaleDatafiles(manifest, writers)
+    elapsed("detailed datafile", start)
+    return PendingPages(htmlfiles, manifest, filenames, tagged, timings)
+
+##
+# Open the metrics to read: the database of metrix++ if METRIXDB is set, the csv file DATADIR/MODULE_BASE.csv otherwise.
+#
+# @return tuple (object to close when done, list of criteria mnemonics, iterable of rows as read from the csv file,
+#         index of the column holding the tags or None, cf. readCSVheader())
+##
+def openMetrics():
+    if METRIXDB is not None:
+        # read the database of metrix++ directly, no export is needed
+        log(1, "Opening database file " + METRIXDB)
+        try:
+            source = mppdb.MetrixDB(METRIXDB)
+        except (IOError, mppdb.sqlite3.Error) as err:
+            log(-1, "Can't read database file " + METRIXDB + ": " + str(err))
+        criterias = source.criterias()
+        log(2, "Processing following criterias: ")
+        log(2, criterias)
+        return (source, criterias, source.iterateRows(), None)
+    log(1, "Opening database file " + DATADIR_REL + os.sep + MODULE_BASE + '.csv')
+    source = open(DATADIR_REL + os.sep + MODULE_BASE + '.csv')
+    # read in cvs output of the 'export' command of metrix++
+    rows = csv.reader(source, delimiter=',')
+    criterias, tag_index = readCSVheader(rows)
+    return (source, criterias, rows, tag_index)
+
+##
+# Generate the HTML files and the detailed data file from \c rows, skipping what is up to date according to the
+# manifest of the previous run.
+#
+# @param criterias  list of criteria mnemonics in order of the columns of \c rows
+# @param rows       iterable of rows as read from the csv file (cf. openMetrics())
+# @param timings    optional dictionary to add the seconds spent per stage to (cf. generateReport())
+# @param stats      optional metricstats.MetricStatistics to collect the criteria values in (cf. readCSVfile())
+# @param tag_index  index of the column holding the tags in \c rows (cf. readCSVheader()); if set, sub-reports are
+#                   generated per tag in the same pass
+# @param pending    optional list to append the PendingPages of the report to, instead of waiting for its HTML files;
+#                   the report is complete once PendingPages.finish() is called
+# @return TaggedReports holding the sub-reports generated, None if \c rows have no tags
+##
+def buildReport(criterias, rows, timings=None, stats=None, tag_index=None, pending=None):
+    manifest = readManifest(DATADIR_REL, MODULE_BASE, settingsHash(criterias))
+    store = metricstore.MetricStore(criterias, retain=False)
+    tagged = TaggedReports(manifest, criterias) if tag_index is not None else None
+    pages = generateReport(store, readCSVfile(rows, MODULE_BASE, store, stats, tag_index), manifest, timings, tagged)
+    if pending is None:
+        pages.finish()
+    else:
+        pending.append(pages)
+    return tagged
+
+def main():
+    scanArguments()
+    if LOGLEVEL >= 2:
+        dumpParameters()
+    source, criterias, rows, tag_index = openMetrics()
+    try:
+        buildReport(criterias, rows, tag_index=tag_index)
+    finally:
+        source.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+##
+# @file highlighter.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Syntax highlighting of C/C++ sourcecode at build time.
+#
+# The lines of a sourcefile are tokenized once, in order, carrying the state of block comments, raw strings and
+# continued preprocessor directives from one line to the next. Per line only the tokens to be highlighted are kept,
+# as flat list [class, start, end, class, start, end, ...] of offsets within the line. The token classes are the ones
+# of Highlight.js, such that its stylesheets (cf. HIGHLIGHT_CSS of canalyse.py) apply to the generated pages as well.
+#
+# As tokenizing is the expensive part, the tokens of each sourcefile are kept in a TokenCache keyed by the hash of
+# the sourcefile's content; a page is re-rendered from the cache without tokenizing its sourcefile again.
+##
+
+import cgi
+import json
+import os
+import re
+import tempfile
+
+## version of the tokens; cached tokens of a different version are ignored
+TOKENIZER_VERSION = 1
+
+## extensions of the sourcefiles highlighted as C/C++
+CPP_EXTENSIONS = (".c", ".h", ".cc", ".cp", ".cpp", ".cxx", ".c++", ".hh", ".hpp", ".hxx", ".h++", ".inl", ".ipp", \
+    ".tcc", ".tpp")
+
+## token classes, a token refers to its class by index
+CLASSES = ("comment", "string", "number", "keyword", "built_in", "literal", "meta")
+COMMENT, STRING, NUMBER, KEYWORD, BUILT_IN, LITERAL, META = range(len(CLASSES))
+
+KEYWORDS = frozenset(("alignas alignof asm auto bool break case catch char char16_t char32_t class const constexpr "
+    "const_cast continue decltype default delete do double dynamic_cast else enum explicit export extern final float "
+    "for friend goto if inline int long mutable namespace new noexcept operator override private protected public "
+    "register reinterpret_cast restrict return short signed sizeof static static_assert static_cast struct switch "
+    "template this thread_local throw try typedef typeid typename union unsigned using virtual void volatile wchar_t "
+    "while").split())
+BUILT_INS = frozenset(("std size_t ptrdiff_t int8_t int16_t int32_t int64_t uint8_t uint16_t uint32_t uint64_t "
+    "string wstring vector list deque map multimap set multiset unordered_map unordered_set pair tuple array "
+    "shared_ptr unique_ptr weak_ptr cin cout cerr clog endl printf sprintf snprintf fprintf scanf malloc calloc "
+    "realloc free memcpy memmove memset strcpy strncpy strcmp strncmp strlen assert").split())
+LITERALS = frozenset(("true false nullptr NULL").split())
+
+## tokens starting within a line, searched from left to right
+TOKEN_RE = re.compile(r"""
+    (?P<comment>//.*)
+    |(?P<block>/\*)
+    |(?P<raw>(?:u8|[uUL])?R"(?P<delim>[^()\\\s]{0,16})\()
+    |(?P<string>(?:u8|[uUL])?"(?:[^"\\]|\\.)*"?)
+    |(?P<char>(?:u8|[uUL])?'(?:[^'\\]|\\.)+')
+    |(?P<number>\.?\d(?:[\w.']|(?<=[eEpP])[+-])*)
+    |(?P<word>[A-Za-z_]\w*)
+    """, re.X)
+## start of a preprocessor directive
+PREPROCESSOR_RE = re.compile(r"\s*#")
+
+##
+# Return True if \c filename is highlighted as C/C++ sourcefile (by its extension).
+##
+def isCpp(filename):
+    return os.path.splitext(filename)[1].lower() in CPP_EXTENSIONS
+
+##
+# Tokenize the lines of a sourcefile.
+#
+# @param lines  indexable sequence of lines (each one including its line break), cf. canalyse.readSourceLines()
+# @return list of the tokens per line, each one a flat list [class, start, end, ...] in ascending order
+##
+def tokenizeLines(lines):
+    result = []
+    # None, COMMENT within a block comment or the terminator of the raw string the line starts within
+    state = None
+    continued = False
+    for linenum in xrange(len(lines)):
+        line = lines[linenum]
+        end = len(line.rstrip("\r\n"))
+        meta = continued or (state is None and PREPROCESSOR_RE.match(line) is not None)
+        tokens = []
+        pos = 0
+        while pos < end:
+            if state is not None:
+                # continue a block comment or raw string of a previous line
+                terminator = "*/" if state == COMMENT else state
+                close = line.find(terminator, pos, end)
+                stop = end if close < 0 else close + len(terminator)
+                tokens.append((COMMENT if state == COMMENT else STRING, pos, stop))
+                if close >= 0:
+                    state = None
+                pos = stop
+                continue
+            match = TOKEN_RE.search(line, pos, end)
+            if match is None:
+                break
+            kind = match.lastgroup
+            start = match.start()
+            pos = match.end()
+            if kind == "word":
+                word = match.group()
+                if word in KEYWORDS:
+                    tokens.append((KEYWORD, start, pos))
+                elif word in BUILT_INS:
+                    tokens.append((BUILT_IN, start, pos))
+                elif word in LITERALS:
+                    tokens.append((LITERAL, start, pos))
+            elif kind == "number":
+                tokens.append((NUMBER, start, pos))
+            elif kind == "comment":
+                tokens.append((COMMENT, start, pos))
+            elif kind == "block":
+                close = line.find("*/", pos, end)
+                if close < 0:
+                    state = COMMENT
+                    pos = end
+                else:
+                    pos = close + 2
+                tokens.append((COMMENT, start, pos))
+            elif kind == "raw":
+                terminator = ")" + match.group("delim") + '"'
+                close = line.find(terminator, pos, end)
+                if close < 0:
+                    state = terminator
+                    pos = end
+                else:
+                    pos = close + len(terminator)
+                tokens.append((STRING, start, pos))
+            else:
+                tokens.append((STRING, start, pos))
+        if meta:
+            tokens = metaTokens(line, end, tokens)
+            # a directive is continued by a backslash at the end of the line
+            continued = state is None and line[:end].rstrip().endswith("\\")
+        result.append([value for token in mergeTokens(tokens) for value in token])
+    return result
+
+##
+# Highlight a line of a preprocessor directive: comments and strings keep their class, everything else is 'meta'.
+##
+def metaTokens(line, end, tokens):
+    result = []
+    pos = len(line) - len(line.lstrip())
+    end = len(line[:end].rstrip())
+    for token in tokens:
+        if token[0] in (COMMENT, STRING):
+            if pos < token[1]:
+                result.append((META, pos, token[1]))
+            result.append(token)
+            pos = token[2]
+    if pos < end:
+        result.append((META, pos, end))
+    return result
+
+##
+# Merge adjacent tokens of the same class, e.g. the parts of a block comment.
+##
+def mergeTokens(tokens):
+    result = []
+    for token in tokens:
+        if result and result[-1][0] == token[0] and result[-1][2] == token[1]:
+            result[-1] = (token[0], result[-1][1], token[2])
+        elif token[2] > token[1]:
+            result.append(token)
+    return result
+
+## opening tags per token class
+SPANS = [u"<span class='hljs-" + name + u"'>" for name in CLASSES]
+
+##
+# Render a line with its tokens (cf. tokenizeLines()) as HTML.
+#
+# @return the escaped line with a \c span element around each token
+##
+def renderLine(line, tokens):
+    parts = []
+    pos = 0
+    for i in xrange(0, len(tokens), 3):
+        start = tokens[i + 1]
+        parts.append(cgi.escape(line[pos:start]))
+        parts.append(SPANS[tokens[i]])
+        pos = tokens[i + 2]
+        parts.append(cgi.escape(line[start:pos]))
+        parts.append(u"</span>")
+    parts.append(cgi.escape(line[pos:]))
+    return u"".join(parts)
+
+##
+# Tokens of sourcefiles, one file per content hash within a directory.
+#
+# Several processes may use the same cache: entries are written to a temporary file first and renamed, so a reader
+# never sees a partially written entry.
+##
+class TokenCache(object):
+    def __init__(self, directory):
+        self.directory = directory
+
+    def filename(self, digest):
+        return os.path.join(self.directory, digest + ".json")
+
+    ##
+    # Return the cached tokens of the sourcefile with content hash \c digest, None if there are none.
+    #
+    # @param line_count number of lines of the sourcefile; tokens of a different number of lines are ignored
+    ##
+    def load(self, digest, line_count):
+        try:
+            with open(self.filename(digest), "rb") as ifile:
+                entry = json.load(ifile)
+        except (IOError, ValueError):
+            return None
+        if entry.get("version") != TOKENIZER_VERSION or len(entry.get("lines", ())) != line_count:
+            return None
+        return entry["lines"]
+
+    def store(self, digest, lines):
+        try:
+            os.makedirs(self.directory)
+        except OSError:
+            # directory may exist already or has just been created by another worker
+            if not os.path.isdir(self.directory):
+                raise
+        handle, tmpname = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(handle, "wb") as ofile:
+                json.dump({"version": TOKENIZER_VERSION, "lines": lines}, ofile, separators=(",", ":"))
+            if os.name == "nt" and os.path.exists(self.filename(digest)):
+                os.remove(self.filename(digest))
+            os.rename(tmpname, self.filename(digest))
+        except:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+
+    ##
+    # Return the tokens of \c lines, the lines of the sourcefile with content hash \c digest. The lines are only
+    # tokenized if there are no cached tokens.
+    ##
+    def tokens(self, digest, lines):
+        tokens = self.load(digest, len(lines)) if digest else None
+        if tokens is None:
+            tokens = tokenizeLines(lines)
+            if digest:
+                self.store(digest, tokens)
+        return tokens
+
+    ##
+    # Remove all entries except the ones of the content hashes \c digests.
+    ##
+    def prune(self, digests):
+        if not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            digest, extension = os.path.splitext(filename)
+            if extension in (".json", ".tmp") and not digest in digests:
+                os.remove(os.path.join(self.directory, filename))
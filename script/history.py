@@ -0,0 +1,203 @@
+##
+# @file history.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Append-only store of the metrics of all runs, for trends of the module, its directories, files and regions.
+#
+# The history is a SQLite database. Each run is recorded once under its name (e.g. the commit analysed) along with
+# its time; runs are never changed afterwards. Per run the criteria values of every region are stored, as well as the
+# sums per file, per directory and for the module as a whole (path ''). Paths and regions are stored once and
+# referenced by id. The values are kept in tables clustered by (path or region, criteria, run), such that the trend of
+# a single file, directory or region is a range lookup within the primary key, however many runs are recorded.
+##
+
+import collections
+import os
+import sqlite3
+import rollup
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, time REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS criterias (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS paths (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS regions (id INTEGER PRIMARY KEY, path INTEGER NOT NULL, name TEXT NOT NULL,
+    type TEXT NOT NULL, occurrence INTEGER NOT NULL, UNIQUE (path, name, type, occurrence));
+CREATE TABLE IF NOT EXISTS totals (path INTEGER NOT NULL, criteria INTEGER NOT NULL, run INTEGER NOT NULL,
+    value NUMERIC, PRIMARY KEY (path, criteria, run)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS region_values (region INTEGER NOT NULL, criteria INTEGER NOT NULL, run INTEGER NOT NULL,
+    value NUMERIC, line_start INTEGER, line_end INTEGER, PRIMARY KEY (region, criteria, run)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS totals_run ON totals (run);
+"""
+
+##
+# History of the metrics of a module.
+##
+class MetricHistory(object):
+    ##
+    # @param filename   database file, created if it does not exist
+    # @param criterias  list of criteria mnemonics of the current run in order of their columns
+    ##
+    def __init__(self, filename, criterias):
+        self.conn = sqlite3.connect(filename)
+        self.conn.executescript(SCHEMA)
+        self.criterias = list(criterias)
+        self.criteria_ids = [self.intern("criterias", "name", criteria) for criteria in self.criterias]
+        self.path_ids = dict((path, id) for id, path in self.conn.execute("SELECT id, path FROM paths"))
+        self.region_ids = None
+        self.run = None
+        self.directories = rollup.DirectoryRollup(self.criterias)
+        self.files = []
+
+    def intern(self, table, column, value):
+        row = self.conn.execute("SELECT id FROM " + table + " WHERE " + column + " = ?", (value,)).fetchone()
+        if row is not None:
+            return row[0]
+        return self.conn.execute("INSERT INTO " + table + " (" + column + ") VALUES (?)", (value,)).lastrowid
+
+    def pathId(self, path):
+        id = self.path_ids.get(path)
+        if id is None:
+            id = self.path_ids[path] = self.conn.execute("INSERT INTO paths (path) VALUES (?)", (path,)).lastrowid
+        return id
+
+    def regionId(self, path_id, name, type, occurrence):
+        key = (path_id, name, type, occurrence)
+        id = self.region_ids.get(key)
+        if id is None:
+            id = self.region_ids[key] = self.conn.execute("INSERT INTO regions (path, name, type, occurrence) " \
+                "VALUES (?, ?, ?, ?)", key).lastrowid
+        return id
+
+    ##
+    # Begin to record run \c name. Runs are recorded only once; the files appended to a run recorded before are only
+    # taken into account for the trend data (cf. trendData()).
+    #
+    # @param timestamp  time of the run, seconds since the epoch
+    # @return True if the run is recorded, False if it was recorded before
+    ##
+    def beginRun(self, name, timestamp):
+        if self.conn.execute("SELECT id FROM runs WHERE name = ?", (name,)).fetchone() is not None:
+            return False
+        self.run = self.conn.execute("INSERT INTO runs (name, time) VALUES (?, ?)", (name, timestamp)).lastrowid
+        if self.region_ids is None:
+            self.region_ids = dict(((path, name, type, occurrence), id) for id, path, name, type, occurrence \
+                in self.conn.execute("SELECT id, path, name, type, occurrence FROM regions"))
+        return True
+
+    ##
+    # Append the regions of file \c f of \c store to the current run.
+    #
+    # @param path   path of the file relative to the root of the module
+    ##
+    def append(self, store, f, path):
+        path = path.replace(os.sep, "/").lstrip("/")
+        self.files.append(path)
+        sums, maxima, count = store.fileTotals(f)
+        self.directories.addFile(path, sums, maxima, count)
+        if self.run is None:
+            return
+        path_id = self.pathId(path)
+        self.conn.executemany("INSERT INTO totals (path, criteria, run, value) VALUES (?, ?, ?, ?)", \
+            [(path_id, self.criteria_ids[c], self.run, value) for c, value in enumerate(sums)])
+        occurrences = collections.defaultdict(int)
+        values = []
+        for row in store.rowRange(f):
+            region = store.row(row)
+            key = (region.region, region.type)
+            region_id = self.regionId(path_id, region.region, region.type, occurrences[key])
+            occurrences[key] += 1
+            values.extend((region_id, self.criteria_ids[c], self.run, value, region.line_start, region.line_end) \
+                for c, value in enumerate(region.values))
+        self.conn.executemany("INSERT INTO region_values (region, criteria, run, value, line_start, line_end) " \
+            "VALUES (?, ?, ?, ?, ?, ?)", values)
+
+    ##
+    # Record the sums per directory and of the module of the current run and commit it.
+    ##
+    def endRun(self):
+        if self.run is not None:
+            totals = self.directories.rollup()
+            self.conn.executemany("INSERT INTO totals (path, criteria, run, value) VALUES (?, ?, ?, ?)", \
+                [(self.pathId(path), self.criteria_ids[c], self.run, totals["sum"][criteria][d]) \
+                for d, path in enumerate(self.directoryPaths()) for c, criteria in enumerate(self.criterias)])
+            self.run = None
+        self.conn.commit()
+
+    ##
+    # Close the database; a run not ended is discarded.
+    ##
+    def close(self):
+        self.conn.rollback()
+        self.conn.close()
+
+    ##
+    # Return the path of each directory of the module appended so far, relative to the root of the module ('' for the
+    # root itself), indexed as the directories of DirectoryRollup.
+    ##
+    def directoryPaths(self):
+        paths = [""]
+        for d in xrange(1, self.directories.directoryCount()):
+            parent = paths[self.directories.parent[d]]
+            paths.append((parent + "/" if parent else "") + self.directories.names[d])
+        return paths
+
+    ##
+    # Return the recorded runs, oldest first.
+    #
+    # @param last   number of most recent runs to return, all if None
+    # @return list of tuples (id, name, time)
+    ##
+    def runs(self, last=None):
+        runs = self.conn.execute("SELECT id, name, time FROM runs ORDER BY time DESC, id DESC" \
+            + (" LIMIT " + str(int(last)) if last is not None else "")).fetchall()
+        return runs[::-1]
+
+    ##
+    # Return the trend of \c criteria of a file or directory (the module for path '').
+    #
+    # @param since  optional time (seconds since the epoch) of the first run to return
+    # @return list of tuples (run name, time, value), oldest first
+    ##
+    def trend(self, path, criteria, since=None):
+        return self.conn.execute("SELECT r.name, r.time, t.value FROM totals t JOIN runs r ON r.id = t.run " \
+            "WHERE t.path = (SELECT id FROM paths WHERE path = ?) " \
+            "AND t.criteria = (SELECT id FROM criterias WHERE name = ?) AND r.time >= ? ORDER BY r.time, r.id", \
+            (path, criteria, since or 0)).fetchall()
+
+    ##
+    # Return the trend of \c criteria of a region, identified as by metricdiff.readRegions().
+    #
+    # @return list of tuples (run name, time, value, line start, line end), oldest first
+    ##
+    def regionTrend(self, path, name, type, occurrence, criteria, since=None):
+        return self.conn.execute("SELECT r.name, r.time, v.value, v.line_start, v.line_end FROM region_values v " \
+            "JOIN runs r ON r.id = v.run WHERE v.region = (SELECT g.id FROM regions g JOIN paths p ON p.id = g.path " \
+            "WHERE p.path = ? AND g.name = ? AND g.type = ? AND g.occurrence = ?) " \
+            "AND v.criteria = (SELECT id FROM criterias WHERE name = ?) AND r.time >= ? ORDER BY r.time, r.id", \
+            (path, name, type, occurrence, criteria, since or 0)).fetchall()
+
+    ##
+    # Collect the trends of the module, its directories and the files appended to the current run over the \c last
+    # runs, e.g. for the data files of the report.
+    #
+    # @return tuple (list of run names, list of run times, trends of the module and directories, trends of the files);
+    #         trends are dictionaries path -> dictionary criteria -> list of values per run, None for runs not holding
+    #         the path
+    ##
+    def trendData(self, last):
+        runs = self.runs(last)
+        columns = dict((run[0], i) for i, run in enumerate(runs))
+        criterias = dict((id, criteria) for id, criteria in zip(self.criteria_ids, self.criterias))
+        directories = collections.OrderedDict()
+        files = collections.OrderedDict()
+        for trends, paths in ((directories, self.directoryPaths()), (files, self.files)):
+            for path in paths:
+                trends[path] = dict((criteria, [None] * len(runs)) for criteria in self.criterias)
+        wanted = {}
+        for trends in (directories, files):
+            wanted.update((self.path_ids[path], trends[path]) for path in trends if path in self.path_ids)
+        if runs:
+            for path_id, criteria_id, run, value in self.conn.execute("SELECT path, criteria, run, value FROM totals " \
+                    "WHERE run IN (" + ",".join(str(run[0]) for run in runs) + ")"):
+                if path_id in wanted and criteria_id in criterias:
+                    wanted[path_id][criterias[criteria_id]][columns[run]] = value
+        return ([run[1] for run in runs], [run[2] for run in runs], directories, files)
@@ -0,0 +1,94 @@
+##
+# @file hotspots.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Index of the regions and files with the highest values per criteria.
+#
+# While the files of a module are read, a bounded min-heap per criteria keeps the k highest values seen so far, such
+# that only O(k) entries are held in memory and each value costs O(log k) at most (O(1) if it does not make it into
+# the heap). Of equal values the ones read first are kept.
+##
+
+import heapq
+import os
+
+##
+# Bounded heap keeping the \c k items of highest value.
+##
+class TopK(object):
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+        self.count = 0
+
+    ##
+    # Offer \c item with \c value; it is kept if it is among the k highest values so far.
+    ##
+    def push(self, value, item):
+        self.count += 1
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, (value, -self.count, item))
+        elif value > self.heap[0][0]:
+            heapq.heapreplace(self.heap, (value, -self.count, item))
+
+    ##
+    # Return the items kept as list of tuples (value, item), highest value first.
+    ##
+    def items(self):
+        return [(value, item) for value, seq, item in sorted(self.heap, reverse=True)]
+
+##
+# Top-k regions and top-k files (by the sum over their distinct regions) per criteria.
+##
+class HotspotIndex(object):
+    ##
+    # @param criterias  list of criteria mnemonics in order of their columns
+    # @param k          number of regions and files to keep per criteria
+    ##
+    def __init__(self, criterias, k):
+        self.criterias = list(criterias)
+        self.k = k
+        self.regions = [TopK(k) for criteria in self.criterias]
+        self.files = [TopK(k) for criteria in self.criterias]
+
+    ##
+    # Offer the regions of file \c f of \c store and the file itself; values of 0 or less are no hotspots.
+    #
+    # @param sums       list of the sums of the values of the distinct regions of the file per criteria
+    #                   (cf. MetricStore.fileTotals())
+    ##
+    def addFile(self, store, f, sums):
+        if self.k <= 0:
+            return
+        location = (store.fileName(f), store.htmlPath(f), store.htmlFilename(f))
+        rows = store.fileRows(f)
+        for c, column in enumerate(store.values):
+            heap = self.regions[c]
+            for row in rows:
+                value = column[row]
+                # most regions do not make it into a full heap, check before building the entry
+                if value > 0 and (len(heap.heap) < self.k or value > heap.heap[0][0]):
+                    heap.push(value, location + (store.strings[store.region[row]], store.strings[store.type[row]], \
+                        store.line_start[row], store.line_end[row]))
+            if sums[c] > 0:
+                self.files[c].push(sums[c], location)
+
+    ##
+    # Render the index, links point to the regions within the sourcecode HTML files.
+    #
+    # @param reportdir  path the links are relative to, i. e. the directory of index.html
+    # @return dictionary criteria -> dictionary with members "regions" (list of lists [value, file, region, type,
+    #         line start, line end, link]) and "files" (list of lists [value, file, link]), highest value first
+    ##
+    def render(self, reportdir):
+        def link(html_path, html_filename, anchor):
+            page = os.path.relpath(os.path.join(html_path, html_filename), reportdir).replace(os.sep, "/")
+            return page + "#" + html_filename + "@" + anchor
+        index = {}
+        for c, criteria in enumerate(self.criterias):
+            index[criteria] = {"regions": [[value, filename, region, type, line_start, line_end, \
+                link(html_path, html_filename, str(line_start) + "-" + str(line_end))] \
+                for value, (filename, html_path, html_filename, region, type, line_start, line_end) \
+                in self.regions[c].items()], \
+                "files": [[value, filename, link(html_path, html_filename, "top")] \
+                for value, (filename, html_path, html_filename) in self.files[c].items()]}
+        return index
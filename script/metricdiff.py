@@ -0,0 +1,140 @@
+##
+# @file metricdiff.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Comparison of the metrics of two runs of metrix++ region by region, e.g. of two releases of a module.
+#
+# Regions are identified by the path of their sourcefile relative to the root of the module, their name, their type
+# and the number of regions of the same name and type before them within the file (to tell overloads apart). Line
+# numbers are not part of the key, so a region moved by edits above it is still matched to its former self.
+#
+# The regions of the baseline are read into a dictionary by their key, the regions of the current run are looked up
+# one by one while they are read (hash join). Both runs are read once, only the baseline is held in memory.
+##
+
+import collections
+import os
+import metricstore
+
+## marks of the status of a region
+ADDED, REMOVED, CHANGED = "added", "removed", "changed"
+
+##
+# Return True if an increase of \c criteria means an improvement (e.g. more comments), False if it means a
+# regression (e.g. higher complexity).
+##
+def higherIsBetter(criteria):
+    return "comments" in criteria
+
+##
+# Read the regions of the sourcefiles below \c root from \c rows.
+#
+# @param rows       iterable of rows as read from the database or export (cf. canalyse.readCSVfile())
+# @param root       directory of the module as written in the rows, e.g. './example-code/boost_1_52_0'
+# @param columns    indices of the criteria values to read, relative to the first criteria column
+# @param tag_index  index of the column holding the tags (cf. canalyse.readCSVheader()), None if there is none
+# @return iterator of tuples (key, filename, line_start, line_end, values); \c key is a tuple (relative path, region,
+#         type, occurrence), \c values a tuple of the criteria values in order of \c columns
+##
+def readRegions(rows, root, columns, tag_index=None):
+    prefix = os.path.normpath(root) + os.sep
+    filename = None
+    relpath = None
+    occurrences = {}
+    for row in rows:
+        try:
+            line_start = int(row[4])
+            line_end = int(row[5])
+        except (ValueError, TypeError, IndexError):
+            continue
+        if row[0] != filename:
+            filename = row[0]
+            path = os.path.normpath(filename)
+            relpath = path[len(prefix):].replace(os.sep, "/") if path.startswith(prefix) else None
+            occurrences = {}
+        if relpath is None:
+            continue
+        name = (row[1], row[2])
+        occurrence = occurrences.get(name, 0)
+        occurrences[name] = occurrence + 1
+        values = row[6:] if tag_index is None else row[6:tag_index] + row[tag_index + 1:]
+        yield ((relpath, row[1], row[2], occurrence), filename, line_start, line_end, \
+            tuple(metricstore.parseValue(values[i]) if i < len(values) else 0 for i in columns))
+
+##
+# Added, removed and changed regions of two runs with the deltas of their criteria values.
+##
+class MetricDiff(object):
+    ##
+    # @param criterias  list of criteria mnemonics in order of the values read by readRegions()
+    ##
+    def __init__(self, criterias):
+        self.criterias = list(criterias)
+        ## list of entries [status, path, region, type, old line start, old line end, new line start, new line end,
+        #  values, deltas, link]; values of the current run (of the baseline for removed regions)
+        self.regions = []
+        self.counts = collections.OrderedDict((status, 0) for status in (ADDED, REMOVED, CHANGED, "unchanged", \
+            "moved", "files added", "files removed"))
+        self.regressions = [0] * len(self.criterias)
+        self.improvements = [0] * len(self.criterias)
+        self.totals = [0] * len(self.criterias)
+
+    ##
+    # Compare the regions of two runs, both as returned by readRegions().
+    #
+    # @param link   optional function(filename, line_start, line_end) returning the link to a region of the current
+    #               run, e.g. to its sourcecode HTML file
+    ##
+    def compare(self, baseline, current, link=None):
+        link = link or (lambda filename, line_start, line_end: None)
+        previous = {}
+        for key, filename, line_start, line_end, values in baseline:
+            previous[key] = (line_start, line_end, values)
+        old_files = set(key[0] for key in previous)
+        new_files = set()
+        for key, filename, line_start, line_end, values in current:
+            new_files.add(key[0])
+            old = previous.pop(key, None)
+            if old is None:
+                self.append(ADDED, key, (None, None), (line_start, line_end), values, values, \
+                    link(filename, line_start, line_end))
+                continue
+            if old[2] != values:
+                self.append(CHANGED, key, old[:2], (line_start, line_end), values, \
+                    tuple(new - before for new, before in zip(values, old[2])), link(filename, line_start, line_end))
+            else:
+                self.counts["unchanged"] += 1
+            if old[:2] != (line_start, line_end):
+                self.counts["moved"] += 1
+        # the remaining regions of the baseline are gone, listed in order of their files
+        for key in sorted(previous):
+            line_start, line_end, values = previous[key]
+            self.append(REMOVED, key, (line_start, line_end), (None, None), values, tuple(-value for value in values), \
+                None)
+        self.counts["files added"] = len(new_files - old_files)
+        self.counts["files removed"] = len(old_files - new_files)
+
+    def append(self, status, key, old_lines, new_lines, values, deltas, link):
+        self.counts[status] += 1
+        for c, delta in enumerate(deltas):
+            self.totals[c] += delta
+            if delta != 0 and (delta > 0) != higherIsBetter(self.criterias[c]):
+                self.regressions[c] += 1
+            elif delta != 0:
+                self.improvements[c] += 1
+        self.regions.append([status, key[0], key[1], key[2]] + list(old_lines) + list(new_lines) \
+            + [list(values), list(deltas), link])
+
+    ##
+    # Render the diff for the diff view (cf. diff.js).
+    #
+    # @param baseline   caption of the baseline
+    # @param current    caption of the current run
+    # @return dictionary with members "baseline", "current", "criterias", "higherIsBetter" (per criteria), "counts"
+    #         (number of regions and files per status), "totals", "regressions" and "improvements" (per criteria) and
+    #         "regions" (list of the entries as described for self.regions)
+    ##
+    def render(self, baseline, current):
+        return {"baseline": baseline, "current": current, "criterias": self.criterias, \
+            "higherIsBetter": [higherIsBetter(criteria) for criteria in self.criterias], \
+            "counts": dict(self.counts), "totals": self.totals, "regressions": self.regressions, \
+            "improvements": self.improvements, "regions": self.regions}
@@ -0,0 +1,181 @@
+##
+# @file metricstats.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Summary statistics and distributions of criteria values, as shown by the diagram of each criteria.
+#
+# The values of all criteria are collected in a single pass over the files of a MetricStore, one typed column per
+# criteria. A file is added once all of its rows are read, such that its 'global' and 'file' regions are merged
+# and counted once (cf. MetricStore.fileRows()). Like 'metrix++ view', a criteria only counts the regions it was
+# collected for (i.e. regions with an empty value are skipped). The values of a file are selected from the columns of
+# the store, with NumPy available by vectorized operations, column by column otherwise. Statistics are computed per
+# column after sorting it once; with NumPy available sorting and summing is vectorized as well.
+##
+
+import array
+import bisect
+import itertools
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+## supported ways to divide the range of values into the bars of a distribution
+BINNINGS = ("linear", "log", "quantile")
+
+##
+# Format the bound of a bar for its label, integral values are printed without decimals.
+##
+def formatBound(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return "%.4f" % value
+
+##
+# Compute percentile \c p (0..100) of the sorted sequence \c values by linear interpolation between the closest ranks
+# (as numpy.percentile() does by default).
+##
+def percentile(values, p):
+    position = (len(values) - 1) * p / 100.0
+    lower = int(math.floor(position))
+    upper = min(lower + 1, len(values) - 1)
+    return float(values[lower] + (values[upper] - values[lower]) * (position - lower))
+
+##
+# Collects the values of all criteria from the files of a MetricStore and computes their statistics.
+##
+class MetricStatistics(object):
+    ##
+    # @param criterias  list of criteria mnemonics in order of their columns
+    ##
+    def __init__(self, criterias):
+        self.criterias = list(criterias)
+        self.values = [array.array('d') for criteria in self.criterias]
+        # criteria whose values were all integers so far
+        self.integral = [True] * len(self.criterias)
+
+    ##
+    # Add the criteria values of the distinct regions of file \c f of \c store (cf. MetricStore.fileRows()); values
+    # of regions a criteria was not collected for are skipped (cf. MetricStore.collectedMask()).
+    ##
+    def addFile(self, store, f):
+        rows = store.fileRows(f)
+        if not rows:
+            return
+        first, last = min(rows), max(rows) + 1
+        # a merged region is left out, the other regions are selected by index then
+        index = None if len(rows) == last - first else [row - first for row in rows]
+        for c in range(len(self.criterias)):
+            if store.values[c].typecode != 'l':
+                self.integral[c] = False
+            column = store.column(c)[first:last]
+            mask = store.collectedMask(c)[first:last]
+            if numpy is not None:
+                if index is not None:
+                    column, mask = column[index], mask[index]
+                self.values[c].fromstring(column[mask].astype(numpy.float64).tostring())
+            else:
+                if index is not None:
+                    column, mask = [column[i] for i in index], [mask[i] for i in index]
+                self.values[c].extend(itertools.compress(column, mask))
+
+    ##
+    # Return the values of criteria \c c in ascending order, as NumPy array if NumPy is available.
+    ##
+    def sortedValues(self, c):
+        if numpy is not None:
+            return numpy.sort(numpy.frombuffer(self.values[c], dtype=numpy.float64))
+        return sorted(self.values[c])
+
+    ##
+    # Compute the bounds of the bars of a distribution.
+    #
+    # @param values     sorted values, at least one
+    # @param integral   True if all values are integers; bounds are rounded to integers then
+    # @param binning    one of BINNINGS: bars of equal width, of equal width on a logarithmic scale or holding equal
+    #                   numbers of values
+    # @param bins       maximum number of bars
+    # @return ascending list of bounds, the first one is the minimum and the last one the maximum of the values
+    ##
+    def binEdges(self, values, integral, binning, bins):
+        low, high = values[0], values[-1]
+        if binning == "quantile":
+            edges = [percentile(values, 100.0 * i / bins) for i in range(bins + 1)]
+        elif binning == "log" and high > 0:
+            # zero and negative values all fall into the first bar
+            positive = values[bisect.bisect_right(values, 0)]
+            edges = [low] if low < positive else []
+            edges.extend(positive * (float(high) / positive) ** (float(i) / bins) for i in range(bins + 1))
+        elif integral:
+            width = int(math.ceil((high - low + 1) / float(bins)))
+            edges = [low + i * width for i in range(bins)] + [high]
+        else:
+            edges = [low + (high - low) * float(i) / bins for i in range(bins + 1)]
+        if integral:
+            edges = [math.ceil(edge) for edge in edges]
+        edges[0], edges[-1] = low, high
+        return sorted(set(edge for edge in edges if low <= edge <= high))
+
+    ##
+    # Compute the distribution of the sorted \c values.
+    #
+    # If there are not more distinct values than bars, there is one bar per value. Otherwise the values are divided
+    # according to binEdges(); a bar holds the values from its lower bound up to (excluding) its upper bound, the last
+    # bar includes the maximum.
+    #
+    # @return list of dictionaries with members "metric" (label), "count" and "ratio", in ascending order
+    ##
+    def distribution(self, values, integral, binning, bins):
+        count = len(values)
+        ranges = []
+        start = 0
+        while start < count and len(ranges) <= bins:
+            end = bisect.bisect_right(values, values[start])
+            ranges.append((start, end, values[start], values[start]))
+            start = end
+        if start < count or len(ranges) > bins:
+            edges = self.binEdges(values, integral, binning, bins)
+            ranges = []
+            for n in range(len(edges) - 1):
+                start = bisect.bisect_left(values, edges[n]) if n > 0 else 0
+                end = bisect.bisect_left(values, edges[n + 1]) if n + 2 < len(edges) else count
+                # integral upper bounds are exclusive, except for the last bar
+                high = edges[n + 1] - 1 if integral and n + 2 < len(edges) else edges[n + 1]
+                ranges.append((start, end, edges[n], max(edges[n], high)))
+        bars = []
+        for start, end, low, high in ranges:
+            if end > start:
+                # label by the values actually in the bar
+                low, high = values[start], values[end - 1]
+            label = formatBound(low) if low == high else formatBound(low) + "-" + formatBound(high)
+            bars.append({"metric": label, "count": end - start, "ratio": float(end - start) / count})
+        return bars
+
+    ##
+    # Compute the statistics of all criteria.
+    #
+    # @param binning        how to divide values into bars (cf. binEdges())
+    # @param bins           maximum number of bars per distribution
+    # @param percentiles    list of percentiles to compute, e.g. [50, 90, 99]
+    # @return dictionary criteria -> dictionary with members "count", "min", "max", "avg", "total",
+    #         "percentiles" (list of tuples (percentile, value)) and "distribution-bars" (cf. distribution());
+    #         criteria without any value are left out
+    ##
+    def summaries(self, binning="linear", bins=20, percentiles=(50, 90, 99)):
+        result = {}
+        for c, criteria in enumerate(self.criterias):
+            if not self.values[c]:
+                continue
+            values = self.sortedValues(c)
+            total = float(numpy.sum(values)) if numpy is not None else math.fsum(values)
+            integral = self.integral[c]
+            number = int if integral else float
+            result[criteria] = {"count": len(values), \
+                "min": number(values[0]), \
+                "max": number(values[-1]), \
+                "avg": total / len(values), \
+                "total": number(total), \
+                "percentiles": [(p, percentile(values, p)) for p in percentiles], \
+                "distribution-bars": self.distribution(values, integral, binning, bins)}
+        return result
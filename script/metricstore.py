@@ -0,0 +1,327 @@
+##
+# @file metricstore.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Compact columnar in-memory store for the rows of a 'metrix++ export'.
+#
+# Instead of keeping a list of Python objects per region, all regions are kept in typed columns. Strings (paths,
+# region names, types) are kept once in a string table and referenced by index. The regions of a sourcefile are
+# stored consecutively; per file only the offset of its first region is kept.
+##
+
+import array
+import collections
+import hashlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+## a single region as returned by MetricStore.regions()
+Region = collections.namedtuple("Region", ["region", "type", "modified", "line_start", "line_end", "values"])
+
+##
+# Convert a criteria value as read from a csv file or database to a number. Empty values count as 0.
+##
+def parseValue(value):
+    if value == "" or value is None:
+        return 0
+    if isinstance(value, (int, long, float)):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+##
+# Format a criteria value for output, integral values are printed without decimals.
+##
+def formatValue(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+##
+# Columnar store of the regions of a module.
+#
+# Files are added by beginFile(), regions by appendRow() and always belong to the file begun last. Unless
+# \c retain is set, beginning a file discards all regions of the files before, such that only a single file is held
+# in memory while streaming an export.
+##
+class MetricStore(object):
+    ##
+    # @param criterias  list of criteria mnemonics in order of their columns
+    # @param retain     keep the regions of all files (True) or only of the current file (False)
+    ##
+    def __init__(self, criterias, retain=True):
+        self.criterias = list(criterias)
+        self.retain = retain
+        self.clear()
+
+    ##
+    # Remove all files and regions.
+    ##
+    def clear(self):
+        self.strings = []
+        self.string_index = {}
+        # per file columns; regions of file f are the rows file_offset[f] up to (excl.) file_offset[f + 1]
+        self.file_name = array.array('l')
+        self.file_html_path = array.array('l')
+        self.file_html_filename = array.array('l')
+        self.file_offset = array.array('l', [0])
+        # per file: set of its tags (cf. tag-files.py)
+        self.file_tags = []
+        # per file: its region holding the merged values of the regions of types 'global' and 'file' (cf.
+        # appendRow()), -1 if there is none
+        self.file_merged = array.array('l')
+        # per region columns
+        self.region = array.array('l')
+        self.type = array.array('l')
+        self.modified = array.array('l')
+        self.line_start = array.array('l')
+        self.line_end = array.array('l')
+        self.values = [array.array('l') for criteria in self.criterias]
+        # per criteria 1 for the regions it was collected for, 0 for those with an empty value (cf. collectedMask())
+        self.collected = [bytearray() for criteria in self.criterias]
+
+    ##
+    # Return the index of string \c text in the string table, adding it if necessary.
+    ##
+    def intern(self, text):
+        index = self.string_index.get(text)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(text)
+            self.string_index[text] = index
+        return index
+
+    ##
+    # Start a new file, all regions appended afterwards belong to it.
+    #
+    # @param filename       name of the sourcefile as listed in the export
+    # @param html_path      path of the HTML file to be generated for the sourcefile
+    # @param html_filename  filename of the HTML file to be generated for the sourcefile
+    # @return index of the new file
+    ##
+    def beginFile(self, filename, html_path, html_filename):
+        if not self.retain:
+            self.clear()
+        if len(self.file_name) > 0:
+            self.file_offset.append(len(self.line_start))
+        self.file_name.append(self.intern(filename))
+        self.file_html_path.append(self.intern(html_path))
+        self.file_html_filename.append(self.intern(html_filename))
+        self.file_tags.append(set())
+        self.file_merged.append(-1)
+        return len(self.file_name) - 1
+
+    ##
+    # Append a region to the current file.
+    #
+    # Regions of type 'global' and 'file' both refer to the complete file. Their criteria values are merged into the
+    # first of them appended, whichever its type; it becomes of type 'file' once a region of type 'file' is appended.
+    #
+    # @param values     list of criteria values as read from the csv file (cf. parseValue())
+    ##
+    def appendRow(self, region, type, modified, line_start, line_end, values):
+        row = len(self.line_start)
+        collected = [0 if value == "" or value is None else 1 for value in values[:len(self.criterias)]]
+        collected.extend([0] * (len(self.criterias) - len(collected)))
+        values = [parseValue(value) for value in values]
+        values.extend([0] * (len(self.criterias) - len(values)))
+        if type == "global" or type == "file":
+            f = len(self.file_name) - 1
+            merged = self.file_merged[f]
+            if merged < 0:
+                self.file_merged[f] = row
+            else:
+                self.addValues(merged, values, collected)
+                if type == "file":
+                    self.type[merged] = self.intern("file")
+        self.region.append(self.intern(region))
+        self.type.append(self.intern(type))
+        self.modified.append(self.intern(modified))
+        self.line_start.append(line_start)
+        self.line_end.append(line_end)
+        for c in range(len(self.criterias)):
+            self.setValue(c, None, values[c])
+            self.collected[c].append(collected[c])
+
+    ##
+    # Add \c values to the criteria values of region \c row, which counts as collected for the criteria of
+    # \c collected as well.
+    ##
+    def addValues(self, row, values, collected):
+        for c in range(len(self.criterias)):
+            self.setValue(c, row, self.values[c][row] + values[c])
+            self.collected[c][row] |= collected[c]
+
+    ##
+    # Set (row is an index) or append (row is None) a criteria value. A column holding integers is converted to a
+    # column of floats as soon as a non integral value shows up.
+    ##
+    def setValue(self, c, row, value):
+        column = self.values[c]
+        if isinstance(value, float) and column.typecode == 'l':
+            column = self.values[c] = array.array('d', column)
+        if row is None:
+            column.append(value)
+        else:
+            column[row] = value
+
+    ##
+    # Add \c tags (list of strings) to the tags of file \c f.
+    ##
+    def addTags(self, f, tags):
+        self.file_tags[f].update(tags)
+
+    ## sorted list of the tags of file \c f
+    def fileTags(self, f):
+        return sorted(self.file_tags[f])
+
+    ## number of files in the store
+    def fileCount(self):
+        return len(self.file_name)
+
+    ## number of regions in the store
+    def rowCount(self):
+        return len(self.line_start)
+
+    ## range of the rows of file \c f
+    def rowRange(self, f):
+        if f + 1 < len(self.file_offset):
+            return xrange(self.file_offset[f], self.file_offset[f + 1])
+        return xrange(self.file_offset[f], len(self.line_start))
+
+    def fileName(self, f):
+        return self.strings[self.file_name[f]]
+
+    def htmlPath(self, f):
+        return self.strings[self.file_html_path[f]]
+
+    def htmlFilename(self, f):
+        return self.strings[self.file_html_filename[f]]
+
+    ##
+    # Return region \c row as Region tuple.
+    ##
+    def row(self, row):
+        strings = self.strings
+        return Region(strings[self.region[row]], strings[self.type[row]], strings[self.modified[row]], \
+            self.line_start[row], self.line_end[row], [column[row] for column in self.values])
+
+    ##
+    # Return the regions of file \c f as list of Region tuples.
+    ##
+    def regions(self, f):
+        return [self.row(row) for row in self.rowRange(f)]
+
+    ##
+    # Return the distinct regions of file \c f as ascending list of rows. Of its regions of types 'global' and 'file'
+    # only the one holding the merged values (cf. appendRow()) is returned, regardless of their order.
+    ##
+    def fileRows(self, f):
+        rows = self.rowRange(f)
+        merged = self.file_merged[f]
+        if merged < 0:
+            return list(rows)
+        types = (self.string_index.get("global"), self.string_index.get("file"))
+        return [row for row in rows if row == merged or not self.type[row] in types]
+
+    ##
+    # Aggregate the criteria values of the distinct regions of file \c f (cf. fileRows()). The criteria of metrix++
+    # are counted per region without its subregions, so the sums are the values of the file as a whole.
+    #
+    # @return tuple (list of sums per criteria, list of maxima per criteria, number of regions)
+    ##
+    def fileTotals(self, f):
+        rows = self.fileRows(f)
+        if not rows:
+            return ([0] * len(self.criterias), [0] * len(self.criterias), 0)
+        if len(rows) == rows[-1] + 1 - rows[0]:
+            first, last = rows[0], rows[-1] + 1
+            return ([sum(column[first:last]) for column in self.values], \
+                [max(column[first:last]) for column in self.values], len(rows))
+        columns = [[column[row] for row in rows] for column in self.values]
+        return ([sum(values) for values in columns], [max(values) for values in columns], len(rows))
+
+    ##
+    # Return the values of criteria \c c of all regions, as NumPy array if NumPy is available.
+    ##
+    def column(self, c):
+        if numpy is not None:
+            return numpy.frombuffer(self.values[c], dtype=numpy.int_ if self.values[c].typecode == 'l' else numpy.float_)
+        return self.values[c]
+
+    ##
+    # Return per region whether criteria \c c was collected for it (its value was not empty), as NumPy array of
+    # booleans if NumPy is available, as bytearray of 1 and 0 otherwise.
+    ##
+    def collectedMask(self, c):
+        if numpy is not None:
+            return numpy.frombuffer(self.collected[c], dtype=numpy.bool_)
+        return self.collected[c]
+
+    ##
+    # Return a new store holding only file \c f, e. g. to pass a single file to a worker process.
+    ##
+    def extractFile(self, f):
+        single = MetricStore(self.criterias)
+        single.beginFile(self.fileName(f), self.htmlPath(f), self.htmlFilename(f))
+        rows = self.rowRange(f)
+        single.region = array.array('l', (single.intern(self.strings[self.region[row]]) for row in rows))
+        single.type = array.array('l', (single.intern(self.strings[self.type[row]]) for row in rows))
+        single.modified = array.array('l', (single.intern(self.strings[self.modified[row]]) for row in rows))
+        single.line_start = self.line_start[rows[0]:rows[-1] + 1] if rows else array.array('l')
+        single.line_end = self.line_end[rows[0]:rows[-1] + 1] if rows else array.array('l')
+        single.values = [column[rows[0]:rows[-1] + 1] if rows else array.array(column.typecode) for column in self.values]
+        single.collected = [column[rows[0]:rows[-1] + 1] if rows else bytearray() for column in self.collected]
+        if self.file_merged[f] >= 0:
+            single.file_merged[0] = self.file_merged[f] - rows[0]
+        return single
+
+    ##
+    # Append file \c f of \c other as a new file of this store (regions are copied as is, without merging).
+    #
+    # @param filename   name to store the file as, defaults to its name in \c other
+    # @return index of the new file
+    ##
+    def appendFile(self, other, f, filename=None):
+        if filename is None:
+            filename = other.fileName(f)
+        new_f = self.beginFile(filename, other.htmlPath(f), other.htmlFilename(f))
+        if other.file_merged[f] >= 0:
+            self.file_merged[new_f] = other.file_merged[f] - other.rowRange(f)[0] + len(self.line_start)
+        for row in other.rowRange(f):
+            self.region.append(self.intern(other.strings[other.region[row]]))
+            self.type.append(self.intern(other.strings[other.type[row]]))
+            self.modified.append(self.intern(other.strings[other.modified[row]]))
+            self.line_start.append(other.line_start[row])
+            self.line_end.append(other.line_end[row])
+            for c in range(len(self.criterias)):
+                self.setValue(c, None, other.values[c][row])
+                self.collected[c].append(other.collected[c][row])
+        return new_f
+
+    ##
+    # Compute the SHA-1 hash of the regions of file \c f.
+    #
+    # @return hash as hex string
+    ##
+    def fileDigest(self, f):
+        digest = hashlib.sha1()
+        for row in self.rowRange(f):
+            digest.update(repr(tuple(self.row(row))))
+        return digest.hexdigest()
+
+    ##
+    # Drop the string index when pickling; it is rebuilt from the string table.
+    ##
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["string_index"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.string_index = dict((text, index) for index, text in enumerate(self.strings))
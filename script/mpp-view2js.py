@@ -3,9 +3,11 @@
 ##
 # @file mpp-view2js.py
 # @copyright (c) 2020 Marc Stoerzel
-# @brief Parses the 'view --format=python' output of metrix++ to generate HTML and Javascript.
+# @brief Computes the statistics of the criterias to generate HTML and Javascript.
 #
-# Generate HTML and Javascript files to display diagram of distribution for criterias.
+# Generate HTML and Javascript files to display diagram of distribution for criterias. Statistics are computed from
+# the csv output of 'metrix++ export' or the database of metrix++ (cf. metricstats.py); the output of
+# 'metrix++ view --format=python' is still accepted as input.
 ##
 
 import os
@@ -13,22 +15,40 @@ import io
 import getopt
 import sys
 import ast
+import csv
+import canalyse
+import mppdb
+import metricstats
+import metricstore
 
 MODULE_BASE = "30_Appl"
 REPORTDIR_REL = "./html"
 DATADIR = "./data"
 STYLEDIR = "./style"
-IN_FILENAME = DATADIR + os.sep + MODULE_BASE + ".py"
+## input file, defaults to DATADIR/MODULE_BASE.csv
+IN_FILENAME = None
 CRITERIA_LABELS = {"std.code.complexity.cyclomatic" : {"label": "cyclomatic complexity", "background-color": 'orange', "border-color":'red', "index": 6},\
     "std.code.filelines.comments" : {"label": "lines of comment per file", "background-color": "lightgreen", "border-color": "green", "index": 7}, \
     "std.code.lines.code" : {"label": "lines of code per file", "background-color": "lightblue", "border-color": "blue", "index": 8}}
 
 _loglevels = {"error": -1, "silent" : 0, "standard" : 1, "verbose" : 2}
 LOGLEVEL = _loglevels["standard"]
+## stream log messages are printed to
+LOGSTREAM = sys.stdout
 GEN_DATAFILE_ONLY = False
 CHARTMINJS = "https://cdn.jsdelivr.net/npm/chart.js@2.9.3/dist/Chart.min.js"
 DIAG_WIDTH = 600
 DIAG_HEIGHT = 280
+## metrix++ database to read the aggregated data from; if None, the output of 'metrix++ view' is parsed instead
+METRIXDB = None
+## name of the column holding the tags of the files (cf. tag-files.py), which is skipped
+TAG_NAME = "tag"
+## how to divide the values of a criteria into the bars of its diagram (cf. metricstats.BINNINGS)
+BINNING = "linear"
+## maximum number of bars of a diagram
+BINS = 20
+## percentiles shown for each criteria
+PERCENTILES = [50, 90, 99]
 
 ##
 # Print version information and exit
@@ -42,7 +62,7 @@ def printVersion():
 ##
 def printUsage():
     print "usage:", sys.argv[0], "[OPTION] [in-file]"
-    print "Parses the 'view --format=python' of metrix++ to generate Javascript datafiles."
+    print "Computes the statistics of the criterias to generate Javascript datafiles and diagrams."
     print "Options and arguments:"
     print "  -h, --help                 print this help message and exit"
     print "  --silent                   turn on silent mode: no output except in case of error"
@@ -57,8 +77,18 @@ def printUsage():
     print "                                 defaults to:", DATADIR
     print "  -y, --styledir=DIR         directory containing the generic style.css file"
     print "                                  defaults to:", STYLEDIR
-    print "  in-file                    input file for conversion; shall be output of metrix++ view command"
-    print "                                 defaults to:", DATADIR + os.sep + MODULE_BASE + ".py"
+    print "  -b, --metrixdb=FILE        read the metrics from the database of metrix++ instead of in-file"
+    print "  in-file                    input file for conversion; shall be csv output of metrix++ export command"
+    print "                                 or (if not ending with .csv) python output of metrix++ view command"
+    print "                                 defaults to:", os.path.join(DATADIR, MODULE_BASE + ".csv")
+    print "  --tagname=TAGNAME          name of the column holding the tags of the files, which is skipped"
+    print "                                 defaults to:", TAG_NAME
+    print "  --binning=MODE             division of values into bars: " + ", ".join(metricstats.BINNINGS)
+    print "                                 defaults to:", BINNING
+    print "  --bins=N                   maximum number of bars per diagram"
+    print "                                 defaults to:", BINS
+    print "  --percentiles=LIST         comma separated list of percentiles to show"
+    print "                                 defaults to:", ",".join(str(p) for p in PERCENTILES)
     print "  -l, --criteria-labels=DICT dictionary, where "
     print "                                 key = mnemnonic of the criteria and "
     print "                                 value = dictionary with following items"
@@ -88,16 +118,21 @@ def dumpParameters():
     print "  --chart-js =", CHARTMINJS
     print "  --diagram-width =", DIAG_WIDTH
     print "  --diagram-height =", DIAG_HEIGHT
+    print "  --metrixdb =", METRIXDB
+    print "  --tagname =", TAG_NAME
+    print "  --binning =", BINNING
+    print "  --bins =", BINS
+    print "  --percentiles =", ",".join(str(p) for p in PERCENTILES)
 
 ##
-# Print a log message to stdout if loglevel is set appropriate.
+# Print a log message to LOGSTREAM if loglevel is set appropriate.
 #
-# @param level      verbosity level of this message. If level < LOG_LEVEL the message will be printed to stdout.
+# @param level      verbosity level of this message. If level < LOG_LEVEL the message will be printed to LOGSTREAM.
 # @param message    string to be printed
 ##
 def log(level, message):
     if LOGLEVEL >= level:
-        print(message)
+        print >> LOGSTREAM, message
     if (level < 0):
         sys.exit(-level)
 
@@ -108,10 +143,10 @@ def log(level, message):
 # supported command line arguments).
 ##
 def scanArguments():
-    global REPORTDIR_REL, STYLEDIR, LOGLEVEL, MODULE_BASE, REPORTDIR_REL, DATADIR, IN_FILENAME, CRITERIA_LABELS, GEN_DATAFILE_ONLY, DIAG_WIDTH, DIAG_HEIGHT, CHARTMINJS
-    shortOptions = "hvs:r:m:d:y:l:c:w:t:"
+    global REPORTDIR_REL, STYLEDIR, LOGLEVEL, MODULE_BASE, REPORTDIR_REL, DATADIR, IN_FILENAME, CRITERIA_LABELS, GEN_DATAFILE_ONLY, DIAG_WIDTH, DIAG_HEIGHT, CHARTMINJS, METRIXDB, BINNING, BINS, PERCENTILES, TAG_NAME
+    shortOptions = "hvs:r:m:d:y:l:c:w:t:b:"
     longOptions = ["help", "version", "verbose", "silent", "srcpath=", "reportdir=", "modulebase=", "datadir=", "styledir=", \
-        "criteria-labels=", "gen-datafile-only", "chart-js=", "diagram-width=", "diagram-height="]
+        "criteria-labels=", "gen-datafile-only", "chart-js=", "diagram-width=", "diagram-height=", "metrixdb=", "binning=", "bins=", "percentiles=", "tagname="]
     opts = []
     args = []
 
@@ -149,6 +184,26 @@ def scanArguments():
                 CRITERIA_LABELS = ast.literal_eval(a)
             except:
                 log(-1, "error while trying to parse following argument for 'criteria-labels':" + str(a))
+        elif o == "-b" or o == "--metrixdb":
+            METRIXDB = a
+        elif o == "--tagname":
+            TAG_NAME = a
+        elif o == "--binning":
+            if a not in metricstats.BINNINGS:
+                log(-1, "Unknown binning '" + str(a) + "', use one of: " + ", ".join(metricstats.BINNINGS))
+            BINNING = a
+        elif o == "--bins":
+            try:
+                BINS = int(a)
+            except:
+                log(-1, "Error parsing argument for --bins=" + str(a))
+            if BINS < 1:
+                log(-1, "Number of bins must be at least 1: " + str(a))
+        elif o == "--percentiles":
+            try:
+                PERCENTILES = [float(p) if "." in p else int(p) for p in a.split(",") if p.strip()]
+            except:
+                log(-1, "Error parsing argument for --percentiles=" + str(a))
         elif o == "--gen-datafile-only":
             GEN_DATAFILE_ONLY = True
         elif o in ("chart-js", 'c'):
@@ -166,111 +221,194 @@ def scanArguments():
 
     if len(args) == 1:
         IN_FILENAME = args[0]
-    if not os.path.isfile(IN_FILENAME):
+    if IN_FILENAME is None:
+        IN_FILENAME = os.path.join(DATADIR, MODULE_BASE + ".csv")
+    if METRIXDB is None and not os.path.isfile(IN_FILENAME):
         log(-1, "Can't read input file: " + IN_FILENAME)
 
 ##
-# Parse the output of 'metrix++ view format=Python' for data of \c criteria.
+# Compute the statistics of all criterias from the rows of the csv file \c in_filename or, if METRIXDB is set, of the
+# database of metrix++.
 #
-# Open in_file and parse it as Python code as generated by an invocation of 'metrix++ view format=Python'.
-# Iterate over the parsed data structure and extract the information for \c criteria: minimum, maximum, 
-# average and total values and data on the diagram bars. Data on diagram bars will be converted to Javascript
-# code.
-# @param [in]   in_filename     filename pointing to the python file to be parsed
-# @param [in]   criteria        identifier of a criteria to aprse for, e.g. std.code.complexity.cyclomatic
-# @param [out]  dictionary with members "min", "max", "avg", "tot" holding the respective values and "code" 
-#               representing the data of the distribution bars converted to Javascript code
+# @return dictionary criteria -> statistics (cf. metricstats.MetricStatistics.summaries())
+##
+def computeStatistics(in_filename):
+    canalyse.LOGLEVEL = LOGLEVEL
+    canalyse.LOGSTREAM = LOGSTREAM
+    canalyse.TAG_NAME = TAG_NAME
+    try:
+        if METRIXDB is not None:
+            log(2, "Reading database " + METRIXDB)
+            source = mppdb.MetrixDB(METRIXDB)
+            criterias = source.criterias()
+            rows = source.iterateRows()
+            tag_index = None
+        else:
+            log(2, "Reading file " + in_filename)
+            source = open(in_filename)
+            rows = csv.reader(source, delimiter=',')
+            criterias, tag_index = canalyse.readCSVheader(rows)
+        try:
+            stats = metricstats.MetricStatistics(criterias)
+            # the rows of a file are merged by the store before its values are added to the statistics
+            store = metricstore.MetricStore(criterias, retain=False)
+            for f in canalyse.readCSVfile(rows, MODULE_BASE, store, stats, tag_index):
+                pass
+        finally:
+            source.close()
+    except (IOError, StopIteration, mppdb.sqlite3.Error) as err:
+        log(-1, "Can't read metrics from " + (METRIXDB or in_filename) + ": " + str(err))
+    return stats.summaries(BINNING, BINS, PERCENTILES)
+
+##
+# Read the aggregated data of all criterias.
+#
+# Compute the statistics from the csv file \c in_filename or the database of metrix++ (cf. computeStatistics()), or
+# if \c in_filename does not end with '.csv', parse it as Python code as generated by an invocation of
+# 'metrix++ view format=Python'.
+# @param [in]   in_filename     filename pointing to the file to be parsed
+# @return dictionary criteria -> aggregated data with members as in the output of 'metrix++ view'
 ##
-def parseViewOutput(in_filename, criteria):
-    ret = {"avg": 0.0, "min": 0, "max": 0, "tot": 0, "code": ""}
-    log(2, "Parsing file " + in_filename + " for criteria " + criteria)
+def readAggregatedData(in_filename):
+    if METRIXDB is not None or in_filename.endswith(".csv"):
+        return computeStatistics(in_filename)
+    log(2, "Parsing file " + in_filename)
+    viewData = {"view": [{"data": {"aggregated-data": {}}}]}
     with open(in_filename, 'r') as pyFile:
         pyCode = pyFile.readline()
         try:
             viewData = ast.literal_eval(pyCode)
         except:
             log(0, "Error while trying to parse file " + in_filename)
-        for criteria_name, details in viewData["view"][0]["data"]["aggregated-data"].items():
-            for detail_name, detail_data in details.items():
-                values = []
-                categories = []
-                if criteria == criteria_name + "." + detail_name:
-                    log(3, "Found data for : " + criteria + " = '" + CRITERIA_LABELS[criteria]["label"]+ "'")
-                    ret["avg"] = float(detail_data["avg"])
-                    log(3, "\tAverage: " + str(ret["avg"]))
-                    ret["min"] = int(detail_data["min"])
-                    log(3, "\tMinimum: " + str(ret["min"]))
-                    ret["min"] = int(detail_data["max"])
-                    log(3, "\tMaximum: " + str(ret["max"]))
-                    ret["tot"] = int(detail_data["total"])
-                    log(3, "\tTotal: " + str(ret["tot"]))
-                    for bar in detail_data["distribution-bars"]:
-                        values.append(bar["count"])
-                        categories.append(bar["metric"])
-                    log(3, "values = " + str(values))
-                    log(3, "categories = " + str(categories))
-                    ret["code"] += u"var values = " + str(values) + ";\n"
-                    ret["code"] += u"var categories = " + str(categories) + ";\n"
+    aggregated = {}
+    for criteria_name, details in viewData["view"][0]["data"]["aggregated-data"].items():
+        for detail_name, detail_data in details.items():
+            aggregated[criteria_name + "." + detail_name] = detail_data
+    return aggregated
+
+##
+# Extract the data of \c criteria from the aggregated data.
+#
+# Extract the information for \c criteria: minimum, maximum, average and total values, percentiles (if computed)
+# and data on the diagram bars. Data on diagram bars will be converted to Javascript code.
+# @param [in]   aggregated      aggregated data as returned by readAggregatedData()
+# @param [in]   criteria        identifier of a criteria to aprse for, e.g. std.code.complexity.cyclomatic
+# @param [out]  dictionary with members "min", "max", "avg", "tot" holding the respective values, "percentiles"
+#               (list of tuples (percentile, value)) and "code" representing the data of the distribution bars
+#               converted to Javascript code
+##
+def parseViewOutput(aggregated, criteria):
+    ret = {"avg": 0.0, "min": 0, "max": 0, "tot": 0, "percentiles": [], "code": ""}
+    log(2, "Extracting data for criteria " + criteria)
+    if criteria in aggregated:
+        detail_data = aggregated[criteria]
+        values = []
+        categories = []
+        log(3, "Found data for : " + criteria + " = '" + CRITERIA_LABELS[criteria]["label"]+ "'")
+        ret["avg"] = float(detail_data["avg"])
+        log(3, "\tAverage: " + str(ret["avg"]))
+        ret["min"] = int(detail_data["min"])
+        log(3, "\tMinimum: " + str(ret["min"]))
+        ret["max"] = int(detail_data["max"])
+        log(3, "\tMaximum: " + str(ret["max"]))
+        ret["tot"] = int(detail_data["total"])
+        log(3, "\tTotal: " + str(ret["tot"]))
+        ret["percentiles"] = detail_data.get("percentiles", [])
+        log(3, "\tPercentiles: " + str(ret["percentiles"]))
+        for bar in detail_data["distribution-bars"]:
+            values.append(bar["count"])
+            categories.append(bar["metric"])
+        log(3, "values = " + str(values))
+        log(3, "categories = " + str(categories))
+        ret["code"] += u"var values = " + str(values) + ";\n"
+        ret["code"] += u"var categories = " + str(categories) + ";\n"
     return ret
 
 ##
-# Generate an HTML file to display diagram of distribution for a criteria.
+# Render an HTML file to display diagram of distribution for a criteria.
 #
-# Write to a file (existing file will be overwritten) REPORTDIR/MODULE_BASE.<criteria>.html the HTML and Javascript code
-# to display a bar diagram showing the distribution, min, max, average and total values.
+# The HTML and Javascript code displays a bar diagram showing the distribution, min, max, average and total values
+# and the percentiles.
+#
+# @return content of the HTML file as unicode string
 ##
-def writeHTMLfile(criteria, min, max, avg, tot):
+def renderHTMLfile(criteria, min, max, avg, tot, percentiles=[]):
     global REPORTDIR_REL, STYLEDIR, LOGLEVEL, MODULE_BASE, REPORTDIR_REL, DATADIR, IN_FILENAME, CRITERIA_LABELS, GEN_DATAFILE_ONLY, DIAG_WIDTH, DIAG_HEIGHT, CHARTMINJS
 
     styledir_rel = os.path.relpath(STYLEDIR, REPORTDIR_REL)
     datadir_rel = os.path.relpath(DATADIR, REPORTDIR_REL)
+    parts = []
+    parts.append(u"<!DOCTYPE html>\n  <html>\n	<head>\n")
+    parts.append(u"	  <script src='" + CHARTMINJS + u"'></script>\n")
+    parts.append(u"	  <link rel='stylesheet' type='text/css' href='" + styledir_rel+ u"/style.css'>\n")
+    parts.append(u"	</head>\n  <body>\n")
+    parts.append(u"		<h2 id='" + str(CRITERIA_LABELS[criteria]["label"]).replace(' ', '_') + u"'>Distribution of " + CRITERIA_LABELS[criteria]["label"] + u"</h2>\n")
+    parts.append(u"      <p>Average : " + str(avg) + u"<br>\n")
+    parts.append(u"         Minimum : " + str(min) + u"<br>\n")
+    parts.append(u"         Maximum : " + str(max) + u"<br>\n")
+    parts.append(u"         Total : " + str(tot))
+    for p, value in percentiles:
+        parts.append(u"<br>\n         Percentile " + str(p) + u" : " + ("%g" % value))
+    parts.append(u"</p>\n")
+    parts.append(u"		<canvas id='" + criteria + u"' width='" + str(DIAG_WIDTH) + u"' height='" + str(DIAG_HEIGHT) + u"'></canvas>\n")
+    parts.append(u"	  <script src='" + datadir_rel + os.sep + MODULE_BASE + u'.' + criteria + u".js'></script>\n")
+    parts.append(u"	  <script>\n")
+    parts.append(u"	  	var ctx = document.getElementById('" + criteria + u"');\n")
+    parts.append(u"	  	var myChart = new Chart(ctx, {\n")
+    parts.append(u"	  	  type: 'bar',\n")
+    parts.append(u"	  	  data: {\n")
+    parts.append(u"	  	    labels: categories,\n")
+    parts.append(u"	  	    datasets: [{ \n")
+    parts.append(u"	  	        label: '" + CRITERIA_LABELS[criteria]["label"] + u"',\n")
+    parts.append(u"	  	        backgroundColor: '" + CRITERIA_LABELS[criteria]["background-color"] + u"',\n")
+    parts.append(u"	  	        borderColor: '" + CRITERIA_LABELS[criteria]["border-color"] + u"',\n")
+    parts.append(u"	  	        borderWidth: 1,\n")
+    parts.append(u"	  	        data: values\n")
+    parts.append(u"	  	      }]\n}\n	  	});\n")
+    parts.append(u"		document.addEventListener('DOMContentLoaded', function () {\n")
+    parts.append(u"		    document.getElementById('" + str(CRITERIA_LABELS[criteria]["label"]).replace(' ', '_') + u"').innerText = \n")
+    parts.append(u"               'Distribution of "+ CRITERIA_LABELS[criteria]["label"]+ "';\n")
+    parts.append(u"		});\n")
+    parts.append(u"	  </script>\n</bod></html>")
+    return u"".join(parts)
+
+##
+# Generate an HTML file to display diagram of distribution for a criteria.
+#
+# Write to a file (existing file will be overwritten) REPORTDIR/MODULE_BASE.<criteria>.html the content rendered by
+# renderHTMLfile().
+##
+def writeHTMLfile(criteria, min, max, avg, tot, percentiles=[]):
     # TODO file open access might fail
     with io.open(REPORTDIR_REL + os.sep + MODULE_BASE + '.' + criteria + ".html", "w") as htmlFile:
-        htmlFile.write(u"<!DOCTYPE html>\n  <html>\n	<head>\n")
-        htmlFile.write(u"	  <script src='" + CHARTMINJS + u"'></script>\n")
-        htmlFile.write(u"	  <link rel='stylesheet' type='text/css' href='" + styledir_rel+ u"/style.css'>\n")
-        htmlFile.write(u"	</head>\n  <body>\n")
-        htmlFile.write(u"		<h2 id='" + str(CRITERIA_LABELS[criteria]["label"]).replace(' ', '_') + u"'>Distribution of " + CRITERIA_LABELS[criteria]["label"] + u"</h2>\n")
-        htmlFile.write(u"      <p>Average : " + str(avg) + u"<br>\n")
-        htmlFile.write(u"         Minimum : " + str(min) + u"<br>\n")
-        htmlFile.write(u"         Maximum : " + str(max) + u"<br>\n")
-        htmlFile.write(u"         Total : " + str(tot) + u"</p>\n")
-        htmlFile.write(u"		<canvas id='" + criteria + u"' width='" + str(DIAG_WIDTH) + u"' height='" + str(DIAG_HEIGHT) + u"'></canvas>\n")
-        htmlFile.write(u"	  <script src='" + datadir_rel + os.sep + MODULE_BASE + u'.' + criteria + u".js'></script>\n")
-        htmlFile.write(u"	  <script>\n")
-        htmlFile.write(u"	  	var ctx = document.getElementById('" + criteria + u"');\n")
-        htmlFile.write(u"	  	var myChart = new Chart(ctx, {\n")
-        htmlFile.write(u"	  	  type: 'bar',\n")
-        htmlFile.write(u"	  	  data: {\n")
-        htmlFile.write(u"	  	    labels: categories,\n")
-        htmlFile.write(u"	  	    datasets: [{ \n")
-        htmlFile.write(u"	  	        label: '" + CRITERIA_LABELS[criteria]["label"] + u"',\n")
-        htmlFile.write(u"	  	        backgroundColor: '" + CRITERIA_LABELS[criteria]["background-color"] + u"',\n")
-        htmlFile.write(u"	  	        borderColor: '" + CRITERIA_LABELS[criteria]["border-color"] + u"',\n")
-        htmlFile.write(u"	  	        borderWidth: 1,\n")
-        htmlFile.write(u"	  	        data: values\n")
-        htmlFile.write(u"	  	      }]\n}\n	  	});\n")
-        htmlFile.write(u"		document.addEventListener('DOMContentLoaded', function () {\n")
-        htmlFile.write(u"		    document.getElementById('" + str(CRITERIA_LABELS[criteria]["label"]).replace(' ', '_') + u"').innerText = \n")
-        htmlFile.write(u"               'Distribution of "+ CRITERIA_LABELS[criteria]["label"]+ "';\n")
-        htmlFile.write(u"		});\n")
-        htmlFile.write(u"	  </script>\n</bod></html>")
-    htmlFile.close()
+        htmlFile.write(renderHTMLfile(criteria, min, max, avg, tot, percentiles))
 
-scanArguments()
-if LOGLEVEL >= 2:
-    dumpParameters()
+##
+# Write the Javascript data file and (unless GEN_DATAFILE_ONLY is set) the HTML file of each criteria.
+#
+# @param aggregated     aggregated data as returned by readAggregatedData()
+##
+def writeCriteriaFiles(aggregated):
+    for criteria in CRITERIA_LABELS.keys():
+        data_code = parseViewOutput(aggregated, criteria)
+        if data_code["code"] == "":
+            log(0, "No data found for criteria '" + criteria + "'")
+        else:
+            try:
+                with open(DATADIR + os.sep + MODULE_BASE + '.' + criteria + ".js", 'w') as criteriaJSfile:
+                    criteriaJSfile.write(data_code["code"])
+                criteriaJSfile.close()
+            except:
+                log(-1, "Can't write data file " + DATADIR + os.sep + MODULE_BASE + '.' + criteria + ".js")
+            if not GEN_DATAFILE_ONLY:
+                writeHTMLfile(criteria, data_code["min"], data_code["max"], data_code["avg"], data_code["tot"], \
+                    data_code["percentiles"])
 
-for criteria in CRITERIA_LABELS.keys():
-    data_code = parseViewOutput(IN_FILENAME, criteria)
-    if data_code["code"] == "":
-        log(0, "No data found for criteria '" + criteria + "'")
-    else:
-        try:
-            with open(DATADIR + os.sep + MODULE_BASE + '.' + criteria + ".js", 'w') as criteriaJSfile:
-                criteriaJSfile.write(data_code["code"])
-            criteriaJSfile.close()
-        except:
-            log(-1, "Can't write data file " + DATADIR + os.sep + MODULE_BASE + '.' + criteria + ".js")
-        if not GEN_DATAFILE_ONLY:
-            writeHTMLfile(criteria, data_code["min"], data_code["max"], data_code["avg"], data_code["tot"])
\ No newline at end of file
+def main():
+    scanArguments()
+    if LOGLEVEL >= 2:
+        dumpParameters()
+    writeCriteriaFiles(readAggregatedData(IN_FILENAME))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+##
+# @file mppdb.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Read-only access to the SQLite database written by 'metrix++ collect'.
+#
+# Provides the rows of 'metrix++ export' directly from the database, such that the csv output of metrix++ needs not
+# be generated and parsed.
+#
+# metrix++ keeps the files in table '__files__' and their regions in table '__regions__'. The criteria of a namespace
+# (e.g. 'std.code.lines') are columns (e.g. 'code') of a table named like the namespace; a namespace either holds
+# one row per region (keyed by file_id and region_id) or one row per file (keyed by file_id).
+##
+
+import os
+import sqlite3
+
+## bits of the group_id of a region and their names as written by 'metrix++ export'
+REGION_TYPES = [(0x01, "global"), (0x02, "class"), (0x04, "struct"), (0x08, "namespace"), (0x10, "function"), \
+    (0x20, "interface")]
+## SQL types of columns holding numeric criteria
+NUMERIC_TYPES = ("integer", "real")
+
+##
+# Convert the group_id of a region to its type as written by 'metrix++ export', e.g. 'function'.
+##
+def regionType(group):
+    if group == 0x00:
+        return "none"
+    if group == 0xFF:
+        return "any"
+    return ", ".join(name for bit, name in REGION_TYPES if group & bit)
+
+##
+# Quote a table or column name for use in an SQL statement.
+##
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+##
+# A metrix++ database opened for reading.
+##
+class MetrixDB(object):
+    ##
+    # @param filename   path to the database file, e.g. metrixpp.db
+    # @exception IOError if the database file does not exist
+    ##
+    def __init__(self, filename):
+        # sqlite3 would silently create a new database
+        if not os.path.isfile(filename):
+            raise IOError(2, "No such database file", filename)
+        self.filename = filename
+        self.conn = sqlite3.connect(filename)
+        self.conn.execute("PRAGMA query_only = ON")
+        # list of tuples (namespace, True if the namespace holds regions, list of numeric fields)
+        self.namespaces = []
+        tables = self.conn.execute("SELECT id, name, support_regions FROM __tables__ WHERE confirmed = 1 ORDER BY name")
+        for table_id, name, support_regions in tables.fetchall():
+            fields = [row[0] for row in self.conn.execute("SELECT name FROM __columns__ WHERE table_id = ? AND " \
+                "confirmed = 1 AND type IN (?, ?) ORDER BY name", (table_id,) + NUMERIC_TYPES)]
+            if fields:
+                self.namespaces.append((name, bool(support_regions), fields))
+
+    def close(self):
+        self.conn.close()
+
+    ##
+    # Return the mnemonics of all criteria in the database in order of the columns of iterateRows(), e.g.
+    # 'std.code.lines.code'.
+    ##
+    def criterias(self):
+        return [namespace + "." + field for namespace, support_regions, fields in self.namespaces for field in fields]
+
+    ##
+    # Build a SELECT statement joining the criteria tables of either kind to \c base.
+    #
+    # @param columns        columns to select before the criteria values
+    # @param base           FROM clause up to the criteria tables
+    # @param regions        join the namespaces holding regions (True) or holding files (False)
+    # @param key            join condition for a criteria table aliased as %(t)s
+    # @return tuple (SELECT statement without WHERE clause, list of the criteria indices of the selected values)
+    ##
+    def _joinCriterias(self, columns, base, regions, key):
+        indices = []
+        joins = []
+        c = 0
+        for n, (namespace, support_regions, fields) in enumerate(self.namespaces):
+            if support_regions == regions:
+                alias = "t" + str(n)
+                joins.append(" LEFT JOIN " + quote(namespace) + " AS " + alias + " ON " + key % {"t": alias})
+                for field in fields:
+                    columns.append(alias + "." + quote(field))
+                    indices.append(c + fields.index(field))
+            c += len(fields)
+        return ("SELECT " + ", ".join(columns) + " FROM " + base + "".join(joins), indices)
+
+    ##
+    # Iterate the regions of all files in the layout of the rows of 'metrix++ export'.
+    #
+    # Every row is a list [file, region, type, modified, line start, line end, criteria values...] with the criteria
+    # values in order of criterias() and None for criteria not applicable to the row. As with the export, the regions
+    # of a file are followed by a row of type 'file' holding the criteria collected per file.
+    ##
+    def iterateRows(self):
+        count = len(self.criterias())
+        region_sql, region_indices = self._joinCriterias(["r.file_id", "r.name", "r.group_id", "r.line_begin", \
+            "r.line_end"], "__regions__ AS r INNER JOIN __files__ AS f ON f.id = r.file_id", True, \
+            "%(t)s.file_id = r.file_id AND %(t)s.region_id = r.region_id")
+        file_sql, file_indices = self._joinCriterias(["f.id", "f.path", "r.line_begin", "r.line_end"], \
+            "__files__ AS f LEFT JOIN __regions__ AS r ON r.file_id = f.id AND r.region_id = 1", False, \
+            "%(t)s.file_id = f.id")
+        # both cursors are ordered by file, regions are merged into the list of files
+        region_rows = self.conn.cursor().execute(region_sql + " WHERE f.confirmed = 1 ORDER BY r.file_id, r.region_id")
+        file_rows = self.conn.cursor().execute(file_sql + " WHERE f.confirmed = 1 ORDER BY f.id")
+        region = next(region_rows, None)
+        for file_row in file_rows:
+            file_id, path = file_row[0], file_row[1]
+            while region is not None and region[0] <= file_id:
+                if region[0] == file_id:
+                    values = [None] * count
+                    for c, value in zip(region_indices, region[5:]):
+                        values[c] = value
+                    yield [path, region[1], regionType(region[2]), "", region[3], region[4]] + values
+                region = next(region_rows, None)
+            values = [None] * count
+            for c, value in zip(file_indices, file_row[4:]):
+                values[c] = value
+            yield [path, "", "file", "", file_row[2] if file_row[2] is not None else -1, file_row[3]] + values
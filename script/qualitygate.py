@@ -0,0 +1,149 @@
+##
+# @file qualitygate.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Check of the metrics of a module against limits per criteria, e.g. as quality gate of a CI pipeline.
+#
+# Limits and waivers are read from a thresholds file, one per line; empty lines and lines starting with '#' are
+# ignored:
+#
+#   limit CRITERIA SCOPE MAXIMUM [GLOB]     values of CRITERIA above MAXIMUM are violations; SCOPE is 'region' (each
+#                                           region) or 'file' (sum over the regions of a file); without GLOB the limit
+#                                           applies to all files
+#   waive CRITERIA GLOB[:REGION]            violations of CRITERIA ('*' for all criterias) by the files matching GLOB
+#                                           (and their regions matching REGION) are ignored
+#
+# GLOB is matched against the path of a file relative to the root of the module, as fnmatch does. Of the limits of the
+# same criteria and scope, the last one matching a file applies, so general limits are given first and exceptions
+# after them. The limits applying to a file are looked up once per file.
+##
+
+import collections
+import fnmatch
+import re
+
+SCOPES = ("region", "file")
+
+Limit = collections.namedtuple("Limit", ["criteria", "scope", "maximum", "glob", "line"])
+Waiver = collections.namedtuple("Waiver", ["criteria", "glob", "region", "line"])
+## a region or file exceeding a limit; a file is reported as region '' of type 'file' with the lines of the file as a
+#  whole (cf. QualityGate.fileLines())
+Violation = collections.namedtuple("Violation", ["filename", "region", "type", "line_start", "line_end", "criteria", \
+    "scope", "value", "maximum"])
+
+##
+# Return a compiled regular expression matching as fnmatch does \c pattern, None if \c pattern is None.
+##
+def compileGlob(pattern):
+    return re.compile(fnmatch.translate(pattern)) if pattern is not None else None
+
+##
+# Read the limits and waivers of a thresholds file (cf. the description of this module).
+#
+# @return tuple (list of Limit, list of Waiver)
+# @exception ValueError if a line can't be parsed, the message names file and line
+##
+def readThresholds(filename):
+    limits = []
+    waivers = []
+    with open(filename) as ifile:
+        for linenum, line in enumerate(ifile, 1):
+            words = line.split()
+            if not words or words[0].startswith("#"):
+                continue
+            location = filename + ":" + str(linenum) + ": "
+            if words[0] == "limit" and len(words) in (4, 5):
+                if words[2] not in SCOPES:
+                    raise ValueError(location + "scope must be one of " + ", ".join(SCOPES) + ": " + words[2])
+                try:
+                    maximum = float(words[3])
+                except ValueError:
+                    raise ValueError(location + "maximum is not a number: " + words[3])
+                limits.append(Limit(words[1], words[2], maximum, compileGlob(words[4] if len(words) > 4 else None), \
+                    linenum))
+            elif words[0] == "waive" and len(words) == 3:
+                glob, separator, region = words[2].partition(":")
+                waivers.append(Waiver(words[1], compileGlob(glob), compileGlob(region) if separator else None, \
+                    linenum))
+            else:
+                raise ValueError(location + "expected 'limit CRITERIA SCOPE MAXIMUM [GLOB]' or " \
+                    "'waive CRITERIA GLOB[:REGION]': " + line.strip())
+    return (limits, waivers)
+
+##
+# Checks the files of a MetricStore one by one against limits.
+##
+class QualityGate(object):
+    ##
+    # @param criterias  list of criteria mnemonics in order of the columns of the stores checked
+    # @param limits     list of Limit; limits of criterias not in \c criterias are ignored
+    # @param waivers    list of Waiver
+    ##
+    def __init__(self, criterias, limits, waivers):
+        self.criterias = list(criterias)
+        self.limits = [limit for limit in limits if limit.criteria in self.criterias]
+        self.waivers = waivers
+        self.files = 0
+        self.waived = 0
+
+    ##
+    # Return the limits applying to the file \c path as list of tuples (criteria index, scope, maximum).
+    ##
+    def fileLimits(self, path):
+        applying = collections.OrderedDict()
+        for limit in self.limits:
+            if limit.glob is None or limit.glob.match(path):
+                applying[(limit.criteria, limit.scope)] = limit.maximum
+        return [(self.criterias.index(criteria), scope, maximum) for (criteria, scope), maximum in applying.items()]
+
+    def isWaived(self, path, region, criteria):
+        for waiver in self.waivers:
+            if (waiver.criteria == "*" or waiver.criteria == criteria) and waiver.glob.match(path) \
+                    and (waiver.region is None or waiver.region.match(region)):
+                return True
+        return False
+
+    ##
+    # Return the lines of file \c f of \c store as tuple (first line, last line): the ones of its region of type
+    # 'global' or 'file', the extent of all its regions if there is none.
+    ##
+    def fileLines(self, store, f):
+        types = (store.string_index.get("global"), store.string_index.get("file"))
+        rows = store.rowRange(f)
+        for row in rows:
+            if store.type[row] in types:
+                return (store.line_start[row], store.line_end[row])
+        return (min(store.line_start[row] for row in rows), max(store.line_end[row] for row in rows))
+
+    ##
+    # Check file \c f of \c store.
+    #
+    # @param path   path of the file relative to the root of the module, the globs are matched against
+    # @return list of Violation, not waived
+    ##
+    def checkFile(self, store, f, path):
+        self.files += 1
+        limits = self.fileLimits(path)
+        if not limits:
+            return []
+        rows = store.fileRows(f)
+        if not rows:
+            return []
+        sums = store.fileTotals(f)[0]
+        violations = []
+        for c, scope, maximum in limits:
+            column = store.values[c]
+            if scope == "file":
+                if sums[c] > maximum:
+                    line_start, line_end = self.fileLines(store, f)
+                    violations.append(Violation(store.fileName(f), "", "file", line_start, line_end, \
+                        self.criterias[c], scope, sums[c], maximum))
+                continue
+            for row in rows:
+                if column[row] > maximum:
+                    violations.append(Violation(store.fileName(f), store.strings[store.region[row]], \
+                        store.strings[store.type[row]], store.line_start[row], store.line_end[row], \
+                        self.criterias[c], scope, column[row], maximum))
+        result = [violation for violation in violations \
+            if not self.isWaived(path, violation.region, violation.criteria)]
+        self.waived += len(violations) - len(result)
+        return result
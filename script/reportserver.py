@@ -0,0 +1,225 @@
+##
+# @file reportserver.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Local HTTP server rendering the pages of a report on request.
+#
+# Instead of generating all pages of a report up front, pages are rendered when they are requested first and kept in
+# a PageCache, which is bounded by the size of the (compressed) pages and evicts the least recently used ones. Every
+# response carries an ETag, such that the browser may revalidate its copy by If-None-Match, and is gzip-compressed if
+# the browser accepts it. Requests are handled in threads, so a slow page does not block the others.
+##
+
+import BaseHTTPServer
+import SocketServer
+import collections
+import gzip
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+import urllib
+import urlparse
+
+##
+# Compress \c data (a byte string) by gzip.
+##
+def gzipContent(data):
+    buffer = io.BytesIO()
+    # a fixed modification time keeps the compressed content stable
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=6, mtime=0) as zfile:
+        zfile.write(data)
+    return buffer.getvalue()
+
+##
+# Return the content of \c filename as byte string.
+##
+def readFile(filename):
+    with io.open(filename, "rb") as ifile:
+        return ifile.read()
+
+##
+# Return the deepest directory holding all \c paths.
+##
+def commonRoot(paths):
+    paths = [os.path.abspath(path) for path in paths]
+    root = os.path.commonprefix(paths)
+    if not all(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for path in paths):
+        root = os.path.dirname(root)
+    return root
+
+##
+# A page as sent: its ETag, its compressed content and the version of its source it was rendered from.
+##
+class Page(object):
+    def __init__(self, version, content, content_type):
+        if isinstance(content, unicode):
+            content = content.encode("utf-8")
+        self.version = version
+        self.etag = 'W/"' + hashlib.sha1(content).hexdigest() + '"'
+        self.content_type = content_type
+        self.gzipped = gzipContent(content)
+
+    def __len__(self):
+        return len(self.gzipped)
+
+    ## the uncompressed content, for clients not accepting gzip
+    def content(self):
+        with gzip.GzipFile(fileobj=io.BytesIO(self.gzipped), mode="rb") as zfile:
+            return zfile.read()
+
+##
+# Least recently used pages, up to a total size of their compressed content. Safe to be used by several threads.
+##
+class PageCache(object):
+    ##
+    # @param capacity   maximum total size of the pages in bytes
+    ##
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        self.pages = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    ##
+    # Return the page cached for \c path, None if there is none or if it was rendered from a different version.
+    ##
+    def get(self, path, version):
+        with self.lock:
+            page = self.pages.pop(path, None)
+            if page is None or page.version != version:
+                if page is not None:
+                    self.size -= len(page)
+                self.misses += 1
+                return None
+            # re-insert as most recently used
+            self.pages[path] = page
+            self.hits += 1
+            return page
+
+    def put(self, path, page):
+        with self.lock:
+            previous = self.pages.pop(path, None)
+            if previous is not None:
+                self.size -= len(previous)
+            if len(page) > self.capacity:
+                return
+            self.pages[path] = page
+            self.size += len(page)
+            while self.size > self.capacity:
+                evicted, oldest = self.pages.popitem(last=False)
+                self.size -= len(oldest)
+
+##
+# Threaded HTTP server holding the page cache.
+#
+# Paths of requests are relative to \c root. A path is looked up by \c resolve first, which returns None or a tuple
+# (version, render) of a page rendered on request: \c version identifies the source the page is rendered from (e.g.
+# the modification time and size of a sourcefile, None if it never changes) and \c render() returns its content.
+# Other paths are served from the files within \c static_dirs.
+##
+class ReportServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    ##
+    # @param address        tuple (host, port) to bind to
+    # @param root           directory all paths are relative to
+    # @param resolve        function returning the page of a path (normalized, relative to \c root) as described above
+    # @param static_dirs    directories whose files are served as they are
+    # @param index          path of the page to redirect '/' to
+    # @param capacity       maximum total size of the cached pages in bytes
+    # @param log            function(level, message) to log with
+    ##
+    def __init__(self, address, root, resolve, static_dirs, index, capacity, log):
+        BaseHTTPServer.HTTPServer.__init__(self, address, ReportRequestHandler)
+        self.root = os.path.abspath(root)
+        self.resolve = resolve
+        self.static_dirs = [os.path.abspath(directory) + os.sep for directory in static_dirs]
+        self.index = index
+        self.cache = PageCache(capacity)
+        self.log = log
+
+    ##
+    # Return the page of \c path (relative to the root), rendering it unless it is cached; None if there is no such
+    # page.
+    ##
+    def page(self, path):
+        found = self.resolve(path)
+        if found is None:
+            filename = os.path.join(self.root, path)
+            if not any(filename.startswith(directory) for directory in self.static_dirs) \
+                    or not os.path.isfile(filename):
+                return None
+            stat = os.stat(filename)
+            found = ((stat.st_mtime, stat.st_size), lambda: readFile(filename))
+        version, render = found
+        page = self.cache.get(path, version)
+        if page is None:
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            if content_type.startswith("text/") or content_type == "application/javascript":
+                content_type += "; charset=utf-8"
+            page = Page(version, render(), content_type)
+            self.cache.put(path, page)
+        return page
+
+##
+# Handles GET and HEAD requests of a ReportServer.
+##
+class ReportRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.respond(True)
+
+    def do_HEAD(self):
+        self.respond(False)
+
+    def respond(self, send_body):
+        path = urllib.unquote(urlparse.urlparse(self.path).path)
+        if path in ("", "/"):
+            self.send_response(302)
+            self.send_header("Location", "/" + self.server.index)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        path = os.path.normpath(path.lstrip("/"))
+        if path.startswith(os.pardir) or os.path.isabs(path):
+            self.send_error(403)
+            return
+        try:
+            page = self.server.page(path)
+        except Exception as err:
+            self.server.log(1, "Error while rendering " + path + ": " + repr(err))
+            self.send_error(500)
+            return
+        if page is None:
+            self.send_error(404)
+            return
+        tags = [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]
+        if page.etag in tags or "*" in tags:
+            self.send_response(304)
+            self.send_header("ETag", page.etag)
+            self.end_headers()
+            return
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+        content = page.gzipped if gzipped else page.content()
+        self.send_response(200)
+        self.send_header("Content-Type", page.content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", page.etag)
+        # the browser revalidates its copy on each use, which costs a 304 at most
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(content)
+
+    ## the client's address, without looking up its name
+    def address_string(self):
+        return self.client_address[0]
+
+    def log_message(self, format, *args):
+        self.server.log(2, self.address_string() + " " + (format % args))
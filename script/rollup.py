@@ -0,0 +1,118 @@
+##
+# @file rollup.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Aggregation of the criteria values of a module along its directory tree.
+#
+# Each file is added with its per file totals (cf. MetricStore.fileTotals()) to the directory holding it. Directories
+# are numbered in the order they are created, so a parent always has a lower index than its children; visiting the
+# directories in reverse order therefore is a post-order traversal, which adds up all subtrees in a single pass.
+##
+
+import array
+import re
+
+##
+# Directory tree of a module holding the sum, maximum and number of files per directory.
+#
+# Directory 0 is the root of the module; its name is the empty string.
+##
+class DirectoryRollup(object):
+    ##
+    # @param criterias  list of criteria mnemonics in order of their columns
+    ##
+    def __init__(self, criterias):
+        self.criterias = list(criterias)
+        self.names = [""]
+        self.parent = array.array('l', [-1])
+        # per directory: name of subdirectory -> index
+        self.children = [{}]
+        # aggregates of the files directly within a directory
+        self.files = array.array('l', [0])
+        self.regions = array.array('l', [0])
+        self.sums = [[0] for criteria in self.criterias]
+        self.maxima = [[0] for criteria in self.criterias]
+
+    def directoryCount(self):
+        return len(self.names)
+
+    ##
+    # Return the index of the directory \c path, which is created (as all its parents) if not yet known.
+    #
+    # @param path   path relative to the root of the module; '/' and '\' both separate directories
+    ##
+    def directory(self, path):
+        d = 0
+        for name in re.split(r"[\\/]", path):
+            if name in ("", "."):
+                continue
+            child = self.children[d].get(name)
+            if child is None:
+                child = len(self.names)
+                self.children[d][name] = child
+                self.names.append(name)
+                self.parent.append(d)
+                self.children.append({})
+                self.files.append(0)
+                self.regions.append(0)
+                for c in range(len(self.criterias)):
+                    self.sums[c].append(0)
+                    self.maxima[c].append(0)
+            d = child
+        return d
+
+    ##
+    # Add a file to the directory holding it.
+    #
+    # @param filename   path of the file relative to the root of the module
+    # @param sums       list of the sums of the values of its regions per criteria
+    # @param maxima     list of the maxima of the values of its regions per criteria
+    # @param regions    number of regions of the file
+    ##
+    def addFile(self, filename, sums, maxima, regions):
+        d = self.directory(re.sub(r"[^\\/]*$", "", filename))
+        self.files[d] += 1
+        self.regions[d] += regions
+        for c in range(len(self.criterias)):
+            self.sums[c][d] += sums[c]
+            if maxima[c] > self.maxima[c][d]:
+                self.maxima[c][d] = maxima[c]
+
+    ##
+    # Aggregate every directory over its complete subtree in one bottom-up pass.
+    #
+    # The aggregates of the single directories are left as they are, so files may still be added afterwards.
+    #
+    # @return dictionary with members "files" (number of files directly within each directory), "totalFiles",
+    #         "regions" and per criteria (dictionaries criteria -> column) "sum", "max" and "mean" (the sum divided
+    #         by the number of files of the subtree); columns are typed arrays indexed by directory
+    ##
+    def rollup(self):
+        count = len(self.names)
+        files = array.array('l', self.files)
+        regions = array.array('l', self.regions)
+        sums = [list(column) for column in self.sums]
+        maxima = [list(column) for column in self.maxima]
+        for d in xrange(count - 1, 0, -1):
+            p = self.parent[d]
+            files[p] += files[d]
+            regions[p] += regions[d]
+            for c in range(len(self.criterias)):
+                sums[c][p] += sums[c][d]
+                if maxima[c][d] > maxima[c][p]:
+                    maxima[c][p] = maxima[c][d]
+        means = [array.array('d', (float(total) / files[d] if files[d] else 0.0 for d, total in enumerate(column))) \
+            for column in sums]
+        return {"files": array.array('l', self.files), \
+            "totalFiles": files, \
+            "regions": regions, \
+            "sum": dict((criteria, typedColumn(sums[c])) for c, criteria in enumerate(self.criterias)), \
+            "max": dict((criteria, typedColumn(maxima[c])) for c, criteria in enumerate(self.criterias)), \
+            "mean": dict((criteria, means[c]) for c, criteria in enumerate(self.criterias))}
+
+##
+# Convert a list of numbers to a typed array, of integers unless any of the numbers is a float.
+##
+def typedColumn(values):
+    if any(isinstance(value, float) for value in values):
+        return array.array('d', values)
+    return array.array('l', values)
@@ -0,0 +1,213 @@
+##
+# @file searchindex.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Prebuilt index to search the files and regions of a module by parts of their names within the browser.
+#
+# Every file (named by its path relative to the module) and every region (named by its name) is a document. A
+# document is indexed by the trigrams of its lowercased name: per trigram the ascending numbers of the documents
+# containing it (posting list).
+#
+# The trigrams are hashed into buckets (cf. bucketOf()) and the documents are split into chunks of CHUNK documents.
+# Each bucket and each chunk is written to a data file of its own, such that a query loads only the buckets of its
+# trigrams, intersects their posting lists and loads the chunks of the candidates to check their names (cf.
+# search.js). The number of buckets grows with the number of postings, so the size of a bucket does not depend on the
+# size of the module.
+##
+
+import array
+import collections
+
+## number of documents per chunk
+CHUNK = 1024
+## number of postings a bucket is sized for on average
+BUCKET_POSTINGS = 16384
+MAX_BUCKETS = 4096
+
+##
+# Return the lowercased unicode \c text, as compared by search.js.
+##
+def normalize(text):
+    if isinstance(text, str):
+        text = text.decode("utf-8", "replace")
+    return text.lower()
+
+##
+# Return the distinct trigrams of \c text (normalized).
+##
+def trigrams(text):
+    return set(text[i:i + 3] for i in xrange(len(text) - 2))
+
+##
+# Return the bucket of trigram \c gram among \c buckets buckets; search.js hashes alike (by UTF-16 code units, which
+# are the characters of \c gram within the Basic Multilingual Plane).
+##
+def bucketOf(gram, buckets):
+    value = 0
+    for ch in gram:
+        value = value * 31 + ord(ch)
+    return value % buckets
+
+##
+# Trigram index of the names of the files and regions of a module.
+#
+# Documents are numbered once all are added (cf. finish()), ordered by their lowercased names; documents of the same
+# name are adjacent then, in the order they were added, and the names starting with a query make up a single range of
+# documents. The first name of each chunk is listed, such that search.js checks the candidates from the chunk the
+# query sorts into on, i. e. names equal to and starting with the query first, before wrapping around.
+##
+class SearchIndex(object):
+    def __init__(self):
+        ## string -> index within self.strings, for the names and types of the documents
+        self.string_index = {}
+        self.strings = []
+        ## per file: tuple (relative filename, path of the HTML file, filename of the HTML file)
+        self.files = []
+        ## per document in the order added: index of its name, lowercased name and type in self.strings, its file,
+        #  its first and last line (0 for files)
+        self.name = array.array('l')
+        self.lower = array.array('l')
+        self.type = array.array('l')
+        self.file = array.array('l')
+        self.line_start = array.array('l')
+        self.line_end = array.array('l')
+        ## documents in order of their numbers, set by finish()
+        self.order = None
+        ## trigram -> posting list, set by finish()
+        self.postings = None
+
+    def intern(self, text):
+        index = self.string_index.get(text)
+        if index is None:
+            index = self.string_index[text] = len(self.strings)
+            self.strings.append(text)
+        return index
+
+    def documentCount(self):
+        return len(self.name)
+
+    def addDocument(self, name, type, file, line_start, line_end):
+        self.name.append(self.intern(name))
+        self.lower.append(self.intern(normalize(name)))
+        self.type.append(self.intern(type))
+        self.file.append(file)
+        self.line_start.append(line_start)
+        self.line_end.append(line_end)
+
+    ##
+    # Add file \c f of \c store and its regions; regions of type 'file' (cf. MetricStore.appendRow()) are found by the
+    # file itself.
+    ##
+    def addFile(self, store, f):
+        filename = store.fileName(f)
+        file = len(self.files)
+        self.files.append((filename, store.htmlPath(f), store.htmlFilename(f)))
+        self.addDocument(filename.replace("\\", "/").lstrip("/"), "file", file, 0, 0)
+        file_type = store.string_index.get("file")
+        for row in store.rowRange(f):
+            if store.type[row] != file_type:
+                self.addDocument(store.strings[store.region[row]], store.strings[store.type[row]], file, \
+                    store.line_start[row], store.line_end[row])
+
+    ##
+    # Number the documents and build the posting lists. As the documents of a name are numbered consecutively, the
+    # trigrams are extracted once per distinct name and its range of documents is appended to their posting lists.
+    ##
+    def finish(self):
+        counts = collections.Counter(self.lower)
+        names = sorted(counts, key=self.strings.__getitem__)
+        rank = dict((name, r) for r, name in enumerate(names))
+        ranks = [rank[name] for name in self.lower]
+        self.order = array.array('l', sorted(xrange(self.documentCount()), key=ranks.__getitem__))
+        self.postings = {}
+        start = 0
+        for name in names:
+            end = start + counts[name]
+            for gram in trigrams(self.strings[name]):
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array.array('l')
+                posting.extend(xrange(start, end))
+            start = end
+
+    ##
+    # Return the number of buckets the trigrams are hashed into, a power of two.
+    ##
+    def bucketCount(self):
+        postings = sum(len(posting) for posting in self.postings.itervalues())
+        buckets = 1
+        while buckets * BUCKET_POSTINGS < postings and buckets < MAX_BUCKETS:
+            buckets *= 2
+        return buckets
+
+    ##
+    # Iterate the buckets of the index.
+    #
+    # @return iterator of tuples (bucket, sorted list of its trigrams, offsets of their posting lists within docs plus
+    #         the end of the last one, concatenated posting lists as array)
+    ##
+    def buckets(self, count):
+        grams = [[] for b in xrange(count)]
+        for gram in self.postings:
+            grams[bucketOf(gram, count)].append(gram)
+        for b in xrange(count):
+            offsets = array.array('l', [0])
+            docs = array.array('l')
+            grams[b].sort()
+            for gram in grams[b]:
+                docs.extend(self.postings[gram])
+                offsets.append(len(docs))
+            yield (b, grams[b], offsets, docs)
+
+    ##
+    # Return the lowercased name of the first document of each chunk.
+    ##
+    def chunkNames(self):
+        return [self.strings[self.lower[self.order[start]]] for start in xrange(0, self.documentCount(), CHUNK)]
+
+    ##
+    # Iterate the chunks of documents.
+    #
+    # @param link   function(html path, html filename) returning the link to the sourcecode HTML file of a file
+    # @return iterator of tuples (chunk, dictionary with members "strings" (names and types of the chunk), "paths"
+    #         and "pages" (per file of the chunk its relative filename and the link to its sourcecode HTML file, None
+    #         if the link is the filename + '.html') and per document the columns "name", "type" (indices into
+    #         strings), "file" (index into paths and pages), "lineStart" and "lineEnd")
+    ##
+    def chunks(self, link):
+        # per file: tuple (relative filename, link or None)
+        locations = {}
+        for k, start in enumerate(xrange(0, self.documentCount(), CHUNK)):
+            string_index = {}
+            strings = []
+            def intern(text):
+                index = string_index.get(text)
+                if index is None:
+                    index = string_index[text] = len(strings)
+                    strings.append(text)
+                return index
+            files = {}
+            paths = []
+            pages = []
+            columns = dict((name, array.array('l')) for name in ("name", "type", "file", "lineStart", "lineEnd"))
+            for doc in self.order[start:start + CHUNK]:
+                file = self.file[doc]
+                index = files.get(file)
+                if index is None:
+                    location = locations.get(file)
+                    if location is None:
+                        filename, html_path, html_filename = self.files[file]
+                        path = filename.replace("\\", "/").lstrip("/")
+                        page = link(html_path, html_filename)
+                        location = locations[file] = (path, page if page != path + ".html" else None)
+                    index = files[file] = len(paths)
+                    paths.append(location[0])
+                    pages.append(location[1])
+                columns["name"].append(intern(self.strings[self.name[doc]]))
+                columns["type"].append(intern(self.strings[self.type[doc]]))
+                columns["file"].append(index)
+                columns["lineStart"].append(self.line_start[doc])
+                columns["lineEnd"].append(self.line_end[doc])
+            columns["strings"] = strings
+            columns["paths"] = paths
+            columns["pages"] = pages
+            yield (k, columns)
@@ -0,0 +1,1179 @@
+#!/usr/bin/python
+
+##
+# @file sourcemetrix.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Single entry point to generate a report from the database of metrix++.
+#
+# 'sourcemetrix.py build' reads the database once and runs all stages of the report in a single process: the
+# sourcecode HTML files and the detailed data file (canalyse.py), the diagrams of the criterias (mpp-view2js.py) and
+# the index.html file. A summary of the time spent per stage is printed at the end.
+#
+# 'sourcemetrix.py serve' reads the metrics once as well, but renders the pages of the report only when they are
+# requested from a local HTTP server (cf. reportserver.py).
+#
+# With option --watch, 'sourcemetrix.py build' keeps polling the sourcefiles after the report is generated. The
+# metrics of changed sourcefiles are collected again by metrix++, patched into the metrics held in memory, and the
+# report is regenerated, writing only the pages and data files affected by the change (cf. watcher.py).
+#
+# 'sourcemetrix.py diff' compares the metrics with those of a baseline, e.g. of a previous release, region by region
+# (cf. metricdiff.py) and generates a page listing the added, removed and changed regions.
+#
+# 'sourcemetrix.py check' only checks the metrics against the limits of a thresholds file (cf. qualitygate.py) and
+# lists the violations, without generating any file of the report.
+#
+# 'sourcemetrix.py batch' generates the reports of several modules listed in a modules file in a single run. The
+# sourcecode HTML files of all modules are rendered by one pool of worker processes, the modules with the most metrics
+# first. Each module gets its report in a subdirectory of REPORTDIR, REPORTDIR/index.html lists the modules along with
+# their totals and those of all modules.
+##
+
+import os
+import io
+import cgi
+import getopt
+import sys
+import time
+import traceback
+import imp
+import highlighter
+import collections
+import csv
+import json
+import multiprocessing
+import canalyse
+import mppdb
+import metricstats
+import metricstore
+import metricdiff
+import qualitygate
+import reportserver
+import watcher
+
+## mpp-view2js.py can't be imported by name because of the hyphen
+mppview2js = imp.load_source("mppview2js", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mpp-view2js.py"))
+
+## database file written by 'metrix++ collect'
+METRIXDB = "metrixpp.db"
+## csv output of 'metrix++ export' (possibly tagged by tag-files.py) to read instead of METRIXDB
+EXPORT = None
+## name of the column of EXPORT holding the tags of the files; a sub-report is generated per tag
+TAG_NAME = canalyse.TAG_NAME
+## path from where to start analysis of sourceceode
+SRCPATH = canalyse.SRCPATH
+## sourcecode is assumed to belong to a module (or application); adds as suffix to SRCPATH
+MODULE_BASE = canalyse.MODULE_BASE
+## directory to store intermediate files generated from data collected by metrix++
+DATADIR = canalyse.DATADIR_REL
+## directory to store generated html files to
+REPORTDIR = canalyse.REPORTDIR_REL
+## html styling and diagram styling settings get here
+STYLEDIR = canalyse.STYLE_REL
+## directory containing filelist.js
+JSCRIPTDIR = "./javascript"
+## path where highlight.js is installed to
+INSTALLDIR = canalyse.HIGHLIGHT_REL
+## stylesheet to use by highlight.js for sourcecode highlighting
+HIGHLIGHT_CSS = canalyse.HIGHLIGHT_CSS
+## highlight C/C++ sourcecode at build time instead of by highlight.js in the browser
+PREHIGHLIGHT = canalyse.PREHIGHLIGHT
+## name of javascript file (in STYLEDIR) defining the diagrams colors and datasource
+DIAGRAM_STYLE = "diagram_style.js"
+## criterias to show in the navigation of index.html, the first one is shown initially
+CRITERIA_LIST = ["std.code.complexity.cyclomatic", "std.code.lines.code", "std.code.filelines.comments"]
+CHARTMINJS = mppview2js.CHARTMINJS
+DIAG_WIDTH = mppview2js.DIAG_WIDTH
+DIAG_HEIGHT = mppview2js.DIAG_HEIGHT
+## division of the criteria values into the bars of the diagrams and percentiles shown (cf. mpp-view2js.py)
+BINNING = mppview2js.BINNING
+BINS = mppview2js.BINS
+PERCENTILES = mppview2js.PERCENTILES
+## number of regions and files listed per criteria on the page of hotspots
+HOTSPOTS = canalyse.HOTSPOTS
+## SQLite database to append the metrics of each run to, no history is kept if None (cf. history.py)
+HISTORY = canalyse.HISTORY
+## name of the run within HISTORY, defaults to the time the build started
+RUN_NAME = canalyse.RUN_NAME
+## number of most recent runs within the trend data files
+TREND_RUNS = canalyse.TREND_RUNS
+## number of worker processes generating the HTML files
+JOBS = canalyse.JOBS
+## regenerate all files regardless of the manifest of the previous run
+FORCE = False
+## address and port the server of command 'serve' listens on
+BIND = "127.0.0.1"
+PORT = 8000
+## maximum size of the pages cached by the server of command 'serve', in MB (of compressed content)
+CACHE_SIZE = 64
+## keep updating the report on changes of the sourcefiles after command 'build'
+WATCH = False
+## metrix++ script collecting the metrics of changed sourcefiles in watch mode
+METRIXPP = "/opt/metrixplusplus/metrix++.py"
+## seconds between two polls of the sourcefiles in watch mode
+POLL_INTERVAL = 0.3
+## seconds the sourcefiles have to stay unchanged before the report is updated in watch mode
+DEBOUNCE = 0.2
+## database or csv export (by extension '.csv') of the run command 'diff' compares to
+BASELINE = None
+## directory of the module as named in the rows of BASELINE, defaults to SRCPATH/MODULE_BASE
+BASELINE_ROOT = None
+## file of the limits and waivers command 'check' checks against (cf. qualitygate.py)
+THRESHOLDS = None
+## stop checking at the first file violating a limit
+FAIL_FAST = False
+## file to list the violations found by command 'check' in, stdout if None
+OUTPUT = None
+## format of OUTPUT: 'csv' or 'json' (one object per line)
+OUTPUT_FORMAT = "csv"
+OUTPUT_FORMATS = ("csv", "json")
+## exit status of command 'check' if there are violations, respectively if the check failed
+CHECK_VIOLATED = 1
+CHECK_FAILED = 2
+## exit status of errors logged by log(), if not the level of the message
+ERROR_STATUS = None
+## file listing the modules of command 'batch', one line 'SRCPATH MODULE_BASE METRICS' per module (cf. readModules())
+MODULES = None
+
+loglevels = {"silent" : 0, "standard" : 1, "verbose" : 2}
+LOGLEVEL = 1
+## stream log and verbose messages of all modules are printed to; stderr for command 'check', whose output may take
+#  stdout
+LOGSTREAM = sys.stdout
+
+##
+# Print version information and exit
+##
+def printVersion():
+    print "sourcemetrix.py 0.1 "
+    print "Copyright (c) 2020 Marc Stoerzel"
+
+##
+# Print info how to use from command line.
+##
+def printUsage():
+    print "usage:", sys.argv[0], "COMMAND [OPTION]"
+    print "Generates a report from the database of metrix++."
+    print "Commands:"
+    print "  build                      generate sourcecode HTML files, data files, diagrams and index.html"
+    print "  serve                      serve the report from a local HTTP server, rendering pages on request"
+    print "  diff                       compare the metrics to those of BASELINE region by region"
+    print "  check                      check the metrics against the limits of THRESHOLDS; exits with " \
+        + str(CHECK_VIOLATED) + " on violations,"
+    print "                                 with " + str(CHECK_FAILED) + " if the check failed (e.g. the metrics can't be read)"
+    print "  batch                      generate the reports of all modules of MODULES and an index of the modules"
+    print "Options and arguments:"
+    print "  -h, --help                 print this help message and exit"
+    print "  --silent                   turn on silent mode: no output except in case of error"
+    print "  --verbose                  enable more elaborative output"
+    print "  -v, --version              print version information and exit"
+    print "  -b, --metrixdb=FILE        database file written by 'metrix++ collect'"
+    print "                                 defaults to:", METRIXDB
+    print "  -e, --export=FILE          read the csv output of 'metrix++ export' instead of the database; if tagged by"
+    print "                                 tag-files.py, a sub-report is generated per tag in the same pass"
+    print "  --tagname=TAGNAME          name of the column holding the tags"
+    print "                                 defaults to:", TAG_NAME
+    print "  -s, --srcpath=DIR          directory containing the sourcecode root folder"
+    print "                                 defaults to:", SRCPATH
+    print "  -m, --modulebase=DIR       shall be name of the sourcecode's root folder"
+    print "                                 defaults to:", MODULE_BASE
+    print "  -d, --datadir=DIR          directory to store generated data files to"
+    print "                                 defaults to:", DATADIR
+    print "  -r, --reportdir=DIR        the output directory of the generated html files"
+    print "                                 defaults to:", REPORTDIR
+    print "  -y, --styledir=DIR         directory containing the generic style.css file"
+    print "                                 defaults to:", STYLEDIR
+    print "  -x, --jscriptdir=DIR       directory containing filelist.js"
+    print "                                 defaults to:", JSCRIPTDIR
+    print "  -i, --installdir=DIR       location where 'highlight' package is installed"
+    print "                                 defaults to:", INSTALLDIR
+    print "  -c, --highlight-css=FILE   filename of CSS file to be used for syntax highlighting"
+    print "                                 defaults to:", HIGHLIGHT_CSS
+    print "  --prehighlight             highlight C/C++ sourcecode while generating the HTML files instead of in the browser"
+    print "  -a, --criterias=LIST       comma separated list of criterias to show in index.html"
+    print "                                 defaults to:", ",".join(CRITERIA_LIST)
+    print "  --chart-js=URL             URL from where to include chart.min.js"
+    print "                                 defaults to:", CHARTMINJS
+    print "  -w, --diagram-width=x      width of chart.js diagram canvas"
+    print "                                 defaults to:", DIAG_WIDTH
+    print "  -t, --diagram-height=y     height of chart.js diagram canvas"
+    print "                                 defaults to:", DIAG_HEIGHT
+    print "  --binning=MODE             division of values into diagram bars: " + ", ".join(metricstats.BINNINGS)
+    print "                                 defaults to:", BINNING
+    print "  --bins=N                   maximum number of bars per diagram"
+    print "                                 defaults to:", BINS
+    print "  --percentiles=LIST         comma separated list of percentiles to show"
+    print "                                 defaults to:", ",".join(str(p) for p in PERCENTILES)
+    print "  --hotspots=N               number of regions and files listed per criteria on the page of hotspots"
+    print "                                 defaults to:", HOTSPOTS
+    print "  --history=FILE             append the metrics of this run to the SQLite database FILE and write trend data files"
+    print "  --run=NAME                 name of this run within the history, e.g. the commit analysed"
+    print "                                 defaults to the time of the run"
+    print "  --trend-runs=N             number of most recent runs within the trend data files"
+    print "                                 defaults to:", TREND_RUNS
+    print "  -j, --jobs=N               number of processes generating HTML files in parallel"
+    print "                                 defaults to the number of cores:", JOBS
+    print "  -f, --force                regenerate all files, even if sourcefile and metrics are unchanged"
+    print "  --bind=ADDRESS             address the server of command 'serve' listens on"
+    print "                                 defaults to:", BIND
+    print "  --port=N                   port the server of command 'serve' listens on"
+    print "                                 defaults to:", PORT
+    print "  --cache-size=MB            maximum size of the pages cached by the server of command 'serve'"
+    print "                                 defaults to:", CACHE_SIZE
+    print "  --watch                    after command 'build', update the report whenever sourcefiles change"
+    print "  --metrixpp=FILE            metrix++ script to collect the metrics of changed sourcefiles with"
+    print "                                 defaults to:", METRIXPP
+    print "  --interval=SECONDS         time between two polls of the sourcefiles in watch mode"
+    print "                                 defaults to:", POLL_INTERVAL
+    print "  --debounce=SECONDS         time the sourcefiles have to stay unchanged before the report is updated"
+    print "                                 defaults to:", DEBOUNCE
+    print "  --baseline=FILE            database or csv export (by extension '.csv') to compare to by command 'diff'"
+    print "  --baseline-root=DIR        directory of the module as named within the baseline, e.g. ./src/release-1.0"
+    print "                                 defaults to: SRCPATH/MODULE_BASE"
+    print "  --thresholds=FILE          limits and waivers command 'check' checks against, cf. script/qualitygate.py"
+    print "  --fail-fast                stop checking at the first file violating a limit"
+    print "  -o, --output=FILE          file to list the violations in"
+    print "                                 defaults to stdout"
+    print "  --format=FORMAT            format of the violations: " + ", ".join(OUTPUT_FORMATS)
+    print "                                 defaults to:", OUTPUT_FORMAT
+    print "  --modules=FILE             modules of command 'batch', one line 'SRCPATH MODULE_BASE METRICS' per module;"
+    print "                                 METRICS is the database or csv export (by extension '.csv') of the module"
+
+##
+# Print global paramter settings.
+##
+def dumpParameters():
+    print >> LOGSTREAM, "Parameters set as"
+    print >> LOGSTREAM, "  --metrixdb       =", METRIXDB
+    print >> LOGSTREAM, "  --export         =", EXPORT
+    print >> LOGSTREAM, "  --tagname        =", TAG_NAME
+    print >> LOGSTREAM, "  --srcpath        =", SRCPATH
+    print >> LOGSTREAM, "  --modulebase     =", MODULE_BASE
+    print >> LOGSTREAM, "  --datadir        =", DATADIR
+    print >> LOGSTREAM, "  --reportdir      =", REPORTDIR
+    print >> LOGSTREAM, "  --styledir       =", STYLEDIR
+    print >> LOGSTREAM, "  --jscriptdir     =", JSCRIPTDIR
+    print >> LOGSTREAM, "  --installdir     =", INSTALLDIR
+    print >> LOGSTREAM, "  --highlight-css  =", HIGHLIGHT_CSS
+    print >> LOGSTREAM, "  --prehighlight   =", PREHIGHLIGHT
+    print >> LOGSTREAM, "  --criterias      =", ",".join(CRITERIA_LIST)
+    print >> LOGSTREAM, "  --chart-js       =", CHARTMINJS
+    print >> LOGSTREAM, "  --diagram-width  =", DIAG_WIDTH
+    print >> LOGSTREAM, "  --diagram-height =", DIAG_HEIGHT
+    print >> LOGSTREAM, "  --binning        =", BINNING
+    print >> LOGSTREAM, "  --bins           =", BINS
+    print >> LOGSTREAM, "  --percentiles    =", ",".join(str(p) for p in PERCENTILES)
+    print >> LOGSTREAM, "  --hotspots       =", HOTSPOTS
+    print >> LOGSTREAM, "  --history        =", HISTORY
+    print >> LOGSTREAM, "  --run            =", RUN_NAME
+    print >> LOGSTREAM, "  --trend-runs     =", TREND_RUNS
+    print >> LOGSTREAM, "  --jobs           =", JOBS
+    print >> LOGSTREAM, "  --force          =", FORCE
+    print >> LOGSTREAM, "  --bind           =", BIND
+    print >> LOGSTREAM, "  --port           =", PORT
+    print >> LOGSTREAM, "  --cache-size     =", CACHE_SIZE
+    print >> LOGSTREAM, "  --watch          =", WATCH
+    print >> LOGSTREAM, "  --metrixpp       =", METRIXPP
+    print >> LOGSTREAM, "  --interval       =", POLL_INTERVAL
+    print >> LOGSTREAM, "  --debounce       =", DEBOUNCE
+    print >> LOGSTREAM, "  --baseline       =", BASELINE
+    print >> LOGSTREAM, "  --baseline-root  =", BASELINE_ROOT
+    print >> LOGSTREAM, "  --thresholds     =", THRESHOLDS
+    print >> LOGSTREAM, "  --fail-fast      =", FAIL_FAST
+    print >> LOGSTREAM, "  --output         =", OUTPUT
+    print >> LOGSTREAM, "  --format         =", OUTPUT_FORMAT
+    print >> LOGSTREAM, "  --modules        =", MODULES
+
+##
+# Print a log message to LOGSTREAM if loglevel is set appropriate.
+#
+# @param level      verbosity level of this message. If level < LOG_LEVEL the message will be printed to LOGSTREAM.
+# @param message    string to be printed
+##
+def log(level, message):
+    if LOGLEVEL >= level:
+        print >> LOGSTREAM, message
+    if (level) < 0:
+        sys.exit(ERROR_STATUS or -level)
+
+##
+# Scan commandline arguments.
+#
+# Scan command line arguments and set global parameters accordingly (use '--help' on commandline to get list of
+# supported command line arguments).
+#
+# @return the command to run
+##
+def scanArguments():
+    global LOGLEVEL, METRIXDB, EXPORT, TAG_NAME, SRCPATH, MODULE_BASE, DATADIR, REPORTDIR, STYLEDIR, JSCRIPTDIR, INSTALLDIR, HIGHLIGHT_CSS, \
+        PREHIGHLIGHT, CRITERIA_LIST, CHARTMINJS, DIAG_WIDTH, DIAG_HEIGHT, BINNING, BINS, PERCENTILES, HOTSPOTS, JOBS, FORCE, \
+        BIND, PORT, CACHE_SIZE, WATCH, METRIXPP, POLL_INTERVAL, DEBOUNCE, \
+        BASELINE, BASELINE_ROOT, HISTORY, RUN_NAME, TREND_RUNS, \
+        THRESHOLDS, FAIL_FAST, OUTPUT, OUTPUT_FORMAT, MODULES, ERROR_STATUS, LOGSTREAM
+    shortOptions = "hvfb:e:s:m:d:r:y:x:i:c:a:w:t:j:o:"
+    longOptions = ["help", "version", "verbose", "silent", "metrixdb=", "export=", "tagname=", "srcpath=", "modulebase=", "datadir=", \
+        "reportdir=", "styledir=", "jscriptdir=", "installdir=", "highlight-css=", "prehighlight", "criterias=", "chart-js=", \
+        "diagram-width=", "diagram-height=", "binning=", "bins=", "percentiles=", "hotspots=", "jobs=", "force", "bind=", "port=", "cache-size=", \
+        "watch", "metrixpp=", "interval=", "debounce=", \
+        "baseline=", "baseline-root=", "history=", "run=", "trend-runs=", \
+        "thresholds=", "fail-fast", "output=", "format=", "modules="]
+    opts = []
+    remainder = []
+
+    try:
+        opts, remainder = getopt.gnu_getopt(sys.argv[1:], shortOptions, longOptions)
+    except getopt.GetoptError as err:
+        # print help information and exit; the status tells a usage error, also from violations of command 'check'
+        print str(err)
+        printUsage()
+        sys.exit(CHECK_FAILED)
+    # stdout is taken by the output of command 'check', errors of its arguments are failures of the check (cf. check())
+    if remainder == ["check"]:
+        LOGSTREAM = sys.stderr
+        ERROR_STATUS = CHECK_FAILED
+
+    for o, a, in opts:
+        if o in("--help", "-h"):
+            printUsage()
+            sys.exit()
+        elif o in ("--version", "-v"):
+            printVersion()
+            sys.exit()
+        elif o == "--verbose":
+            LOGLEVEL = loglevels["verbose"]
+        elif o == "--silent":
+            LOGLEVEL = loglevels["silent"]
+        elif o == "-b" or o == "--metrixdb":
+            METRIXDB = a
+        elif o == "-e" or o == "--export":
+            EXPORT = a
+        elif o == "--tagname":
+            TAG_NAME = a
+        elif o == "-s" or o == "--srcpath":
+            SRCPATH = a
+        elif o == "-m" or o == "--modulebase":
+            MODULE_BASE = a
+        elif o == "-d" or o == "--datadir":
+            DATADIR = a
+        elif o == "-r" or o == "--reportdir":
+            REPORTDIR = a
+        elif o == "-y" or o == "--styledir":
+            STYLEDIR = a
+        elif o == "-x" or o == "--jscriptdir":
+            JSCRIPTDIR = a
+        elif o == "-i" or o == "--installdir":
+            INSTALLDIR = a
+        elif o == "-c" or o == "--highlight-css":
+            HIGHLIGHT_CSS = a
+        elif o == "--prehighlight":
+            PREHIGHLIGHT = True
+        elif o == "-a" or o == "--criterias":
+            CRITERIA_LIST = [criteria for criteria in a.replace(",", " ").split() if criteria]
+        elif o == "--chart-js":
+            CHARTMINJS = a
+        elif o == "-w" or o == "--diagram-width":
+            try:
+                DIAG_WIDTH = int(a)
+            except:
+                log(-1, "Error parsing argument for --diagram-width=" + str(a))
+        elif o == "-t" or o == "--diagram-height":
+            try:
+                DIAG_HEIGHT = int(a)
+            except:
+                log(-1, "Error parsing argument for --diagram-height=" + str(a))
+        elif o == "--binning":
+            if a not in metricstats.BINNINGS:
+                log(-1, "Unknown binning '" + str(a) + "', use one of: " + ", ".join(metricstats.BINNINGS))
+            BINNING = a
+        elif o == "--bins":
+            try:
+                BINS = int(a)
+            except:
+                log(-1, "Error parsing argument for --bins=" + str(a))
+            if BINS < 1:
+                log(-1, "Number of bins must be at least 1: " + str(a))
+        elif o == "--percentiles":
+            try:
+                PERCENTILES = [float(p) if "." in p else int(p) for p in a.split(",") if p.strip()]
+            except:
+                log(-1, "Error parsing argument for --percentiles=" + str(a))
+        elif o == "--hotspots":
+            try:
+                HOTSPOTS = int(a)
+            except:
+                log(-1, "Error parsing argument for --hotspots=" + str(a))
+        elif o == "--thresholds":
+            THRESHOLDS = a
+        elif o == "--fail-fast":
+            FAIL_FAST = True
+        elif o == "-o" or o == "--output":
+            OUTPUT = a
+        elif o == "--format":
+            if a not in OUTPUT_FORMATS:
+                log(-1, "Unknown format '" + str(a) + "', use one of: " + ", ".join(OUTPUT_FORMATS))
+            OUTPUT_FORMAT = a
+        elif o == "--history":
+            HISTORY = a
+        elif o == "--run":
+            RUN_NAME = a
+        elif o == "--trend-runs":
+            try:
+                TREND_RUNS = int(a)
+            except:
+                log(-1, "Error parsing argument for --trend-runs=" + str(a))
+        elif o == "-j" or o == "--jobs":
+            try:
+                JOBS = int(a)
+            except:
+                log(-1, "Error parsing argument for --jobs=" + str(a))
+            if JOBS < 1:
+                log(-1, "Number of jobs must be at least 1: " + str(a))
+        elif o == "-f" or o == "--force":
+            FORCE = True
+        elif o == "--bind":
+            BIND = a
+        elif o == "--port":
+            try:
+                PORT = int(a)
+            except:
+                log(-1, "Error parsing argument for --port=" + str(a))
+        elif o == "--cache-size":
+            try:
+                CACHE_SIZE = int(a)
+            except:
+                log(-1, "Error parsing argument for --cache-size=" + str(a))
+        elif o == "--watch":
+            WATCH = True
+        elif o == "--metrixpp":
+            METRIXPP = a
+        elif o == "--interval":
+            try:
+                POLL_INTERVAL = float(a)
+            except:
+                log(-1, "Error parsing argument for --interval=" + str(a))
+        elif o == "--debounce":
+            try:
+                DEBOUNCE = float(a)
+            except:
+                log(-1, "Error parsing argument for --debounce=" + str(a))
+        elif o == "--baseline":
+            BASELINE = a
+        elif o == "--baseline-root":
+            BASELINE_ROOT = a
+        elif o == "--modules":
+            MODULES = a
+
+    if len(remainder) != 1 or remainder[0] not in COMMANDS:
+        printUsage()
+        log(-1, "Expected exactly one command out of: " + ", ".join(sorted(COMMANDS.keys())))
+    if WATCH and EXPORT is not None:
+        log(-1, "Option --watch requires the database of metrix++, it can't be combined with --export")
+    return remainder[0]
+
+##
+# Pass the settings on to the modules of the stages.
+##
+def configure():
+    canalyse.LOGLEVEL = LOGLEVEL
+    canalyse.LOGSTREAM = LOGSTREAM
+    canalyse.METRIXDB = METRIXDB
+    canalyse.TAG_NAME = TAG_NAME
+    canalyse.SRCPATH = SRCPATH
+    canalyse.MODULE_BASE = MODULE_BASE
+    canalyse.DATADIR_REL = DATADIR
+    canalyse.REPORTDIR_REL = REPORTDIR
+    canalyse.STYLE_REL = STYLEDIR
+    canalyse.JSCRIPT_REL = JSCRIPTDIR
+    canalyse.HIGHLIGHT_REL = INSTALLDIR
+    canalyse.HIGHLIGHT_CSS = HIGHLIGHT_CSS
+    canalyse.PREHIGHLIGHT = PREHIGHLIGHT
+    canalyse.HOTSPOTS = HOTSPOTS
+    canalyse.HISTORY = HISTORY
+    # the updates of watch mode refer to the run of the build rather than recording a run each
+    canalyse.RUN_NAME = RUN_NAME or canalyse.defaultRunName()
+    canalyse.TREND_RUNS = TREND_RUNS
+    canalyse.JOBS = JOBS
+    canalyse.FORCE = FORCE
+    mppview2js.LOGLEVEL = LOGLEVEL
+    mppview2js.LOGSTREAM = LOGSTREAM
+    mppview2js.METRIXDB = METRIXDB
+    mppview2js.TAG_NAME = TAG_NAME
+    mppview2js.MODULE_BASE = MODULE_BASE
+    mppview2js.DATADIR = DATADIR
+    mppview2js.REPORTDIR_REL = REPORTDIR
+    mppview2js.STYLEDIR = STYLEDIR
+    mppview2js.CHARTMINJS = CHARTMINJS
+    mppview2js.DIAG_WIDTH = DIAG_WIDTH
+    mppview2js.DIAG_HEIGHT = DIAG_HEIGHT
+    mppview2js.BINNING = BINNING
+    mppview2js.BINS = BINS
+    mppview2js.PERCENTILES = PERCENTILES
+
+##
+# Return the link of the navigation of index.html to the overview page \c name of the (sub-)report \c modulebase.
+##
+def navigationLink(modulebase, name):
+    return " <a target= 'criteria_frame' href='" + modulebase + "." + name + ".html'>" + name + "</a>"
+
+##
+# Render index.html, the starting point of the report.
+#
+# Paths to the other directories are relative to REPORTDIR, such that the report can be moved as a whole. Sub-reports
+# per tag have an index page of their own in REPORTDIR; they share the HTML files of the sourcecode with the report.
+# The diff view (cf. diff()) is linked once its data file exists.
+#
+# @param modulebase basename of the data files and criteria pages of the (sub-)report, defaults to MODULE_BASE
+# @param title      heading of the page, defaults to \c modulebase
+# @param links      list of tuples (caption, page) of further index pages to link to
+# @return content of the index page as unicode string
+##
+def renderIndexHTML(modulebase=None, title=None, links=[]):
+    modulebase = modulebase or MODULE_BASE
+    title = title or modulebase
+    styledir_rel = os.path.relpath(STYLEDIR, REPORTDIR)
+    datadir_rel = os.path.relpath(DATADIR, REPORTDIR)
+    jscriptdir_rel = os.path.relpath(JSCRIPTDIR, REPORTDIR)
+    criteria_nav = " ".join("<a target= 'criteria_frame' href='" + modulebase + "." + criteria + ".html' " + \
+        "onClick='switchCriteria(\"" + criteria + "\")'>" + criteria + "</a>" for criteria in CRITERIA_LIST)
+    criteria_nav += "".join(navigationLink(modulebase, name) for name in ("directories", "hotspots", "search"))
+    if modulebase == MODULE_BASE and os.path.isfile(os.path.join(DATADIR, MODULE_BASE + ".diff.js")):
+        criteria_nav += navigationLink(modulebase, "diff")
+    if HISTORY is not None and modulebase == MODULE_BASE:
+        criteria_nav += navigationLink(modulebase, "trends")
+    criteria_nav += "".join(" <a target='_top' href='" + page + "'>" + caption + "</a>" for caption, page in links)
+    first_criteria = CRITERIA_LIST[0] if CRITERIA_LIST else ""
+    parts = []
+    parts.append("<!DOCTYPE html>\n")
+    parts.append("  <html>\n\t<head>\n\t  <title>" + title + "</title>\n")
+    parts.append("\t  <script src=\"" + CHARTMINJS + "\"></script>\n")
+    parts.append("\t  <link rel='stylesheet' type='text/css' href='" + styledir_rel + "/style.css'>\n")
+    parts.append("\t</head>\n  <body class='main'>\n")
+    parts.append("\t  <script src='" + styledir_rel + "/" + DIAGRAM_STYLE + "'></script>\n")
+    parts.append("\t  <script>\n")
+    parts.append("      function switchCriteria(criteria) {\n")
+    parts.append("\t\t  clearFilelist_body(); createFilelist(criteria);\n")
+    parts.append("\t\t  populateFilelist_body(DiagramStyles.get(criteria).backgroundColor, " + \
+        "DiagramStyles.get(criteria).criteriaLabel);\n")
+    parts.append("    }</script>\n")
+    parts.append("\t  <navigation>\n")
+    parts.append("\t  <h1>" + title + "</h1>\n")
+    parts.append("      <span id='nav_linklist'>\n")
+    parts.append("      <b>Source Metrix Analyser</b> \n")
+    parts.append(criteria_nav + "\n")
+    parts.append("      powered by <a href='https://metrixplusplus.github.io/home.html'>Metrix++</a></span>\n")
+    parts.append("    </navigation>\n")
+    parts.append("\t  <iframe id='wrapper' height='100%' width='100%' src='" + modulebase + "." + first_criteria + \
+        ".html' name='criteria_frame'></iframe>\n")
+    parts.append("    <script src='" + datadir_rel + "/" + modulebase + ".js'></script>\n")
+    parts.append("    <script src='" + jscriptdir_rel + "/columns.js'></script>\n")
+    parts.append("    <script src='" + jscriptdir_rel + "/filelist.js'></script>\n")
+    parts.append("    <script>\n")
+    parts.append("\t\tdocument.addEventListener('DOMContentLoaded', function () {\n")
+    parts.append("\t\t    const values = Array.from(DiagramStyles.values());\n")
+    parts.append("\t\t    createFilelist(values[0].criteria);\n")
+    parts.append("\t\t    populateFilelist_body(values[0].backgroundColor, values[0].criteriaLabel);\n")
+    parts.append("\t\t    document.getElementById('sortAlphabetic').addEventListener('click', showAlphabetic);\n")
+    parts.append("\t\t    document.getElementById('sortNumeric').addEventListener('click', showNumeric);\n")
+    parts.append("\t\t});\n    </script>\n")
+    parts.append("<span id='filelist_wrapper'>\n  <div id='filelist_header'>list of files " + \
+        "<button type='button' id='sortAlphabetic'>sort by name &#x25BE;</button> " + \
+        "<button type='button' id='sortNumeric'>sort by metric &#x25BE;</button></div>\n")
+    parts.append("  <span id='filelist_body'></span>\n</span>\n")
+    parts.append("  <iframe id='details_wrapper' height='100%' width='100%' src='details.html' " + \
+        "name='details_frame'></iframe>\n")
+    parts.append("\t</body>\n</html>\n")
+    return u"".join(parts)
+
+##
+# Write \c content to \c filename unless the file already has exactly this content.
+#
+# @return True if the file was written
+##
+def writeIfChanged(filename, content):
+    try:
+        with io.open(filename, "r", encoding="utf-8") as existing:
+            if existing.read() == content:
+                return False
+    except IOError:
+        pass
+    with io.open(filename, "w", encoding="utf-8") as out:
+        out.write(content)
+    return True
+
+##
+# Measures the time spent per stage.
+##
+class StageTimer(object):
+    def __init__(self):
+        self.timings = collections.OrderedDict()
+        self.start = time.time()
+
+    ##
+    # Add the time passed since the last call (or since creation) to \c stage.
+    ##
+    def lap(self, stage):
+        now = time.time()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self.start
+        self.start = now
+
+    ##
+    # Print the time spent per stage and in total.
+    ##
+    def summary(self):
+        log(1, "Time spent per stage:")
+        for stage, seconds in self.timings.items():
+            log(1, "  %-20s %8.2f s" % (stage, seconds))
+        log(1, "  %-20s %8.2f s" % ("total", sum(self.timings.values())))
+
+##
+# Open the metrics of \c export if given, of \c database otherwise; without both, of EXPORT if given, of METRIXDB
+# otherwise.
+#
+# @return tuple (file or database to close, list of criteria mnemonics, iterable of rows, index of the column holding
+#         the tags or None)
+##
+def openMetrics(database=None, export=None):
+    if database is None and export is None:
+        database, export = METRIXDB, EXPORT
+    if export is not None:
+        log(1, "Opening export file " + export)
+        try:
+            source = open(export)
+        except IOError as err:
+            log(-1, "Can't read export file " + export + ": " + str(err))
+        rows = csv.reader(source, delimiter=',')
+        criterias, tag_index = canalyse.readCSVheader(rows)
+        return (source, criterias, rows, tag_index)
+    log(1, "Opening database file " + database)
+    try:
+        source = mppdb.MetrixDB(database)
+    except (IOError, mppdb.sqlite3.Error) as err:
+        log(-1, "Can't read database file " + database + ": " + str(err))
+    # the database holds no tags
+    return (source, source.criterias(), source.iterateRows(), None)
+
+##
+# Generate the report from \c rows: sourcecode HTML files, data files, diagrams and index pages. Files up to date
+# according to the manifest of the previous run are not written again.
+#
+# @param criterias  list of criteria mnemonics in order of the columns of \c rows
+# @param rows       iterable of rows as read from the database or export
+# @param tag_index  index of the column holding the tags or None
+# @param timer      StageTimer to add the time spent per stage to
+# @param links      list of tuples (caption, page) of further pages index.html links to
+# @return summaries of the criteria values (cf. metricstats.MetricStatistics.summaries())
+##
+def generate(criterias, rows, tag_index, timer, links=[], pending=None):
+    # the statistics of the diagrams are collected while canalyse.py reads the files
+    stats = metricstats.MetricStatistics(criterias)
+    # canalyse.py adds up the time of its interleaved stages
+    tagged = canalyse.buildReport(criterias, rows, timer.timings, stats, tag_index, pending)
+    timer.start = time.time()
+    log(1, "Generating HTML files for " + ", ".join(mppview2js.CRITERIA_LABELS.keys()))
+    summaries = stats.summaries(BINNING, BINS, PERCENTILES)
+    mppview2js.writeCriteriaFiles(summaries)
+    tags = tagged.tags() if tagged is not None else []
+    for tag in tags:
+        log(1, "Generating HTML files for tag '" + tag + "'")
+        mppview2js.MODULE_BASE = canalyse.TaggedReports.basename(tag)
+        try:
+            mppview2js.writeCriteriaFiles(tagged.statistics(tag).summaries(BINNING, BINS, PERCENTILES))
+        finally:
+            mppview2js.MODULE_BASE = MODULE_BASE
+    timer.lap("criteria diagrams")
+    # the index of the report links to the index of each sub-report and vice versa
+    pages = [("index.html", renderIndexHTML(links=[(tag, canalyse.TaggedReports.basename(tag) + ".html") \
+        for tag in tags] + links))]
+    pages.extend((canalyse.TaggedReports.basename(tag) + ".html", renderIndexHTML(canalyse.TaggedReports.basename(tag), \
+        MODULE_BASE + " [" + tag + "]", [("all files", "index.html")])) for tag in tags)
+    for page, content in pages:
+        if writeIfChanged(os.path.join(REPORTDIR, page), content):
+            log(1, "Generated " + os.path.join(REPORTDIR, page))
+    timer.lap("index")
+    return summaries
+
+##
+# Command 'build': generate the complete report from the database of metrix++ or, if EXPORT is given, from its export.
+#
+# If the export holds a column TAG_NAME (cf. tag-files.py), a sub-report is generated per tag in the same pass. With
+# WATCH set, the rows read are kept in memory and the report is updated on changes of the sourcefiles (cf. watch()).
+##
+def build():
+    timer = StageTimer()
+    for directory in (REPORTDIR, DATADIR):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    source, criterias, rows, tag_index = openMetrics()
+    dataset = watcher.MetricsDataset() if WATCH else None
+    try:
+        timer.lap("open database")
+        generate(criterias, dataset.record(rows) if dataset is not None else rows, tag_index, timer)
+    finally:
+        source.close()
+    timer.summary()
+    if dataset is not None:
+        watch(criterias, dataset)
+
+##
+# Poll the sourcefiles below SRCPATH/MODULE_BASE and update the report on changes until interrupted.
+#
+# Changes are detected by modification time and size. Once the files stayed unchanged for DEBOUNCE seconds, the
+# metrics of the changed files are collected by METRIXPP and replace their rows within \c dataset, rows of removed
+# files are dropped. The report is then regenerated from \c dataset: as the manifest tells which pages are up to date
+# and data files are compared to their previous content, only the pages of the changed files and the data files and
+# diagrams whose content changed are written. The database of metrix++ itself is not updated.
+#
+# @param criterias  list of criteria mnemonics of the database
+# @param dataset    watcher.MetricsDataset holding the rows the report was generated from
+##
+def watch(criterias, dataset):
+    directory = os.path.join(SRCPATH, MODULE_BASE)
+    # sourcefiles are new ones if they are of a kind already in the report
+    extensions = frozenset(os.path.splitext(key)[1].lower() for key in dataset.files) \
+        | frozenset(highlighter.CPP_EXTENSIONS)
+    previous = watcher.snapshot(directory, extensions)
+    log(1, "Watching " + directory + " for changes (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(POLL_INTERVAL)
+            current = watcher.snapshot(directory, extensions)
+            if current == previous:
+                continue
+            # a save or checkout may write several files in a row, wait for them to settle
+            while True:
+                time.sleep(DEBOUNCE)
+                settled = watcher.snapshot(directory, extensions)
+                if settled == current:
+                    break
+                current = settled
+            changed, removed = watcher.changes(previous, current)
+            previous = current
+            timer = StageTimer()
+            if changed:
+                log(1, "Collecting metrics of " + ", ".join(current[key][0] for key in changed))
+                try:
+                    dataset.update(watcher.collectMetrics(METRIXPP, criterias, \
+                        [dataset.paths.get(key, current[key][0]) for key in changed], DATADIR))
+                except (RuntimeError, OSError) as err:
+                    log(1, str(err))
+                    continue
+            for key in removed:
+                log(1, "Removed " + key)
+                dataset.remove(key)
+            timer.lap("collect metrics")
+            # starting worker processes costs more than rendering the pages of a few files
+            canalyse.JOBS = JOBS if len(changed) > 4 * JOBS else 1
+            generate(criterias, dataset.rows(), None, timer)
+            timer.summary()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        canalyse.JOBS = JOBS
+
+##
+# Command 'serve': serve the report from a local HTTP server until interrupted.
+#
+# The metrics are read once into memory, along with the statistics of the diagrams and the detailed data files, which
+# are small compared to the sourcecode HTML files. All pages, above all the sourcecode HTML files, are rendered on
+# request only (cf. reportserver.ReportServer). Files in STYLEDIR, JSCRIPTDIR and INSTALLDIR are served as they are.
+##
+def serve():
+    source, criterias, rows, tag_index = openMetrics()
+    try:
+        stats = metricstats.MetricStatistics(criterias)
+        store = metricstore.MetricStore(criterias)
+        datafiles = canalyse.DatafileRenderer(DATADIR, MODULE_BASE, SRCPATH, criterias, HOTSPOTS)
+        for f in canalyse.readCSVfile(rows, MODULE_BASE, store, stats, tag_index):
+            datafiles.append(store, f)
+        datafiles.close(REPORTDIR)
+    finally:
+        source.close()
+    log(1, str(store.fileCount()) + " files read")
+    # URLs are the paths relative to a directory holding all parts of the report, so relative links keep working
+    root = reportserver.commonRoot([REPORTDIR, DATADIR, STYLEDIR, JSCRIPTDIR, INSTALLDIR])
+    def relative(path):
+        return os.path.normpath(os.path.relpath(path, root))
+    pages = {relative(os.path.join(REPORTDIR, "index.html")): renderIndexHTML}
+    for filename, content in datafiles.contents.items():
+        pages[relative(os.path.join(DATADIR, filename))] = lambda content=content: content
+    for page in canalyse.OVERVIEW_PAGES:
+        filename, content = canalyse.renderOverviewHTMLfile(*page)
+        pages[relative(filename)] = lambda content=content: content
+    # diagrams of the criterias: path -> (criteria, True for the HTML file, False for the data file)
+    charts = {}
+    for criteria in mppview2js.CRITERIA_LABELS.keys():
+        charts[relative(os.path.join(REPORTDIR, MODULE_BASE + "." + criteria + ".html"))] = (criteria, True)
+        charts[relative(os.path.join(DATADIR, MODULE_BASE + "." + criteria + ".js"))] = (criteria, False)
+    summaries = {}
+    sources = dict((relative(store.htmlPath(f) + os.sep + store.htmlFilename(f)), f) for f in xrange(store.fileCount()))
+
+    def renderChart(criteria, html):
+        if not summaries:
+            summaries.update(stats.summaries(BINNING, BINS, PERCENTILES))
+        data_code = mppview2js.parseViewOutput(summaries, criteria)
+        if not html:
+            return data_code["code"]
+        return mppview2js.renderHTMLfile(criteria, data_code["min"], data_code["max"], data_code["avg"], \
+            data_code["tot"], data_code["percentiles"])
+
+    def resolve(path):
+        if path in pages:
+            return (None, pages[path])
+        if path in charts:
+            return (None, lambda: renderChart(*charts[path]))
+        f = sources.get(path)
+        if f is None:
+            return None
+        # a page is re-rendered once its sourcefile changed
+        filename = store.fileName(f)
+        stat = os.stat(filename)
+        return ((stat.st_mtime, stat.st_size), lambda: canalyse.renderHTMLfile(store, f, \
+            canalyse.hashFile(filename) if canalyse.PREHIGHLIGHT else None))
+
+    server = reportserver.ReportServer((BIND, PORT), root, resolve, [STYLEDIR, JSCRIPTDIR, INSTALLDIR], \
+        relative(os.path.join(REPORTDIR, "index.html")).replace(os.sep, "/"), CACHE_SIZE * 1024 * 1024, log)
+    log(1, "Serving " + MODULE_BASE + " at http://" + BIND + ":" + str(server.server_address[1]) + "/ (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    log(1, "Page cache: " + str(server.cache.hits) + " hits, " + str(server.cache.misses) + " misses")
+
+## page of the diff view: arguments name, title, datafile, scripts, body and init of canalyse.renderOverviewHTMLfile()
+DIFF_PAGE = ("diff", u"diff", "diff", ["diff"], \
+    u"\t<h2 id='diff_title'></h2>\n" \
+    + u"\t<table id='diff_summary'></table>\n" \
+    + u"\t<div id='diff_controls'><select id='diff_criteria'></select>\n" \
+    + u"\t  <select id='diff_filter'><option value='regressions'>regressions</option>" \
+    + u"<option value='improvements'>improvements</option><option value='added'>added</option>" \
+    + u"<option value='removed'>removed</option><option value='all'>all</option></select></div>\n" \
+    + u"\t<table id='diff_table'></table>\n", "initDiff")
+
+##
+# Command 'diff': compare the metrics (METRIXDB or EXPORT) to those of BASELINE region by region.
+#
+# Only sourcefiles below SRCPATH/MODULE_BASE, respectively BASELINE_ROOT within the baseline, are compared; their
+# paths relative to these directories are matched. The result is written to the data file MODULE_BASE.diff.js in
+# DATADIR and shown by the page MODULE_BASE.diff.html in REPORTDIR, regions link to the sourcecode HTML files of the
+# current run as generated by command 'build'.
+##
+def diff():
+    if BASELINE is None:
+        log(-1, "Command 'diff' requires the baseline to compare to, cf. --baseline")
+    timer = StageTimer()
+    for directory in (REPORTDIR, DATADIR):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    root = os.path.join(SRCPATH, MODULE_BASE)
+    if BASELINE.lower().endswith(".csv"):
+        baseline = openMetrics(export=BASELINE)
+    else:
+        baseline = openMetrics(database=BASELINE)
+    current = openMetrics()
+    try:
+        # criterias collected in only one of the runs can't be compared
+        criterias = [criteria for criteria in current[1] if criteria in baseline[1]]
+        engine = metricdiff.MetricDiff(criterias)
+        timer.lap("open database")
+
+        def link(filename, line_start, line_end):
+            html_path, html_filename = canalyse.htmlLocation(filename, MODULE_BASE)
+            page = os.path.relpath(os.path.join(html_path, html_filename), REPORTDIR).replace(os.sep, "/")
+            return page + "#" + html_filename + "@" + str(line_start) + "-" + str(line_end)
+
+        engine.compare(metricdiff.readRegions(baseline[2], BASELINE_ROOT or root, \
+            [baseline[1].index(criteria) for criteria in criterias], baseline[3]), \
+            metricdiff.readRegions(current[2], root, [current[1].index(criteria) for criteria in criterias], \
+            current[3]), link)
+        timer.lap("compare")
+    finally:
+        baseline[0].close()
+        current[0].close()
+    data = engine.render(BASELINE_ROOT or BASELINE, MODULE_BASE)
+    filename = os.path.join(DATADIR, MODULE_BASE + ".diff.js")
+    if writeIfChanged(filename, u"var metricDiff = " + json.dumps(data, sort_keys=True) + u";\n"):
+        log(1, "Generated " + filename)
+    filename, content = canalyse.renderOverviewHTMLfile(*DIFF_PAGE)
+    if writeIfChanged(filename, content):
+        log(1, "Generated " + filename)
+    # the index of a report built before links the diff view from now on (cf. renderIndexHTML())
+    filename = os.path.join(REPORTDIR, "index.html")
+    search, link = navigationLink(MODULE_BASE, "search"), navigationLink(MODULE_BASE, "diff")
+    try:
+        with io.open(filename, "r", encoding="utf-8") as index:
+            content = index.read()
+    except IOError:
+        content = u""
+    if search in content and not link in content and writeIfChanged(filename, content.replace(search, search + link)):
+        log(1, "Updated " + filename)
+    timer.lap("diff view")
+    log(1, ", ".join(str(count) + " " + status for status, count in engine.counts.items()))
+    for c, criteria in enumerate(criterias):
+        log(1, "  %-32s %12s  %6d regressions  %6d improvements" % (criteria, ("+" if engine.totals[c] > 0 else "") \
+            + metricstore.formatValue(engine.totals[c]), engine.regressions[c], engine.improvements[c]))
+    timer.summary()
+
+##
+# Check the metrics (METRIXDB or EXPORT) against the limits of THRESHOLDS and list the violations in OUTPUT.
+#
+# The metrics are streamed: each file is checked as soon as its rows are read and dropped afterwards; with FAIL_FAST
+# the check stops at the first file violating a limit.
+#
+# @return number of violations
+##
+def checkMetrics():
+    if THRESHOLDS is None:
+        log(-1, "Command 'check' requires the limits to check against, cf. --thresholds")
+    try:
+        limits, waivers = qualitygate.readThresholds(THRESHOLDS)
+    except (IOError, ValueError) as err:
+        log(-1, "Can't read thresholds file " + THRESHOLDS + ": " + str(err))
+    if OUTPUT is None:
+        output = sys.stdout
+    else:
+        try:
+            output = open(OUTPUT, "wb")
+        except IOError as err:
+            log(-1, "Can't write output file " + OUTPUT + ": " + str(err))
+    timer = StageTimer()
+    source, criterias, rows, tag_index = openMetrics()
+    gate = qualitygate.QualityGate(criterias, limits, waivers)
+    for limit in limits:
+        if not limit.criteria in criterias:
+            log(1, "Warning: " + THRESHOLDS + ":" + str(limit.line) + ": criteria " + limit.criteria + \
+                " is not collected, the limit is ignored")
+    if OUTPUT_FORMAT == "csv":
+        writer = csv.writer(output)
+        writer.writerow(["file", "region", "type", "line start", "line end", "criteria", "scope", "value", "limit"])
+    store = metricstore.MetricStore(criterias, retain=False)
+    # the paths of the export are compared to the module root however either is spelled, e.g. './src' or 'src/'
+    prefix = os.path.join(os.path.abspath(os.path.join(SRCPATH, MODULE_BASE)), "")
+    count = 0
+    try:
+        timer.lap("open database")
+        for f in canalyse.readCSVfile(rows, MODULE_BASE, store, None, tag_index):
+            path = os.path.abspath(store.fileName(f))
+            if path.startswith(prefix):
+                path = path[len(prefix):].replace(os.sep, "/")
+            else:
+                log(1, "Warning: " + store.fileName(f) + " is outside of the module root " + prefix + \
+                    ", path selectors and waivers won't match it (cf. --srcpath, --modulebase)")
+                path = path.replace(os.sep, "/")
+            for violation in gate.checkFile(store, f, path):
+                count += 1
+                if OUTPUT_FORMAT == "csv":
+                    writer.writerow([unicode(value).encode("utf-8") for value in violation[:7]] \
+                        + [metricstore.formatValue(violation.value), metricstore.formatValue(violation.maximum)])
+                else:
+                    output.write(json.dumps(violation._asdict(), sort_keys=True) + "\n")
+            if count and FAIL_FAST:
+                log(1, "Stopped at the first file violating a limit")
+                break
+        timer.lap("check")
+    finally:
+        source.close()
+        if output is not sys.stdout:
+            output.close()
+    log(1, str(gate.files) + " files checked: " + str(count) + " violations, " + str(gate.waived) + " waived")
+    timer.summary()
+    return count
+
+##
+# Command 'check': check the metrics against the limits of THRESHOLDS (cf. checkMetrics()). No file of the report is
+# generated.
+#
+# Exits with CHECK_VIOLATED if there are violations and with CHECK_FAILED if the check could not be completed, e.g.
+# as the metrics can't be read, such that a CI pipeline tells a failing from a broken run.
+##
+def check():
+    try:
+        count = checkMetrics()
+    except SystemExit as err:
+        # errors are logged by log(-1), which exits with 1
+        sys.exit(CHECK_FAILED if err.code else 0)
+    except (Exception, KeyboardInterrupt):
+        traceback.print_exc()
+        sys.exit(CHECK_FAILED)
+    if count:
+        sys.exit(CHECK_VIOLATED)
+
+##
+# Read the modules of command 'batch' from \c filename. Each line lists SRCPATH, MODULE_BASE and the metrics (database or
+# csv export) of a module, separated by whitespace; empty lines and lines starting with '#' are ignored.
+#
+# @return list of tuples (srcpath, modulebase, metrics), ordered by the size of the metrics, largest first
+# @exception ValueError if a line can't be parsed, a module is listed twice or its metrics don't exist; the message
+#            names file and line
+##
+def readModules(filename):
+    modules = []
+    with open(filename) as ifile:
+        for linenum, line in enumerate(ifile, 1):
+            words = line.split()
+            if not words or words[0].startswith("#"):
+                continue
+            location = filename + ":" + str(linenum) + ": "
+            if len(words) != 3:
+                raise ValueError(location + "expected 'SRCPATH MODULE_BASE METRICS': " + line.strip())
+            srcpath, modulebase, metrics = words
+            # the reports share DATADIR, where the data files are named after the module
+            if modulebase in (module[1] for module in modules):
+                raise ValueError(location + "module " + modulebase + " is listed twice")
+            if not os.path.isfile(metrics):
+                raise ValueError(location + "metrics not found: " + metrics)
+            modules.append((srcpath, modulebase, metrics))
+    # the pages of the modules with the most metrics take longest, they are started first
+    modules.sort(key=lambda module: os.path.getsize(module[2]), reverse=True)
+    return modules
+
+##
+# Render REPORTDIR/index.html of command 'batch', listing the modules with the number of their files and regions and
+# per criteria of CRITERIA_LIST the total, maximum and mean per region; the last row holds these of all modules.
+#
+# @param reportdir  directory of the page, holding the report of each module in a subdirectory of its name
+# @param modules    list of tuples (modulebase, number of files, summaries as returned by generate())
+# @return content of the page as unicode string
+##
+def renderBatchIndexHTML(reportdir, modules):
+    styledir_rel = os.path.relpath(STYLEDIR, reportdir).replace(os.sep, "/")
+    totals = {}
+    for modulebase, files, summaries in modules:
+        for criteria, summary in summaries.items():
+            total = totals.setdefault(criteria, {"count": 0, "total": 0, "max": summary["max"]})
+            total["count"] += summary["count"]
+            total["total"] += summary["total"]
+            total["max"] = max(total["max"], summary["max"])
+    for total in totals.values():
+        # a criteria may have no values in any of the modules
+        total["avg"] = float(total["total"]) / total["count"] if total["count"] else 0.0
+    rows = [(u"<a href='" + cgi.escape(modulebase, True) + u"/index.html'>" + cgi.escape(modulebase) + u"</a>", \
+        files, summaries) for modulebase, files, summaries in modules]
+    rows.append((u"all modules", sum(module[1] for module in modules), totals))
+    parts = []
+    parts.append(u"<!DOCTYPE html>\n  <html>\n\t<head>\n\t  <title>modules</title>\n")
+    parts.append(u"\t  <link rel='stylesheet' type='text/css' href='" + styledir_rel + u"/style.css'>\n")
+    parts.append(u"\t</head>\n  <body class='batch'>\n")
+    parts.append(u"\t<h1>modules</h1>\n")
+    parts.append(u"\t<table id='batch_table'>\n\t  <tr><th>module</th><th>files</th><th>regions</th>")
+    parts.append(u"".join(u"<th>" + cgi.escape(criteria) + u" total</th><th>max</th><th>mean</th>" \
+        for criteria in CRITERIA_LIST) + u"</tr>\n")
+    for caption, files, summaries in rows:
+        regions = max([summary["count"] for summary in summaries.values()] or [0])
+        parts.append(u"\t  <tr><td>" + caption + u"</td><td>" + unicode(files) + u"</td><td>" + unicode(regions) \
+            + u"</td>")
+        for criteria in CRITERIA_LIST:
+            summary = summaries.get(criteria)
+            if summary is None:
+                parts.append(u"<td></td><td></td><td></td>")
+                continue
+            parts.append(u"<td>" + metricstore.formatValue(summary["total"]) + u"</td><td>" \
+                + metricstore.formatValue(summary["max"]) + u"</td><td>%.2f</td>" % summary["avg"])
+        parts.append(u"</tr>\n")
+    parts.append(u"\t</table>\n  </body>\n</html>\n")
+    return u"".join(parts)
+
+##
+# Set SRCPATH, MODULE_BASE, REPORTDIR and the metrics to read to those of \c module of command 'batch' and pass them
+# on to the modules of the stages (cf. configure()).
+#
+# @param module     tuple (srcpath, modulebase, metrics) as returned by readModules()
+# @param reportdir  directory holding the report of each module in a subdirectory of its name
+##
+def selectModule(module, reportdir):
+    global SRCPATH, MODULE_BASE, METRIXDB, EXPORT, REPORTDIR
+    srcpath, modulebase, metrics = module
+    SRCPATH, MODULE_BASE, REPORTDIR = srcpath, modulebase, os.path.join(reportdir, modulebase)
+    if metrics.lower().endswith(".csv"):
+        METRIXDB, EXPORT = None, metrics
+    else:
+        METRIXDB, EXPORT = metrics, None
+    configure()
+
+##
+# Command 'batch': generate the report of each module listed in MODULES, as command 'build' does, and an index of the
+# modules.
+#
+# The report of a module is written to REPORTDIR/MODULE_BASE, its data files to DATADIR (they are named after the
+# module); style, scripts and highlight.js are shared by all reports. The sourcecode HTML files of all modules are
+# rendered by one pool of JOBS worker processes, which is started once for the whole batch: the metrics of the modules
+# are read one after the other, largest first, and the pages of each module are queued in the pool without waiting
+# for those of the previous modules, such that the workers are kept busy until the pages of the last module are done.
+# The data files, diagrams and index of a module are written once its metrics are read; the rest of its report
+# (cf. canalyse.PendingPages) is completed once its last page is done. REPORTDIR/index.html lists the modules with
+# their totals and those of all modules (cf. renderBatchIndexHTML()).
+##
+def batch():
+    if MODULES is None:
+        log(-1, "Command 'batch' requires the modules to generate the reports of, cf. --modules")
+    if HISTORY is not None:
+        log(-1, "Option --history can't be combined with command 'batch', the modules would share one history")
+    try:
+        modules = readModules(MODULES)
+    except (IOError, ValueError) as err:
+        log(-1, "Can't read modules file " + MODULES + ": " + str(err))
+    timer = StageTimer()
+    reportdir = REPORTDIR
+    results = []
+    pending = []
+    pool = None
+    try:
+        for module in modules:
+            log(1, "Generating the report of module " + module[1])
+            selectModule(module, reportdir)
+            if pool is None and JOBS > 1:
+                # the workers are forked once with the settings all modules share, each page names its module
+                log(2, "Generating HTML files using " + str(JOBS) + " processes")
+                pool = canalyse.POOL = multiprocessing.Pool(JOBS)
+            for directory in (REPORTDIR, DATADIR):
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+            source, criterias, rows, tag_index = openMetrics()
+            files = set()
+
+            def counted(rows):
+                for row in rows:
+                    files.add(row[0])
+                    yield row
+
+            try:
+                timer.lap("open database")
+                summaries = generate(criterias, counted(rows), tag_index, timer, [("all modules", "../index.html")], \
+                    pending)
+            finally:
+                source.close()
+            results.append((module[1], len(files), summaries))
+        # the pages are done in the order they were queued, so are the modules
+        for module, pages in zip(modules, pending):
+            log(1, "Completing the report of module " + module[1])
+            selectModule(module, reportdir)
+            pages.finish()
+            timer.start = time.time()
+    except BaseException:
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        canalyse.POOL = None
+        canalyse.POOL_PENDING.clear()
+    if pool is not None:
+        pool.close()
+        pool.join()
+    filename = os.path.join(reportdir, "index.html")
+    if writeIfChanged(filename, renderBatchIndexHTML(reportdir, results)):
+        log(1, "Generated " + filename)
+    timer.lap("index")
+    timer.summary()
+
+## commands supported on the command line
+COMMANDS = {"build": build, "serve": serve, "diff": diff, "check": check, "batch": batch}
+
+def main():
+    command = scanArguments()
+    if LOGLEVEL >= 2:
+        dumpParameters()
+    configure()
+    COMMANDS[command]()
+
+if __name__ == "__main__":
+    main()
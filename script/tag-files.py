@@ -12,6 +12,11 @@ import io
 import getopt
 import sys
 import fnmatch
+import re
+import shutil
+import tempfile
+import time
+import ctypes
 
 loglevels = {"silent" : 0, "standard" : 1, "verbose" : 2}
 LOGLEVEL = 1
@@ -30,6 +35,8 @@ def printUsage():
     print "usage:", sys.argv[0], "[OPTION] csv-file"
     print "Parses the cvs output of metrix++ and add, delete or modify the column 'tag' for a list of files."
     print "By default the content of csv-file is replaced by the modified content."
+    print "Rows are processed one by one and written to a temporary file, which finally replaces the output file;"
+    print "an interrupted run leaves csv-file and OUTFILE untouched."
     print "Options and arguments:"
     print "  -h, --help             print this help message and exit"
     print "  --silent               turn on silent mode: no output except in case of error"
@@ -58,8 +65,8 @@ def printUsage():
     print "  +*.bak=BACKUP add the tag 'BACKUP' to all files with extension'.bak'"
     print "  @*=BACKUP:OBSOLETE at any entry (selector=*) change the tag from BACKUP to OBSOLETE"
     print ""
-    print "Attention:"
-    print "Order of operations is not guaranteed to be execute in order of appearance on command line."
+    print "Operations are applied in order of appearance on command line. An operation is applied once to a row"
+    print "matched by any of its selectors."
 
 ##
 # Print a log message to stdout if loglevel is set appropriate.
@@ -80,7 +87,7 @@ def log(level, message):
 # supported command line arguments). Name of the csv-file is a mandatroy argument. It checks for readability of the csv-file.
 ##
 def scanArguments():
-    global LOGLEVEL, ADD_LIST, REMOVE_LIST, CHANGE_LIST, OUTFILE, CSV_FILE, TAG_NAME
+    global LOGLEVEL, OPERATIONS, OUTFILE, CSV_FILE, TAG_NAME
 
     shortOptions = "hva:r:c:o:t:"
     longOptions = ["help", "version", "verbose", "silent", "add=", "remove=", "change=", "outfile=", "tagname="]
@@ -122,18 +129,21 @@ def scanArguments():
             if not tag.isalnum():
                 log(0, "Tag may only consist of alphanumeric characters: " + tag)
             else: 
-                ADD_LIST.append([selector.strip(), tag])
+                OPERATIONS.append(["add", selector.strip(), tag])
         elif opt in ("--remove", "-r"):
             if not tag.isalnum():
                 log(0, "Tag may only consist of alphanumeric characters: " + tag)
             else: 
-                REMOVE_LIST.append([selector.strip(), tag])
+                OPERATIONS.append(["remove", selector.strip(), tag])
         elif opt in ("--change", "-c"):
-            old_tag, new_tag = tag.split('=', 1)
-            if not (old_tag.isalnum() and new_tag.isalnum):
+            try:
+                old_tag, new_tag = tag.split('=', 1)
+            except ValueError:
+                log(0, "Specify tags to change as <OLDVALUE>=<NEWVALUE>: " + tag)
+            if not (old_tag.isalnum() and new_tag.isalnum()):
                 log(0, "Tags may only consist of alphanumeric characters: " + tag)
             else: 
-                CHANGE_LIST.append([selector.strip(), old_tag, new_tag])
+                OPERATIONS.append(["change", selector.strip(), old_tag, new_tag])
     if len(args) != 1:
         log(0, "Specify csv-file as mandatory argument.")
     else:
@@ -142,180 +152,231 @@ def scanArguments():
             log(0, "Unable to open csv-file : " + CSV_FILE)
 
 ##
-# Read in complete content of csv-file into global variable DATASETS. All consecutive operations shall operate on DATASETS.
+# Rename \c tmp_filename to \c filename, replacing \c filename if it exists (as os.replace() of Python 3 does).
+#
+# os.rename() does not replace an existing file on Windows, MoveFileEx() does so without removing \c filename first.
+# As other processes (e.g. a virus scanner) may keep \c filename open for a moment, which fails replacing it, it is
+# retried REPLACE_RETRIES times.
 ##
-def readCSVfile():
-    global LOGLEVEL, ADD_LIST, REMOVE_LIST, CHANGE_LIST, OUTFILE, CSV_FILE, DATASETS
-    with open(CSV_FILE, 'rb') as csv_file:
-    # read in cvs output of the 'export' command of metrix++
-        reader = csv.reader(csv_file, delimiter=',')
-        for row in reader:
-            DATASETS.append(row)
+def replaceFile(tmp_filename, filename):
+    if os.name != "nt":
+        os.rename(tmp_filename, filename)
+        return
+    for attempt in range(REPLACE_RETRIES + 1):
+        # MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH
+        if ctypes.windll.kernel32.MoveFileExW(tmp_filename.decode(sys.getfilesystemencoding()), \
+                filename.decode(sys.getfilesystemencoding()), 0x1 | 0x8):
+            return
+        error = ctypes.GetLastError()
+        if attempt < REPLACE_RETRIES:
+            time.sleep(0.1 * (attempt + 1))
+    raise ctypes.WinError(error)
 
 ##
-# Add a tag to the datasets in DATASETS.
+# Write \c rows as csv to \c filename.
 #
-# First check if column 'tag' already exists, append otherwise. Check if selector matches filename in first col.
-# If col 'tag' was added, then append 'tag', else add 'tag' to the whitespace separated list of tags (if it is already 
-# in the list of tags it will be duplicated).
+# The rows are written to a temporary file in the directory of \c filename, which replaces \c filename when all
+# rows are written (cf. replaceFile()). If writing fails (or is interrupted) the temporary file is removed and
+# \c filename is left as is. Thus \c rows may be read from \c filename itself.
+#
+# @param source     optional file \c rows are read from; it is closed before \c filename is replaced, as an open
+#                   file can't be replaced on Windows
 ##
-def addTag(selector, tag):
-    global LOGLEVEL, ADD_LIST, REMOVE_LIST, CHANGE_LIST, OUTFILE, CSV_FILE, DATASETS, TAG_NAME
-
-    tag_index = 0
-    needs_append = False
-    log(1, "Adding " + TAG_NAME + " '" + tag + "' to selector " + selector)
-    line_count = 0
-    for row in DATASETS:
-        # first row contains header defintion
-        if line_count == 0:
-            # if there is no column TAG_NAME
-            if not TAG_NAME in row:
-                # add such a row and raise marker
-                row.append(TAG_NAME)
-                needs_append = True
-            # in any case we need to know index of col 'tag'
-            tag_index = row.index(TAG_NAME)
+def writeCSVfile(rows, filename, source=None):
+    directory, basename = os.path.split(os.path.abspath(filename))
+    handle, tmp_filename = tempfile.mkstemp(prefix="." + basename + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as csv_out:
+            writer = csv.writer(csv_out)
+            for row in rows:
+                writer.writerow(row)
+        if source is not None:
+            source.close()
+        if os.path.isfile(filename):
+            shutil.copymode(filename, tmp_filename)
         else:
-            # when filename matches selector
-            if fnmatch.fnmatch(row[0], selector):
-                # if we need to append a col
-                if needs_append:
-                    row.append(u" " + tag)
-                else:
-                    # add tag to the existing content of col 'tag'
-                    row[tag_index] = row[tag_index] + u" " + tag
-                log(2, "  + " + row[0])
-            else:
-                # also for a non-matching filename we need to know if we have to add a col
-                if needs_append:
-                    row.append(u"")
-        line_count += 1
+            # mkstemp() creates the file accessible by its owner only, a new file is created as open() would
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_filename, 0666 & ~umask)
+        replaceFile(tmp_filename, filename)
+    except:
+        os.remove(tmp_filename)
+        raise
 
 ##
-# Remove a tag from the datasets in DATASETS.
+# Selectors of all operations compiled into a single matcher.
 #
-# First check if column 'tag' already exists, append otherwise. Only if col 'tag' already existed check if 
-# selector matches filename in first col. If so check if 'tag' is in the whitespace separated list and remove 
-# it (only first occurence will be removed).
+# Selectors without wildcards are kept in a hash table, selectors with a single trailing '*' as only wildcard
+# (e.g. 'src/driver/*') in a trie of their prefixes and all other selectors are merged into a single regular
+# expression. Matching a filename therefore costs a lookup, a walk along the trie and a single regular expression
+# match (plus one match per glob for filenames matching any glob), regardless of the number of selectors. Filenames
+# are compared as fnmatch.fnmatch() does. As the rows of a file are consecutive, the result for the last filename is
+# kept.
 ##
-def removeTag(selector, tag): 
-    global LOGLEVEL, ADD_LIST, REMOVE_LIST, CHANGE_LIST, OUTFILE, CSV_FILE, DATASETS, TAG_NAME
+class SelectorMatcher(object):
+    def __init__(self):
+        # filename -> set of indices of operations
+        self.exact = {}
+        # nested dictionaries, one level per character; key None holds the set of indices of operations
+        self.trie = {}
+        # list of tuples (compiled glob, index of operation)
+        self.globs = []
+        self.combined = None
+        self.last = (None, [])
 
-    tag_index = 0
-    needs_append = False
-    log(1, "Removing tag '" + tag + "' from selector " + selector)
-    line_count = 0
-    for row in DATASETS:
-        # first row contains header defintion
-        if line_count == 0:
-            # if there is no column TAG_NAME
-            if not TAG_NAME in row:
-                # add such a row and raise marker
-                row.append(TAG_NAME)
-                needs_append = True
-            # in any case we need to know index of col 'tag'
-            tag_index = row.index(TAG_NAME)
+    ##
+    # Add \c selector (a filename or filename qualifier as accepted by fnmatch) of the operation with index \c op.
+    ##
+    def add(self, selector, op):
+        selector = os.path.normcase(selector)
+        wildcards = [n for n, char in enumerate(selector) if char in "*?["]
+        if not wildcards:
+            self.exact.setdefault(selector, set()).add(op)
+        elif wildcards == [len(selector) - 1] and selector[-1] == "*":
+            node = self.trie
+            for char in selector[:-1]:
+                node = node.setdefault(char, {})
+            node.setdefault(None, set()).add(op)
         else:
-            if not needs_append:
-                # when filename matches selectro
-                if fnmatch.fnmatch(row[0], selector):
-                    log(2, "  - " + row[0])
-                    tags_list = row[tag_index].split()
-                    try: 
-                        index_in_tagslist = tags_list.index(tag)
-                        tags_list.pop(index_in_tagslist)
-                    except:
-                        pass
-                    row[tag_index] = ' '.join(tags_list)
-        line_count += 1
+            self.globs.append((selector, op))
+
+    ##
+    # Compile the globs added, to be called after the last selector is added.
+    ##
+    def compile(self):
+        patterns = []
+        for selector, op in self.globs:
+            pattern = fnmatch.translate(selector)
+            # fnmatch appends the end anchor and flags, which have to come last in the merged expression
+            if pattern.endswith("\\Z(?ms)"):
+                pattern = pattern[:-len("\\Z(?ms)")]
+            patterns.append(pattern)
+        self.globs = [(re.compile("(?ms)(?:" + pattern + ")\\Z"), op) for pattern, (selector, op) in zip(patterns, self.globs)]
+        if patterns:
+            self.combined = re.compile("(?ms)(?:" + "|".join("(?:" + pattern + ")" for pattern in patterns) + ")\\Z")
+
+    ##
+    # Return the ascending list of the indices of all operations with a selector matching \c filename.
+    ##
+    def match(self, filename):
+        if filename == self.last[0]:
+            return self.last[1]
+        name = os.path.normcase(filename)
+        ops = set(self.exact.get(name, ()))
+        node = self.trie
+        ops.update(node.get(None, ()))
+        for char in name:
+            node = node.get(char)
+            if node is None:
+                break
+            ops.update(node.get(None, ()))
+        if self.combined is not None and self.combined.match(name):
+            ops.update(op for glob, op in self.globs if glob.match(name))
+        self.last = (filename, sorted(ops))
+        return self.last[1]
 
 ##
-# Replace an old_tag value by new_tag in the datasets in DATASETS.
-# 
-# First check if column 'tag' already exists, append otherwise. Only if col 'tag' already existed check if 
-# selector matches filename in first col. If so check if 'pld_tag' is in the whitespace separated list and 
-# replace by 'new_tag' (only first occurence will be replaced).
-def changeTag(selector, old_tag, new_tag):
-    global LOGLEVEL, ADD_LIST, REMOVE_LIST, CHANGE_LIST, OUTFILE, CSV_FILE, DATASETS, TAG_NAME
+# Compile the selectors of all \c operations into a SelectorMatcher.
+#
+# A selector '#<listfile>' is replaced by the filenames listed in listfile, one per row.
+##
+def compileSelectors(operations):
+    matcher = SelectorMatcher()
+    for op, operation in enumerate(operations):
+        selector = operation[1]
+        if selector[:1] == '#':
+            try:
+                with open(selector[1:], "r") as selector_file:
+                    for sel_from_file in selector_file:
+                        if sel_from_file.strip():
+                            matcher.add(sel_from_file.strip(), op)
+            except IOError:
+                log(0, "Referenced selector file not found: " + selector[1:])
+        else:
+            matcher.add(selector, op)
+    matcher.compile()
+    return matcher
 
-    tag_index = 0
-    needs_append = False
-    log(1, "Replacing tag '" + old_tag + "' by '" + new_tag + "' at selector " + selector)
-    line_count = 0
-    for row in DATASETS:
-        # first row contains header defintion
-        if line_count == 0:
-            # if there is no column TAG_NAME
-            if not TAG_NAME in row:
-                # add such a row and raise marker
-                row.append(TAG_NAME)
-                needs_append = True
-            # in any case we need to know index of col 'tag'
-            tag_index = row.index(TAG_NAME)
+##
+# Apply \c operation to the content \c tags of column 'tag' of a row.
+#
+# 'add' appends the tag to the whitespace separated list of tags (if it is already in the list of tags it will be
+# duplicated), 'remove' removes and 'change' replaces the first occurence of the tag.
+#
+# @return new content of column 'tag'
+##
+def applyOperation(operation, tags):
+    if operation[0] == "add":
+        return tags + u" " + operation[2]
+    tags_list = tags.split()
+    if operation[0] == "remove":
+        if operation[2] in tags_list:
+            tags_list.remove(operation[2])
+    elif operation[2] in tags_list:
+        tags_list[tags_list.index(operation[2])] = operation[3]
+    return ' '.join(tags_list)
+
+##
+# Apply all OPERATIONS to \c rows in a single pass, one row after the other.
+#
+# First check if column 'tag' already exists in the header (the first row), append otherwise. For every row the
+# operations with a selector matching the filename in first col are applied in order of OPERATIONS.
+#
+# @param rows   iterable of the rows of the csv file
+# @return generator of the modified rows
+##
+def tagRows(rows, matcher):
+    global LOGLEVEL, OPERATIONS, TAG_NAME
+    for operation in OPERATIONS:
+        if operation[0] == "add":
+            log(1, "Adding " + TAG_NAME + " '" + operation[2] + "' to selector " + operation[1])
+        elif operation[0] == "remove":
+            log(1, "Removing tag '" + operation[2] + "' from selector " + operation[1])
         else:
-            if not needs_append:
-                # when filename matches selectro
-                if fnmatch.fnmatch(row[0], selector):
-                    log(2, "  @ " + row[0])
-                    tags_list = row[tag_index].split()
-                    try: 
-                        index_in_tagslist = tags_list.index(old_tag)
-                        tags_list[index_in_tagslist] = new_tag
-                    except:
-                        pass
-                    row[tag_index] = ' '.join(tags_list)
-        line_count += 1
+            log(1, "Replacing tag '" + operation[2] + "' by '" + operation[3] + "' at selector " + operation[1])
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    if not OPERATIONS:
+        yield header
+        for row in rows:
+            yield row
+        return
+    # first row contains header defintion
+    needs_append = not TAG_NAME in header
+    if needs_append:
+        header.append(TAG_NAME)
+    tag_index = header.index(TAG_NAME)
+    yield header
+    symbols = {"add": "+", "remove": "-", "change": "@"}
+    for row in rows:
+        if needs_append:
+            row.append(u"")
+        if row:
+            for op in matcher.match(row[0]):
+                log(2, "  " + symbols[OPERATIONS[op][0]] + " " + row[0])
+                row[tag_index] = applyOperation(OPERATIONS[op], row[tag_index])
+        yield row
 
-ADD_LIST = []
-REMOVE_LIST = []
-CHANGE_LIST = []
-DATASETS = []
+## list of operations in order of the command line: ["add" | "remove", selector, tag] or ["change", selector, old tag, new tag]
+OPERATIONS = []
 ## filename of the input file
 CSV_FILE = ""
 ## Filename of the output file
 OUTFILE = ""
-# OUTPUT = []
 TAG_NAME = "tag"
-
-##
-# Iterate through 'theList': for every entry check if 'selector' starts with '#', if so 
-# treat it as a filename. Open respective file and read line by line. Each line results 
-# in a new entry to the returned list, with the line content as new selector.
-def expandedList(theList):
-    ret = []
-    for entry in theList:
-        selector = entry[0]
-        if selector[0] == '#':
-            try:
-                selector_file = open(selector[1:], "r")
-                for sel_from_file in selector_file:
-                    newEntry = [sel_from_file]
-                    newEntry.extend(entry[1:])
-                    ret.append(newEntry)
-                selector_file.close()
-            except:
-                log(0, "Referenced selector file not found: " + selector[1:])
-        else:
-            ret.append(entry)
-    return ret
+## number of times replacing the output file is retried on Windows (cf. replaceFile())
+REPLACE_RETRIES = 5
 
 scanArguments()
-readCSVfile()
-if len(ADD_LIST) > 0:
-    for selector, tag in expandedList(ADD_LIST):
-        addTag(selector, tag)
-if len(REMOVE_LIST) > 0:
-    for selector, tag in expandedList(REMOVE_LIST):
-        removeTag(selector, tag)
-if len(CHANGE_LIST) > 0:
-    for selector, old_tag, new_tag in expandedList(CHANGE_LIST):
-        changeTag(selector, old_tag, new_tag)
+matcher = compileSelectors(OPERATIONS)
 
 if OUTFILE == "":
     OUTFILE = CSV_FILE
 
-with open(OUTFILE, "w") as csv_out:
-    writer = csv.writer(csv_out)
-    writer.writerows(DATASETS)
-csv_out.close()
\ No newline at end of file
+# read in cvs output of the 'export' command of metrix++
+# the input is closed before the output replaces it, which may be the input itself
+with open(CSV_FILE, 'rb') as csv_file:
+    writeCSVfile(tagRows(csv.reader(csv_file, delimiter=','), matcher), OUTFILE, csv_file)
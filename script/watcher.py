@@ -0,0 +1,117 @@
+##
+# @file watcher.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Detection of changed sourcefiles and incremental collection of their metrics for the watch mode.
+#
+# The sourcefiles of a module are polled by their modification time and size. The metrics of changed sourcefiles are
+# collected by running 'metrix++ collect' for these files only, into a temporary database whose rows replace the
+# rows of the files within the in-memory MetricsDataset. The report is then regenerated from the dataset; as its
+# manifest records which files and data files are up to date, only the pages of the changed files and the data files
+# whose content changed are written again.
+##
+
+import collections
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import mppdb
+
+##
+# Rows of all files of a module in the layout of 'metrix++ export' (cf. mppdb.MetrixDB.iterateRows()), in the order
+# they were read.
+##
+class MetricsDataset(object):
+    def __init__(self):
+        ## normalized path -> list of rows
+        self.files = collections.OrderedDict()
+        ## normalized path -> path as written by metrix++
+        self.paths = {}
+
+    ##
+    # Pass on \c rows, keeping each of them in the dataset; files read again replace their previous rows.
+    ##
+    def record(self, rows):
+        current = None
+        for row in rows:
+            key = os.path.normpath(row[0])
+            if key != current:
+                current = key
+                self.files[key] = []
+                self.paths[key] = row[0]
+            self.files[key].append(row)
+            yield row
+
+    ##
+    # Replace the rows of the files within \c rows, new files are appended. Known files keep their path as read first.
+    ##
+    def update(self, rows):
+        rows = ([self.paths.get(os.path.normpath(row[0]), row[0])] + list(row[1:]) for row in rows)
+        for row in self.record(rows):
+            pass
+
+    def remove(self, key):
+        self.files.pop(key, None)
+        self.paths.pop(key, None)
+
+    ## iterate the rows of all files
+    def rows(self):
+        for rows in self.files.values():
+            for row in rows:
+                yield row
+
+##
+# Return the modification time and size of all files below \c directory with one of the \c extensions.
+#
+# @return dictionary normalized path -> tuple (path, mtime, size)
+##
+def snapshot(directory, extensions):
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(directory):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in extensions:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # removed while walking
+                    continue
+                files[os.path.normpath(path)] = (path, stat.st_mtime, stat.st_size)
+    return files
+
+##
+# Compare two snapshots (cf. snapshot()).
+#
+# @return tuple (list of the keys of files added or changed, list of the keys of files removed)
+##
+def changes(previous, current):
+    changed = [key for key, (path, mtime, size) in current.items() if previous.get(key, (None,))[1:] != (mtime, size)]
+    removed = [key for key in previous if not key in current]
+    return (sorted(changed), sorted(removed))
+
+##
+# Collect the metrics of \c filenames by 'metrix++ collect' into a temporary database.
+#
+# @param metrixpp   path to metrix++.py
+# @param criterias  list of criteria mnemonics to collect, e.g. 'std.code.lines.code'
+# @param filenames  paths of the sourcefiles, as they shall be named in the rows
+# @param workdir    directory to create the temporary database in
+# @return list of rows of the files (cf. mppdb.MetrixDB.iterateRows())
+# @exception RuntimeError if metrix++ fails
+##
+def collectMetrics(metrixpp, criterias, filenames, workdir):
+    tmpdir = tempfile.mkdtemp(prefix="collect.", dir=workdir)
+    try:
+        dbfile = os.path.join(tmpdir, "metrixpp.db")
+        command = [sys.executable, metrixpp, "collect", "--log-level=ERROR", "--db-file=" + dbfile] \
+            + ["--" + criteria for criteria in criterias] + ["--"] + list(filenames)
+        if subprocess.call(command) != 0 or not os.path.isfile(dbfile):
+            raise RuntimeError("Collecting metrics by '" + " ".join(command[:5]) + " ...' failed")
+        db = mppdb.MetrixDB(dbfile)
+        try:
+            return list(db.iterateRows())
+        finally:
+            db.close()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
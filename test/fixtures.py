@@ -0,0 +1,114 @@
+##
+# @file fixtures.py
+# @copyright (c) 2020 Marc Stoerzel
+# @brief Metrics of a small module, as csv export and as metrix++ database, for the tests.
+#
+# A module is given as list of files, each a tuple (path, comments, list of regions); a region is a tuple (name, type,
+# line start, line end, cyclomatic complexity or None, lines of code). The csv export lists the regions of a file
+# only, as older versions of 'metrix++ export' do; the database holds the comments per file in addition, which
+# mppdb.MetrixDB.iterateRows() returns by a row of type 'file' behind the regions of a file.
+##
+
+import csv
+import os
+import sqlite3
+import StringIO
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "script"))
+
+import canalyse
+import metricstore
+import mppdb
+
+## region types of 'metrix++ export' -> group_id of metrix++
+GROUPS = dict((name, bit) for bit, name in mppdb.REGION_TYPES)
+
+SCHEMA = """
+CREATE TABLE __tables__ (id integer NOT NULL PRIMARY KEY, name text NOT NULL, version text NOT NULL,
+    support_regions integer NOT NULL, confirmed integer NOT NULL, UNIQUE (name));
+CREATE TABLE __columns__ (id integer NOT NULL PRIMARY KEY, name text NOT NULL, type text NOT NULL,
+    table_id integer NOT_NULL, non_zero integer NOT NULL, confirmed integer NOT NULL, UNIQUE (name, table_id));
+CREATE TABLE __files__ (id integer NOT NULL PRIMARY KEY AUTOINCREMENT, path text NOT NULL, checksum integer NOT NULL,
+    tag1 integer, tag2 integer, tag3 integer, confirmed integer NOT NULL, UNIQUE(path));
+CREATE TABLE __regions__ (file_id integer NOT NULL, region_id integer NOT NULL, name text NOT NULL,
+    begin integer NOT NULL, end integer NOT NULL, line_begin integer NOT NULL, line_end integer NOT NULL,
+    cursor integer NOT NULL, group_id integer NOT NULL, checksum integer NOT NULL, PRIMARY KEY (file_id, region_id));
+CREATE TABLE 'std.code.complexity' (file_id integer NOT NULL, region_id integer NOT NULL, 'cyclomatic' integer,
+    PRIMARY KEY (file_id, region_id));
+CREATE TABLE 'std.code.filelines' (file_id integer NOT NULL PRIMARY KEY, 'comments' integer);
+CREATE TABLE 'std.code.lines' (file_id integer NOT NULL, region_id integer NOT NULL, 'code' integer,
+    PRIMARY KEY (file_id, region_id));
+INSERT INTO __tables__ VALUES (1, 'std.code.complexity', '1.0', 1, 1);
+INSERT INTO __tables__ VALUES (2, 'std.code.filelines', '1.0', 0, 1);
+INSERT INTO __tables__ VALUES (3, 'std.code.lines', '1.0', 1, 1);
+INSERT INTO __columns__ VALUES (1, 'cyclomatic', 'integer', 1, 0, 1);
+INSERT INTO __columns__ VALUES (2, 'comments', 'integer', 2, 0, 1);
+INSERT INTO __columns__ VALUES (3, 'code', 'integer', 3, 0, 1);
+"""
+
+## files of the module: file a.cpp holds most of its code in the global scope
+MODULE = [
+    ("./src/module/a.cpp", 12, [("__global__", "global", 1, 80, None, 40), ("main", "function", 60, 75, 3, 10)]),
+    ("./src/module/lib/b.cpp", 30, [("__global__", "global", 1, 120, None, 0), \
+        ("lib", "namespace", 5, 118, None, 5), ("lib::parse", "function", 10, 60, 12, 30), \
+        ("lib::parse::inner", "function", 20, 40, 4, 15), ("lib::emit", "function", 70, 110, 6, 25)]),
+    ("./src/module/lib/c.cpp", 3, [("__global__", "global", 1, 30, None, 2), ("tiny", "function", 5, 25, 1, 18)])]
+
+##
+# Return the csv export of the module as string.
+##
+def csvExport(module=MODULE):
+    text = StringIO.StringIO()
+    writer = csv.writer(text, lineterminator="\n")
+    writer.writerow(["file", "region", "type", "modified", "line start", "line end", \
+        "std.code.complexity:cyclomatic", "std.code.filelines:comments", "std.code.lines:code"])
+    for path, comments, regions in module:
+        for name, type, line_start, line_end, cyclomatic, code in regions:
+            writer.writerow([path, name, type, "", line_start, line_end, "" if cyclomatic is None else cyclomatic, \
+                "", code])
+    return text.getvalue()
+
+##
+# Return the rows of the module as read from its csv export (cf. canalyse.readCSVheader()).
+#
+# @return tuple (list of criteria mnemonics, iterable of rows)
+##
+def csvRows(module=MODULE):
+    rows = csv.reader(StringIO.StringIO(csvExport(module)), delimiter=",")
+    criterias, tag_index = canalyse.readCSVheader(rows)
+    return (criterias, rows)
+
+##
+# Write the module to the metrix++ database \c filename and return its rows as read by mppdb.MetrixDB.
+#
+# @param module     files of the module, None to read \c filename as is
+# @return tuple (list of criteria mnemonics, iterable of rows)
+##
+def databaseRows(filename, module=MODULE):
+    conn = sqlite3.connect(filename)
+    if module is not None:
+        conn.executescript(SCHEMA)
+    for file_id, (path, comments, regions) in enumerate(module or [], 1):
+        conn.execute("INSERT INTO __files__ (id, path, checksum, confirmed) VALUES (?, ?, 0, 1)", (file_id, path))
+        conn.execute("INSERT INTO 'std.code.filelines' VALUES (?, ?)", (file_id, comments))
+        for region_id, (name, type, line_start, line_end, cyclomatic, code) in enumerate(regions, 1):
+            conn.execute("INSERT INTO __regions__ VALUES (?, ?, ?, 0, 0, ?, ?, 0, ?, 0)", \
+                (file_id, region_id, name, line_start, line_end, GROUPS[type]))
+            if cyclomatic is not None:
+                conn.execute("INSERT INTO 'std.code.complexity' VALUES (?, ?, ?)", (file_id, region_id, cyclomatic))
+            conn.execute("INSERT INTO 'std.code.lines' VALUES (?, ?, ?)", (file_id, region_id, code))
+    conn.commit()
+    conn.close()
+    source = mppdb.MetrixDB(filename)
+    return (source.criterias(), list(source.iterateRows()))
+
+##
+# Read \c rows into a new MetricStore retaining all files.
+#
+# @return tuple (MetricStore, list of the indices of the files)
+##
+def readStore(criterias, rows):
+    store = metricstore.MetricStore(criterias)
+    files = list(canalyse.readCSVfile(rows, "module", store))
+    return (store, files)
@@ -0,0 +1,66 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import fixtures
+
+SOURCEMETRIX = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "script", "sourcemetrix.py")
+
+class CheckCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.export = os.path.join(self.tmpdir, "module.csv")
+        with open(self.export, "w") as ofile:
+            ofile.write(fixtures.csvExport())
+        self.thresholds = os.path.join(self.tmpdir, "thresholds.txt")
+        with open(self.thresholds, "w") as ofile:
+            ofile.write("limit std.code.lines.code file 60\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    ##
+    # Run command 'check' with \c arguments.
+    #
+    # @return tuple (exit status, lines written to stdout)
+    ##
+    def check(self, *arguments, **kwargs):
+        process = subprocess.Popen([sys.executable, SOURCEMETRIX, "check", "--export=" + self.export, \
+            "--srcpath=" + kwargs.get("srcpath", "./src"), "--modulebase=module"] + list(arguments), \
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = process.communicate()
+        self.err = err
+        return (process.returncode, out.splitlines())
+
+    def testViolationsOnlyOnStdout(self):
+        status, lines = self.check("--thresholds=" + self.thresholds, "--verbose")
+        self.assertEqual(status, 1)
+        self.assertEqual(lines, ["file,region,type,line start,line end,criteria,scope,value,limit", \
+            "./src/module/lib/b.cpp,,file,1,120,std.code.lines.code,file,75,60"])
+
+    def testNoViolations(self):
+        with open(self.thresholds, "w") as ofile:
+            ofile.write("limit std.code.lines.code file 100\n")
+        self.assertEqual(self.check("--thresholds=" + self.thresholds)[0], 0)
+
+    def testSrcpathSpelledDifferently(self):
+        with open(self.thresholds, "w") as ofile:
+            ofile.write("limit std.code.lines.code file 60\n" \
+                + "waive std.code.lines.code lib/b.cpp\n")
+        for srcpath in ["./src", "src", "src/", os.path.abspath("src")]:
+            self.assertEqual(self.check("--thresholds=" + self.thresholds, srcpath=srcpath)[0], 0, srcpath)
+            self.assertFalse("outside of the module root" in self.err)
+        self.assertEqual(self.check("--thresholds=" + self.thresholds, srcpath="other")[0], 1)
+        self.assertTrue("is outside of the module root" in self.err)
+
+    def testErrorsTellFromViolations(self):
+        self.assertEqual(self.check()[0], 2)
+        self.assertEqual(self.check("--thresholds=" + os.path.join(self.tmpdir, "missing.txt"))[0], 2)
+        self.assertEqual(self.check("--thresholds=" + self.thresholds, "--format=xml"), (2, []))
+        self.assertEqual(self.check("--thresholds=" + self.thresholds, "--no-such-option")[0], 2)
+
+if __name__ == "__main__":
+    unittest.main()
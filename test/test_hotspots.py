@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import fixtures
+import hotspots
+
+class HotspotIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def fileRanking(self, criterias, rows, criteria="std.code.lines.code"):
+        store, files = fixtures.readStore(criterias, rows)
+        index = hotspots.HotspotIndex(criterias, 10)
+        for f in files:
+            index.addFile(store, f, store.fileTotals(f)[0])
+        return index.render(self.tmpdir)[criteria]["files"]
+
+    def testFilesRankedByCodeOfTheWholeFile(self):
+        ranking = self.fileRanking(*fixtures.csvRows())
+        self.assertEqual([(value, filename) for value, filename, link in ranking], \
+            [(75, "./src/module/lib/b.cpp"), (50, "./src/module/a.cpp"), (20, "./src/module/lib/c.cpp")])
+
+    def testCSVAndDatabaseRankFilesAlike(self):
+        database = os.path.join(self.tmpdir, "metrixpp.db")
+        fixtures.databaseRows(database)
+        for criteria in ("std.code.complexity.cyclomatic", "std.code.lines.code"):
+            csv_ranking = self.fileRanking(*fixtures.csvRows(), criteria=criteria)
+            db_ranking = self.fileRanking(*fixtures.databaseRows(database, None), criteria=criteria)
+            self.assertEqual([entry[:2] for entry in db_ranking], [entry[:2] for entry in csv_ranking])
+
+    def testFileValuesOfTheDatabaseCountedOnce(self):
+        ranking = self.fileRanking(*fixtures.databaseRows(os.path.join(self.tmpdir, "metrixpp.db")), \
+            criteria="std.code.filelines.comments")
+        self.assertEqual([(value, filename) for value, filename, link in ranking], \
+            [(30, "./src/module/lib/b.cpp"), (12, "./src/module/a.cpp"), (3, "./src/module/lib/c.cpp")])
+
+    def testFileRowsCountMergedRegionsOnce(self):
+        store, files = fixtures.readStore(*fixtures.databaseRows(os.path.join(self.tmpdir, "metrixpp.db")))
+        sums, maxima, count = store.fileTotals(files[0])
+        self.assertEqual(count, 2)
+        self.assertEqual(sums, [3, 12, 50])
+
+    def testFileTotalsIndependentOfRowOrder(self):
+        criterias = ["std.code.lines.code"]
+        global_row = ["./src/module/a.cpp", "__global__", "global", "", "1", "80", "3"]
+        file_row = ["./src/module/a.cpp", "", "file", "", "1", "80", "5"]
+        function_row = ["./src/module/a.cpp", "main", "function", "", "60", "75", "7"]
+        for rows in ([global_row, file_row, function_row], [file_row, global_row, function_row], \
+                [function_row, file_row, global_row]):
+            store, files = fixtures.readStore(criterias, [list(row) for row in rows])
+            self.assertEqual(store.fileTotals(files[0]), ([15], [8], 2))
+            self.assertEqual(len(store.fileRows(files[0])), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import fixtures
+import metricdiff
+
+## the module of the fixtures one release later: regions of a.cpp and b.cpp moved, lib::parse simplified, an overload
+#  of lib::emit added, c.cpp replaced by d.cpp
+CURRENT = [
+    ("./src/module/a.cpp", 12, [("__global__", "global", 1, 85, None, 40), ("main", "function", 65, 80, 3, 10)]),
+    ("./src/module/lib/b.cpp", 30, [("__global__", "global", 1, 140, None, 0), \
+        ("lib", "namespace", 5, 138, None, 5), ("lib::parse", "function", 10, 60, 8, 30), \
+        ("lib::parse::inner", "function", 20, 40, 4, 15), ("lib::emit", "function", 70, 110, 6, 25), \
+        ("lib::emit", "function", 115, 135, 2, 12)]),
+    ("./src/module/lib/d.cpp", 0, [("__global__", "global", 1, 10, None, 4)])]
+
+class MetricDiffTest(unittest.TestCase):
+    def regions(self, module, root="./src/module"):
+        criterias, rows = fixtures.csvRows(module)
+        return metricdiff.readRegions(rows, root, [criterias.index("std.code.complexity.cyclomatic"), \
+            criterias.index("std.code.lines.code")])
+
+    def compare(self, baseline, current):
+        engine = metricdiff.MetricDiff(["std.code.complexity.cyclomatic", "std.code.lines.code"])
+        engine.compare(self.regions(baseline), self.regions(current), \
+            lambda filename, line_start, line_end: filename + "@" + str(line_start))
+        return engine
+
+    def testRegionsKeyedByPathNameTypeAndOccurrence(self):
+        keys = [region[0] for region in self.regions(CURRENT, "src/module/")]
+        self.assertEqual(keys[:2], [("a.cpp", "__global__", "global", 0), ("a.cpp", "main", "function", 0)])
+        self.assertEqual(keys[6:8], [("lib/b.cpp", "lib::emit", "function", 0), \
+            ("lib/b.cpp", "lib::emit", "function", 1)])
+        self.assertEqual(list(self.regions(CURRENT, "./src/other")), [])
+
+    def testCounts(self):
+        engine = self.compare(fixtures.MODULE, CURRENT)
+        self.assertEqual(dict(engine.counts), {"added": 2, "removed": 2, "changed": 1, "unchanged": 6, "moved": 4, \
+            "files added": 1, "files removed": 1})
+        self.assertEqual(engine.totals, [-3, -4])
+        self.assertEqual(engine.regressions, [1, 2])
+        self.assertEqual(engine.improvements, [2, 2])
+
+    def testMovedAndOverloadedRegionsMatched(self):
+        engine = self.compare(fixtures.MODULE, CURRENT)
+        regions = dict(((entry[0], entry[1], entry[2]), entry) for entry in engine.regions)
+        self.assertEqual(regions[("changed", "lib/b.cpp", "lib::parse")][4:], \
+            [10, 60, 10, 60, [8, 30], [-4, 0], "./src/module/lib/b.cpp@10"])
+        # the second lib::emit is the one added, the first one is unchanged
+        self.assertEqual(regions[("added", "lib/b.cpp", "lib::emit")][4:], \
+            [None, None, 115, 135, [2, 12], [2, 12], "./src/module/lib/b.cpp@115"])
+        self.assertEqual([entry[:3] for entry in engine.regions if entry[0] == "removed"], \
+            [["removed", "lib/c.cpp", "__global__"], ["removed", "lib/c.cpp", "tiny"]])
+
+    def testSameRunUnchanged(self):
+        engine = self.compare(fixtures.MODULE, fixtures.MODULE)
+        self.assertEqual(engine.regions, [])
+        self.assertEqual(engine.counts["unchanged"], 9)
+        self.assertEqual(engine.counts["moved"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import csv
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+import canalyse
+import fixtures
+import metricstats
+import metricstore
+
+class MetricStatisticsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def summaries(self, criterias, rows):
+        stats = metricstats.MetricStatistics(criterias)
+        store = metricstore.MetricStore(criterias, retain=False)
+        for f in canalyse.readCSVfile(rows, "module", store, stats):
+            pass
+        return dict((criteria, (summary["count"], summary["total"], summary["max"])) \
+            for criteria, summary in stats.summaries().items())
+
+    def testCSVAndDatabaseAlike(self):
+        summaries = self.summaries(*fixtures.databaseRows(os.path.join(self.tmpdir, "metrixpp.db")))
+        self.assertEqual(summaries["std.code.lines.code"], self.summaries(*fixtures.csvRows())["std.code.lines.code"])
+        self.assertEqual(summaries["std.code.complexity.cyclomatic"], (5, 26, 12))
+        # collected for the file regions only
+        self.assertEqual(summaries["std.code.filelines.comments"], (3, 45, 30))
+
+    def testMergedRegionsCountedOnce(self):
+        export = "file,region,type,modified,line start,line end,std.code.lines:code,std.code.filelines:comments\n" \
+            + "./a.cpp,__global__,global,,1,80,40,\n" \
+            + "./a.cpp,main,function,,60,75,10,\n" \
+            + "./a.cpp,,file,,1,80,5,12\n"
+        rows = csv.reader(StringIO.StringIO(export))
+        criterias, tag_index = canalyse.readCSVheader(rows)
+        self.assertEqual(self.summaries(criterias, rows), {"std.code.lines.code": (2, 55, 45), \
+            "std.code.filelines.comments": (1, 12, 12)})
+
+if __name__ == "__main__":
+    unittest.main()
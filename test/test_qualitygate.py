@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import fixtures
+import qualitygate
+
+class QualityGateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(self.tmpdir, "thresholds.txt")
+        with open(filename, "w") as ofile:
+            ofile.write("# code per file\nlimit std.code.lines.code file 10\n")
+        self.limits, self.waivers = qualitygate.readThresholds(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def fileViolations(self, criterias, rows):
+        store, files = fixtures.readStore(criterias, rows)
+        gate = qualitygate.QualityGate(criterias, self.limits, self.waivers)
+        return [(violation.filename, violation.line_start, violation.line_end, violation.value) \
+            for f in files for violation in gate.checkFile(store, f, store.fileName(f))]
+
+    def testFileLinesOfCSV(self):
+        self.assertEqual(self.fileViolations(*fixtures.csvRows()), [("./src/module/a.cpp", 1, 80, 50), \
+            ("./src/module/lib/b.cpp", 1, 120, 75), ("./src/module/lib/c.cpp", 1, 30, 20)])
+
+    def testFileLinesOfDatabase(self):
+        rows = fixtures.databaseRows(os.path.join(self.tmpdir, "metrixpp.db"))
+        self.assertEqual(self.fileViolations(*rows), self.fileViolations(*fixtures.csvRows()))
+
+    def testFileLinesWithoutGlobalRegion(self):
+        module = [(path, comments, [region for region in regions if region[1] != "global"]) \
+            for path, comments, regions in fixtures.MODULE]
+        self.assertEqual(self.fileViolations(*fixtures.csvRows(module)), [("./src/module/lib/b.cpp", 5, 118, 75), \
+            ("./src/module/lib/c.cpp", 5, 25, 18)])
+
+if __name__ == "__main__":
+    unittest.main()
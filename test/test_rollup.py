@@ -0,0 +1,42 @@
+import unittest
+
+import rollup
+
+class DirectoryRollupTest(unittest.TestCase):
+    def setUp(self):
+        self.rollup = rollup.DirectoryRollup(["std.code.lines.code", "std.code.complexity.cyclomatic"])
+        self.rollup.addFile("a.cpp", [50, 3], [40, 3], 2)
+        self.rollup.addFile("lib/b.cpp", [75, 22], [30, 12], 5)
+        self.rollup.addFile("lib/c.cpp", [20, 1], [18, 1], 2)
+        self.rollup.addFile("lib/sub/d.cpp", [10, 2.5], [10, 2.5], 1)
+        self.rollup.addFile("tools\\e.cpp", [5, 1], [5, 1], 1)
+
+    def testDirectoriesNumberedParentsFirst(self):
+        self.assertEqual(self.rollup.names, ["", "lib", "sub", "tools"])
+        self.assertEqual(list(self.rollup.parent), [-1, 0, 1, 0])
+        self.assertEqual(self.rollup.directory("./lib/sub/"), 2)
+
+    def testSubtreesAddedUp(self):
+        totals = self.rollup.rollup()
+        self.assertEqual(list(totals["files"]), [1, 2, 1, 1])
+        self.assertEqual(list(totals["totalFiles"]), [5, 3, 1, 1])
+        self.assertEqual(list(totals["regions"]), [11, 8, 1, 1])
+        self.assertEqual(list(totals["sum"]["std.code.lines.code"]), [160, 105, 10, 5])
+        self.assertEqual(list(totals["max"]["std.code.lines.code"]), [40, 30, 10, 5])
+        self.assertEqual(list(totals["mean"]["std.code.lines.code"]), [32.0, 35.0, 10.0, 5.0])
+        # a column holding a float is typed as such
+        self.assertEqual(totals["sum"]["std.code.complexity.cyclomatic"].typecode, 'd')
+        self.assertEqual(list(totals["sum"]["std.code.complexity.cyclomatic"]), [29.5, 25.5, 2.5, 1.0])
+        self.assertEqual(list(totals["max"]["std.code.complexity.cyclomatic"]), [12, 12, 2.5, 1])
+        self.assertEqual(totals["max"]["std.code.lines.code"].typecode, 'l')
+
+    def testFilesAddedAfterRollup(self):
+        self.rollup.rollup()
+        self.rollup.addFile("lib/sub/f.cpp", [100, 1], [100, 1], 1)
+        totals = self.rollup.rollup()
+        self.assertEqual(list(totals["totalFiles"]), [6, 4, 2, 1])
+        self.assertEqual(list(totals["sum"]["std.code.lines.code"]), [260, 205, 110, 5])
+        self.assertEqual(list(totals["max"]["std.code.lines.code"]), [100, 100, 100, 5])
+
+if __name__ == "__main__":
+    unittest.main()
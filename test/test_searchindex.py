@@ -0,0 +1,84 @@
+import unittest
+
+import fixtures
+import searchindex
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.chunk, self.bucket_postings = searchindex.CHUNK, searchindex.BUCKET_POSTINGS
+
+    def tearDown(self):
+        searchindex.CHUNK, searchindex.BUCKET_POSTINGS = self.chunk, self.bucket_postings
+
+    def index(self):
+        store, files = fixtures.readStore(*fixtures.csvRows())
+        index = searchindex.SearchIndex()
+        for f in files:
+            index.addFile(store, f)
+        index.finish()
+        return index
+
+    ##
+    # Look up \c text like search.js does: intersect the posting lists of its trigrams, found in their buckets.
+    #
+    # @return sorted list of the names of the documents found
+    ##
+    def query(self, index, text):
+        count = index.bucketCount()
+        buckets = dict((b, (grams, offsets, docs)) for b, grams, offsets, docs in index.buckets(count))
+        names = {}
+        for k, chunk in index.chunks(lambda html_path, html_filename: html_filename):
+            for i, name in enumerate(chunk["name"]):
+                names[k * searchindex.CHUNK + i] = chunk["strings"][name]
+        found = None
+        for gram in searchindex.trigrams(searchindex.normalize(text)):
+            grams, offsets, docs = buckets[searchindex.bucketOf(gram, count)]
+            if not gram in grams:
+                return []
+            n = grams.index(gram)
+            posting = set(docs[offsets[n]:offsets[n + 1]])
+            found = posting if found is None else found & posting
+        return sorted(names[doc] for doc in found)
+
+    def testBucketOfHashesLikeSearchJs(self):
+        # value = value * 31 + charCodeAt(i), modulo the number of buckets
+        self.assertEqual(searchindex.bucketOf(u"abc", 16), ((97 * 31 + 98) * 31 + 99) % 16)
+        self.assertEqual(searchindex.bucketOf(u"Ab\xe4", 1024), ((65 * 31 + 98) * 31 + 228) % 1024)
+        self.assertEqual(searchindex.bucketOf(u"abc", 1), 0)
+
+    def testQueryFindsNamesContainingIt(self):
+        index = self.index()
+        self.assertEqual(self.query(index, "pars"), ["lib::parse", "lib::parse::inner"])
+        self.assertEqual(self.query(index, "PARSE::"), ["lib::parse::inner"])
+        self.assertEqual(self.query(index, "lib/c.cpp"), ["./src/module/lib/c.cpp"])
+        self.assertEqual(self.query(index, "xyz"), [])
+
+    def testTrigramsInTheBucketOfTheirHash(self):
+        searchindex.BUCKET_POSTINGS = 4
+        index = self.index()
+        count = index.bucketCount()
+        self.assertTrue(count > 1 and count & (count - 1) == 0)
+        seen = set()
+        for b, grams, offsets, docs in index.buckets(count):
+            self.assertEqual(grams, sorted(grams))
+            self.assertEqual((len(offsets), offsets[-1]), (len(grams) + 1, len(docs)))
+            for n, gram in enumerate(grams):
+                self.assertEqual(searchindex.bucketOf(gram, count), b)
+                self.assertEqual(list(docs[offsets[n]:offsets[n + 1]]), sorted(index.postings[gram]))
+            seen.update(grams)
+        self.assertEqual(seen, set(index.postings))
+        self.assertEqual(self.query(index, "emit"), ["lib::emit"])
+
+    def testChunksOrderedByName(self):
+        searchindex.CHUNK = 3
+        index = self.index()
+        names = []
+        for k, chunk in index.chunks(lambda html_path, html_filename: html_filename):
+            self.assertTrue(len(chunk["name"]) <= 3)
+            names.extend(chunk["strings"][name] for name in chunk["name"])
+        self.assertEqual(len(names), index.documentCount())
+        self.assertEqual(names, sorted(names, key=searchindex.normalize))
+        self.assertEqual(index.chunkNames(), [searchindex.normalize(name) for name in names[::3]])
+
+if __name__ == "__main__":
+    unittest.main()